@@ -1,38 +1,93 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
-from langchain_community.llms import OpenAI  # Updated import
-from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
-from langchain.prompts import PromptTemplate
+
+# Load environment variables before any module reads its settings
+load_dotenv()
+
 from models.user import User, db, init_db
 from models.chat import Chat
 from models.journal import Journal
+from models.embedding_job import EmbeddingJob
+from models.conversation_summary import ConversationSummary
+from models.deletion_job import DeletionJob
+from models.tombstone import Tombstone
+from models.daily_activity import DailyActivity
 from routes.auth import auth_bp
-from routes.chat import chat_bp
+from routes.chat import chat_bp, llm_scheduler
 from routes.journal import journal_bp
+from migrations import run_migrations
+from utils.embedding_worker import start_embedding_worker, stop_embedding_worker
+from utils.embeddings import warm_up as warm_up_embeddings
+from utils.response_cache import response_cache
+from utils.database import engine_options
+from utils.metrics import init_metrics, register_collector, render_metrics
+from utils.serialization import TimedJSONProvider
+from utils.user_cache import user_cache
+from utils.password_hashing import password_hasher
+from utils.rate_limit import rate_limiter
+from utils import embedding_worker
+from utils.llm import llm_stats
+from utils.replicas import replica_router, replica_binds
 
-# Load environment variables
-load_dotenv()
-
-# Initialize Flask app
+# Initialize Flask app; JSON responses are encoded (with orjson when installed) and timed
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'default-secret-key')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'sqlite:///friendbot.db')
+# Optional read replicas, comma-separated; read-only handlers are routed to them
+app.config['SQLALCHEMY_BINDS'] = replica_binds(os.getenv('DATABASE_REPLICA_URIS'))
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
 
 # Enable CORS
-CORS(app, resources={r"/api/*": {"origins": "http://localhost:5173", "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"], "allow_headers": ["Content-Type", "Authorization"]}})
+CORS(app, resources={r"/api/*": {"origins": "http://localhost:5173", "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"], "allow_headers": ["Content-Type", "Authorization", "If-None-Match"], "expose_headers": ["ETag", "Retry-After", "Location"]}})
 
 # Initialize database
 init_db(app)
+replica_router.init_app(app, db)
+
+# Per-request phase timing, served at /metrics
+init_metrics(app)
+register_collector('response_cache', 'Response cache counters', response_cache.stats)
+register_collector('user_cache', 'User cache counters', user_cache.stats)
+register_collector('rate_limit', 'Chat rate limiter counters', rate_limiter.stats)
+register_collector('llm_scheduler', 'LLM slot scheduler', llm_scheduler.stats)
+register_collector('llm_client', 'Resilient LLM client counters', llm_stats)
+register_collector('db_replicas', 'Read replica routing counters', replica_router.stats)
+register_collector('password_hashing', 'Password hashing pool', lambda: {'pending': password_hasher.pending})
+register_collector('embedding_worker', 'Embedding worker counters',
+                   lambda: embedding_worker.embedding_worker.stats() if embedding_worker.embedding_worker else {})
 
 # Register blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(chat_bp, url_prefix='/api/chat')
 app.register_blueprint(journal_bp, url_prefix='/api/journal')
 
+# Load the embedding model up front when asked (e.g. before a preforking server forks)
+if os.getenv('EMBEDDING_WARMUP') == '1':
+    warm_up_embeddings()
+
+def start_background_workers():
+    """
+    Start this process's background threads. Only serving processes call it, from one
+    place each: the development server below, serve.py's gthread workers and asgi.py's
+    lifespan startup (also under serve.py's uvicorn workers). Importing the app for the
+    CLI, migrations, scripts or tests starts nothing.
+    """
+    replica_router.start(app)
+    start_embedding_worker(app)
+
+def stop_background_workers():
+    """
+    Stop the threads start_background_workers() started, and the password hashing
+    processes, on a server's orderly shutdown
+    """
+    stop_embedding_worker()
+    replica_router.stop()
+    password_hasher.shutdown()
+
 # Default route
 @app.route('/')
 def index():
@@ -43,7 +98,26 @@ def index():
 def health():
     return jsonify({"status": "healthy"})
 
+# Prometheus metrics for this process
+@app.route('/metrics')
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+# Response cache metrics for this process (hit rate, saved latency and tokens)
+@app.route('/metrics/response-cache')
+def response_cache_metrics():
+    return jsonify(response_cache.stats())
+
+# Create or upgrade the database tables: flask --app app init-db
+@app.cli.command('init-db')
+def init_db_command():
+    applied = run_migrations(app)
+    print(f"Applied migrations: {', '.join(applied)}" if applied else 'Database is up to date.')
+
+# Development server only; see serve.py for production
 if __name__ == '__main__':
-    with app.app_context():
-        db.create_all()  # Create database tables
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    run_migrations(app)  # Create or upgrade database tables
+    # With the debugger on, only the reloader's child process serves requests
+    if os.getenv('FLASK_DEBUG', '1') != '1' or os.getenv('WERKZEUG_RUN_MAIN') == 'true':
+        start_background_workers()
+    app.run(debug=os.getenv('FLASK_DEBUG', '1') == '1', host='0.0.0.0', port=5000)
\ No newline at end of file
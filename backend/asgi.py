@@ -0,0 +1,226 @@
+"""
+ASGI entry point for FriendBot.
+
+POST /api/chat/send is served natively on the event loop: the upstream LLM call is
+awaited instead of parking a worker thread, and the number of in-flight upstream calls
+is capped by an AsyncLLMGate that shares the slots fairly between users, behind the
+same per-user rate limits as the Flask route. Every other route falls through to the
+Flask app, whose requests run on a pool of WEB_THREADS threads (8) like a gthread
+worker's, so a slow handler or a streaming reply does not hold up the others.
+
+Run with:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import jwt
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from app import app, start_background_workers, stop_background_workers
+from routes.auth import JWT_SECRET, load_user
+from routes.chat import get_llm_chain, save_chat_turn, degraded_reply, message_error, llm_scheduler
+from utils.context import build_context, schedule_compaction
+from utils.concurrency import AsyncLLMGate, LLMGateSaturated
+from utils.context import count_tokens
+from utils.response_cache import response_cache
+from utils.rate_limit import rate_limiter, RateLimitExceeded
+from utils.user_cache import user_cache
+from utils.metrics import request_seconds, phase_seconds
+from utils.llm_client import LLMUnavailable
+
+logger = logging.getLogger(__name__)
+
+CORS_ORIGIN = os.getenv('CORS_ORIGIN', 'http://localhost:5173')
+
+# Bound the upstream LLM concurrency for this process
+llm_gate = AsyncLLMGate(
+    max_inflight=int(os.getenv('LLM_MAX_INFLIGHT', '16')),
+    max_waiting=int(os.getenv('LLM_MAX_QUEUE', '32')),
+    acquire_timeout=float(os.getenv('LLM_QUEUE_TIMEOUT', '5')),
+    max_pending_per_user=int(os.getenv('LLM_MAX_PENDING_PER_USER', '2'))
+)
+
+# asgiref runs every WSGI request on one shared thread (thread_sensitive), which would
+# serialize all Flask routes in the process; give them a thread pool instead
+flask_executor = ThreadPoolExecutor(max_workers=int(os.getenv('WEB_THREADS', '8')), thread_name_prefix='flask')
+
+class ThreadPoolWsgiInstance(WsgiToAsgiInstance):
+    async def run_wsgi_app(self, body):
+        run = WsgiToAsgiInstance.__dict__['run_wsgi_app'].__wrapped__
+        return await sync_to_async(run, thread_sensitive=False, executor=flask_executor)(self, body)
+
+class ThreadPoolWsgiToAsgi(WsgiToAsgi):
+    """
+    WsgiToAsgi with each request on flask_executor
+    """
+    async def __call__(self, scope, receive, send):
+        await ThreadPoolWsgiInstance(self.wsgi_application)(scope, receive, send)
+
+flask_application = ThreadPoolWsgiToAsgi(app)
+
+# Metrics label shared with the Flask view of the same route
+NATIVE_ENDPOINT = 'chat.send_message'
+
+async def read_json(receive):
+    body = b''
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get('body', b'')
+        more_body = message.get('more_body', False)
+
+    try:
+        return json.loads(body) if body else None
+    except ValueError:
+        return None
+
+async def send_json(send, payload, status=200, headers=None):
+    response_headers = [
+        (b'content-type', b'application/json'),
+        (b'access-control-allow-origin', CORS_ORIGIN.encode())
+    ]
+    response_headers.extend(headers or [])
+
+    await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+    await send({'type': 'http.response.body', 'body': json.dumps(payload).encode()})
+
+def get_user_id(scope):
+    """
+    Decode the bearer token from the request headers, returning the user id or None
+    """
+    for name, value in scope['headers']:
+        if name == b'authorization':
+            parts = value.decode().split(' ')
+            if len(parts) != 2:
+                return None
+            try:
+                return jwt.decode(parts[1], JWT_SECRET, algorithms=['HS256'])['user_id']
+            except Exception:
+                return None
+    return None
+
+def load_turn_context(user_id):
+    """
+    Load the persona and prompt history for a user (runs in a worker thread)
+    """
+    with app.app_context():
+        user = user_cache.get(user_id, load_user)
+        if not user:
+            return None
+
+        return user.preferred_friend_gender, user.allow_response_cache, build_context(user.id)
+
+def finish_turn(user_id, user_message, ai_response, context):
+    """
+    Persist the completed turn (runs in a worker thread)
+    """
+    with app.app_context():
+        chat_id = save_chat_turn(user_id, user_message, ai_response).id
+    if context.needs_compaction:
+        # Compaction runs on a thread, so it takes a slot from the Flask routes' scheduler
+        schedule_compaction(app, user_id, llm_scheduler.slot)
+    return chat_id
+
+async def send_message(scope, receive, send):
+    user_id = get_user_id(scope)
+    if user_id is None:
+        return await send_json(send, {'message': 'Token is invalid!'}, 401)
+
+    data = await read_json(receive)
+    error = message_error(data)
+    if error:
+        return await send_json(send, {'message': error}, 400)
+
+    user_message = data['message']
+
+    # Per-user budgets first, so a client over its limit costs no database work
+    try:
+        charged = rate_limiter.admit(user_id, count_tokens(user_message))
+    except RateLimitExceeded as e:
+        return await send_json(send, {'message': str(e)}, 429, [(b'retry-after', str(e.retry_after).encode())])
+
+    # Every way out below that produces no reply refunds the charge
+    try:
+        # The user and history are loaded before taking a slot, so the slot covers the LLM only
+        turn_context = await asyncio.to_thread(load_turn_context, user_id)
+        if turn_context is None:
+            rate_limiter.settle(user_id, charged, 0)
+            return await send_json(send, {'message': 'Token is invalid!'}, 401)
+
+        gender_preference, allow_response_cache, context = turn_context
+        chain = get_llm_chain(gender_preference)
+
+        ai_response, cache_key = await asyncio.to_thread(response_cache.lookup, chain.prompt, context.history,
+                                                         user_message, user_id, allow_response_cache)
+
+        tokens = 0
+        if ai_response is None:
+            async with llm_gate.slot(user_id):
+                start = time.perf_counter()
+                ai_response = await chain.apredict(input=user_message, history=context.history)
+                phase_seconds.observe(time.perf_counter() - start, endpoint=NATIVE_ENDPOINT, phase='llm')
+            tokens = count_tokens(chain.format(user_message, context.history)) + count_tokens(ai_response)
+            await asyncio.to_thread(response_cache.store, cache_key, ai_response, time.perf_counter() - start, tokens, user_id)
+        rate_limiter.settle(user_id, charged, tokens)
+    except LLMGateSaturated as e:
+        rate_limiter.settle(user_id, charged, 0)
+        return await send_json(send, {'message': str(e)}, e.status_code, [(b'retry-after', str(e.retry_after).encode())])
+    except LLMUnavailable:
+        # Answer with the degraded reply; the turn is not saved
+        rate_limiter.settle(user_id, charged, 0)
+        return await send_json(send, degraded_reply())
+    except Exception:
+        logger.exception('Generating a chat response failed')
+        rate_limiter.settle(user_id, charged, 0)
+        return await send_json(send, {'message': 'Failed to generate a response!'}, 500)
+
+    chat_id = await asyncio.to_thread(finish_turn, user_id, user_message, ai_response, context)
+
+    await send_json(send, {
+        'message': 'Message sent successfully!',
+        'response': ai_response,
+        'chat_id': chat_id
+    })
+
+async def timed_send_message(scope, receive, send):
+    """
+    send_message with the same request histogram the Flask routes feed
+    """
+    start = time.perf_counter()
+    status = {}
+
+    async def send_and_record_status(message):
+        if message['type'] == 'http.response.start':
+            status['code'] = message['status']
+        await send(message)
+
+    try:
+        await send_message(scope, receive, send_and_record_status)
+    finally:
+        request_seconds.observe(time.perf_counter() - start, method='POST', endpoint=NATIVE_ENDPOINT,
+                                status=status.get('code', 500))
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            start_background_workers()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await asyncio.to_thread(stop_background_workers)
+            flask_executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+
+    if scope['type'] == 'http' and scope['method'] == 'POST' and scope['path'] == '/api/chat/send':
+        return await timed_send_message(scope, receive, send)
+
+    await flask_application(scope, receive, send)
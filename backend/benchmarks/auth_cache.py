@@ -0,0 +1,85 @@
+"""
+Authenticated request throughput with and without the user cache in token_required.
+
+Drives the Flask app in-process (test client, several threads) against a temporary
+SQLite database and counts the SQL statements issued per request:
+    profile  - GET /api/auth/profile (user='cached': served from the user cache)
+    history  - GET /api/chat/history (user='id': never loads the user row)
+
+Run from the backend directory:
+    python -m benchmarks.auth_cache --requests 2000 --threads 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault('EMBEDDING_WORKER', 'off')
+os.environ.setdefault('DATABASE_URI', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'auth.db')}")
+
+from sqlalchemy import event
+
+from app import app
+from migrations import run_migrations
+from models.user import db
+from utils.user_cache import user_cache
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+def measure(client, path, headers, requests, threads, counter):
+    def call(_):
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200, response.status_code
+
+    counter.count = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(call, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    return {'requests_per_sec': requests / elapsed, 'queries_per_request': counter.count / requests}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--ttl', type=float, default=30)
+    args = parser.parse_args()
+
+    run_migrations(app)
+    client = app.test_client()
+    client.post('/api/auth/register', json={'username': 'bench', 'email': 'bench@example.com', 'password': 'bench-password'})
+    token = client.post('/api/auth/login', json={'username': 'bench', 'password': 'bench-password'}).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    counter = QueryCounter()
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', counter)
+
+    results = {}
+    for name, ttl in (('without_cache', 0), ('with_cache', args.ttl)):
+        user_cache.ttl = ttl
+        user_cache.backend.clear()
+        results[name] = {
+            'profile': measure(client, '/api/auth/profile', headers, args.requests, args.threads, counter),
+            'history': measure(client, '/api/chat/history', headers, args.requests, args.threads, counter)
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""
+Clearing a heavy user's chat history and deleting their account: how long the delete
+takes, its peak Python memory, and how long other users' writes stall meanwhile.
+
+Each strategy runs on a fresh database seeded with one heavy user (--chats, --journals)
+while a background thread keeps inserting chat turns for a second user and records
+each insert's latency:
+    single_statement  one DELETE over all the user's chats (the previous /clear)
+    orm_cascade       load the user's rows and delete them one by one, then the user
+                      (the previous relationship cascade)
+    chunked           utils.deletion, DELETE_CHUNK_SIZE rows per transaction
+
+Run from the backend directory:
+    python -m benchmarks.bulk_delete --chats 200000 --journals 20000
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+os.environ.setdefault('EMBEDDING_WORKER', 'off')
+os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'delete.db')}"
+
+from benchmarks.chat_load import percentile
+
+
+def seed(app, db, chats, journals):
+    from passlib.hash import pbkdf2_sha256
+    from models.user import User
+    from models.chat import Chat
+    from models.journal import Journal
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(User.__table__.insert(), [
+                {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': pbkdf2_sha256.hash('x')}
+                for i in (1, 2)
+            ])
+            for start in range(0, chats, 10000):
+                connection.execute(Chat.__table__.insert(), [
+                    {'user_id': 1, 'message': f'message {i}', 'response': 'a supportive reply ' * 5}
+                    for i in range(start, min(start + 10000, chats))
+                ])
+            for start in range(0, journals, 10000):
+                connection.execute(Journal.__table__.insert(), [
+                    {'user_id': 1, 'title': f'entry {i}', 'content': 'went for a walk today ' * 10}
+                    for i in range(start, min(start + 10000, journals))
+                ])
+
+
+def reset(app, db):
+    from sqlalchemy import text
+    from migrations import run_migrations
+
+    with app.app_context():
+        db.drop_all()
+        with db.engine.begin() as connection:
+            connection.execute(text('DROP TABLE IF EXISTS schema_migrations'))
+            connection.execute(text('DROP TABLE IF EXISTS journals_fts'))
+    run_migrations(app)
+
+
+class Writer(threading.Thread):
+    """
+    Inserts a chat turn for user 2 every few milliseconds, timing each commit
+    """
+    def __init__(self, app, db):
+        super().__init__(daemon=True)
+        self.app, self.db = app, db
+        self.latencies = []
+        self.stop = threading.Event()
+
+    def run(self):
+        from models.chat import Chat
+
+        with self.app.app_context():
+            while not self.stop.is_set():
+                start = time.perf_counter()
+                self.db.session.add(Chat(user_id=2, message='still here', response='me too'))
+                self.db.session.commit()
+                self.latencies.append(time.perf_counter() - start)
+                time.sleep(0.005)
+
+
+def single_statement(app, db, kind):
+    from models.chat import Chat
+
+    with app.app_context():
+        Chat.query.filter_by(user_id=1).delete()
+        db.session.commit()
+
+
+def orm_cascade(app, db, kind):
+    from models.user import User
+    from models.chat import Chat
+    from models.journal import Journal
+
+    with app.app_context():
+        for row in Chat.query.filter_by(user_id=1).all():
+            db.session.delete(row)
+        if kind == 'account':
+            for row in Journal.query.filter_by(user_id=1).all():
+                db.session.delete(row)
+            db.session.delete(db.session.get(User, 1))
+        db.session.commit()
+
+
+def chunked(app, db, kind):
+    from models.deletion_job import DeletionJob
+    from utils.deletion import run_deletion, _total_rows
+
+    with app.app_context():
+        job = DeletionJob(user_id=1, kind=kind, total=_total_rows(1, kind))
+        db.session.add(job)
+        db.session.commit()
+        run_deletion(job.id)
+
+
+def measure(app, db, strategy, kind, args):
+    reset(app, db)
+    seed(app, db, args.chats, args.journals)
+
+    writer = Writer(app, db)
+    writer.start()
+    time.sleep(0.2)
+    tracemalloc.start()
+    start = time.perf_counter()
+    strategy(app, db, kind)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    writer.stop.set()
+    writer.join()
+
+    return {
+        'delete_seconds': elapsed,
+        'peak_mb': peak / 1024 / 1024,
+        'writer_p50_ms': percentile(writer.latencies, 50) * 1000,
+        'writer_p99_ms': percentile(writer.latencies, 99) * 1000,
+        'writer_max_ms': max(writer.latencies) * 1000
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--chats', type=int, default=200000)
+    parser.add_argument('--journals', type=int, default=20000)
+    args = parser.parse_args()
+
+    from app import app
+    from models.user import db
+
+    results = {
+        'chat_history': {
+            'single_statement': measure(app, db, single_statement, 'chat_history', args),
+            'chunked': measure(app, db, chunked, 'chat_history', args)
+        },
+        'account': {
+            'orm_cascade': measure(app, db, orm_cascade, 'account', args),
+            'chunked': measure(app, db, chunked, 'account', args)
+        }
+    }
+    print(json.dumps({'chats': args.chats, 'journals': args.journals, **results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
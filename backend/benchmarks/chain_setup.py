@@ -0,0 +1,52 @@
+"""
+Per-request LLM chain setup cost: rebuilding the chain on every message
+(the old get_llm_chain) versus the per-persona registry.
+
+No upstream call is made; only construction is timed.
+Run from the backend directory:
+    python -m benchmarks.chain_setup --iterations 2000
+"""
+import argparse
+import os
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+
+from langchain.llms import OpenAI
+from langchain.chains import ConversationChain
+from langchain.memory import ConversationBufferMemory
+from langchain.prompts import PromptTemplate
+from routes.chat import get_llm_chain, get_prompt
+
+
+def build_chain_per_request(gender_preference):
+    # Mirrors the previous implementation, minus verbose=True stdout noise
+    llm = OpenAI(temperature=0.7, openai_api_key=os.environ['OPENAI_API_KEY'])
+    memory = ConversationBufferMemory(return_messages=True)
+    prompt = PromptTemplate(input_variables=['history', 'input'], template=get_prompt(gender_preference))
+    return ConversationChain(llm=llm, prompt=prompt, memory=memory)
+
+
+def timed(fn, iterations):
+    genders = ('male', 'female', 'neutral')
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(genders[i % 3])
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args()
+
+    before = timed(build_chain_per_request, args.iterations)
+    after = timed(get_llm_chain, args.iterations)
+
+    print(f"rebuild per request: {before * 1e6:10.1f} us/request")
+    print(f"persona registry:    {after * 1e6:10.1f} us/request")
+    print(f"speedup:             {before / after:10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
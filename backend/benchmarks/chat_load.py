@@ -0,0 +1,139 @@
+"""
+Load test for /api/chat/send: the threaded Flask (WSGI) app versus the asyncio
+entry point in asgi.py, both talking to the local mock LLM server.
+
+Run from the backend directory:
+    python -m benchmarks.chat_load --requests 400 --concurrency 64 --latency 0.5
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_llm_server import start_mock_llm_server
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def start_sync_server(app, port, workers):
+    """
+    Werkzeug server with a fixed pool of worker threads, like a threaded WSGI deployment
+    """
+    from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+    class QuietRequestHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    class PooledWSGIServer(BaseWSGIServer):
+        pool = ThreadPoolExecutor(max_workers=workers)
+
+        def process_request(self, request, client_address):
+            self.pool.submit(self._handle, request, client_address)
+
+        def _handle(self, request, client_address):
+            try:
+                self.finish_request(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    server = PooledWSGIServer('127.0.0.1', port, app, handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def start_async_server(application, port):
+    import uvicorn
+
+    config = uvicorn.Config(application, host='127.0.0.1', port=port, log_level='warning')
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def run_load(url, token, requests, concurrency):
+    def one(i):
+        request = urllib.request.Request(
+            url,
+            data=json.dumps({'message': f'hello {i}'}).encode(),
+            headers={'Content-Type': 'application/json', 'Authorization': f'Bearer {token}'}
+        )
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            status = e.code
+        except Exception:
+            status = 'error'
+        return status, time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - start
+
+    ok = [latency for status, latency in results if status == 200]
+    return {
+        'throughput_rps': len(ok) / elapsed,
+        'p50_ms': statistics.median(ok) * 1000 if ok else None,
+        'p95_ms': percentile(ok, 95) * 1000 if ok else None,
+        'p99_ms': percentile(ok, 99) * 1000 if ok else None,
+        'status_codes': dict(Counter(str(status) for status, _ in results))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.5, help='mock LLM latency in seconds')
+    parser.add_argument('--sync-workers', type=int, default=8, help='worker threads for the WSGI server')
+    args = parser.parse_args()
+
+    _, base_url = start_mock_llm_server(latency=args.latency)
+    workdir = tempfile.mkdtemp()
+    os.environ['OPENAI_API_BASE'] = base_url
+    os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+    os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(workdir, 'load.db')}"
+    os.environ.setdefault('EMBEDDING_WORKER', 'off')
+    # Every request comes from one user; per-user limits would measure the limiter instead
+    os.environ.setdefault('RATE_LIMIT', 'off')
+    os.environ.setdefault('LLM_MAX_PENDING_PER_USER', str(args.requests))
+
+    from app import app
+    from asgi import application
+    from models.user import db
+
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    client.post('/api/auth/register', json={'username': 'load', 'email': 'load@example.com', 'password': 'load-password'})
+    token = client.post('/api/auth/login', json={'username': 'load', 'password': 'load-password'}).get_json()['token']
+
+    start_sync_server(app, 5101, args.sync_workers)
+    start_async_server(application, 5102)
+
+    results = {
+        'sync': run_load('http://127.0.0.1:5101/api/chat/send', token, args.requests, args.concurrency),
+        'async': run_load('http://127.0.0.1:5102/api/chat/send', token, args.requests, args.concurrency)
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""
+Write throughput of one chat turn: the previous pattern (user row, history read,
+response update, duplicate AI row - three commits) versus one row in one transaction.
+
+SQLite always runs; PostgreSQL runs when --postgres-uri (or BENCH_POSTGRES_URI) is set.
+Run from the backend directory:
+    python -m benchmarks.chat_writes --turns 2000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from flask import Flask
+from models.user import User, db
+from models.chat import Chat
+from models.journal import Journal  # noqa: F401 (resolves the User.journals relationship)
+from routes.chat import save_chat_turn
+from utils.context import build_context
+
+
+def create_app(database_uri):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def previous_turn(user_id, message, response):
+    chat_entry = Chat(user_id=user_id, message=message)
+    db.session.add(chat_entry)
+    db.session.commit()
+
+    Chat.query.filter_by(user_id=user_id).order_by(Chat.timestamp.desc()).limit(10).all()
+
+    chat_entry.response = response
+    db.session.commit()
+
+    db.session.add(Chat(user_id=user_id, message=message, response=response))
+    db.session.commit()
+
+
+def single_transaction_turn(user_id, message, response):
+    build_context(user_id)
+    save_chat_turn(user_id, message, response)
+
+
+def measure(app, turns, write_turn):
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username='writer', email='writer@example.com', password='writer-password')
+        db.session.add(user)
+        db.session.commit()
+
+        start = time.perf_counter()
+        for i in range(turns):
+            write_turn(user.id, f'message {i}', f'response {i}')
+        elapsed = time.perf_counter() - start
+
+        rows = Chat.query.count()
+        db.drop_all()
+
+    return {'turns_per_sec': turns / elapsed, 'rows_per_turn': rows / turns}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--turns', type=int, default=2000)
+    parser.add_argument('--postgres-uri', default=os.getenv('BENCH_POSTGRES_URI'))
+    args = parser.parse_args()
+
+    targets = {'sqlite': f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'writes.db')}"}
+    if args.postgres_uri:
+        targets['postgresql'] = args.postgres_uri
+
+    results = {}
+    for name, uri in targets.items():
+        app = create_app(uri)
+        results[name] = {
+            'previous': measure(app, args.turns, previous_turn),
+            'single_transaction': measure(app, args.turns, single_transaction_turn)
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
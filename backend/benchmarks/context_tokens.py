@@ -0,0 +1,129 @@
+"""
+Prompt tokens per chat request: the previous context (last 10 rows in full, current
+message repeated in the history) versus the token-budgeted context with a rolling summary.
+
+Replays a synthetic conversation with a mix of short and long messages against a temporary
+SQLite database. Compaction runs inline with a stub summarizer, and its prompt tokens are
+reported separately so the amortized cost per turn is visible.
+
+Run from the backend directory:
+    python -m benchmarks.context_tokens --turns 200
+    python -m benchmarks.context_tokens --turns 200 --budget 500
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+
+from flask import Flask
+from models.user import User, db
+from models.chat import Chat
+from models.journal import Journal  # noqa: F401 (resolves the User.journals relationship)
+from routes.chat import get_prompt, save_chat_turn
+from utils import context as context_builder
+from utils.context import build_context, compact_history, count_tokens
+from utils.fake_llm import FakeLLM
+
+WORDS = ('work', 'sleep', 'sister', 'exam', 'anxious', 'weekend', 'run', 'coffee', 'tired', 'happy', 'deadline', 'friend')
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def create_app(database_uri):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def sentence(rng):
+    # Mostly chatty one-liners, with the occasional long vent
+    length = rng.choice([8, 12, 20, 30, 250])
+    return ' '.join(rng.choice(WORDS) for _ in range(length)) + '.'
+
+
+def previous_prompt(user_id, message, template):
+    # The old code stored the user row before reading the last 10 rows back
+    rows = Chat.query.filter_by(user_id=user_id).order_by(Chat.timestamp.desc(), Chat.id.desc()).limit(5).all()
+    rows.reverse()
+    history = ''
+    for chat in rows:
+        history += f"Human: {chat.message}\nAI Friend: {chat.response}\n"
+    history += f"Human: {message}\n"
+    return template.format(history=history, input=message)
+
+
+def run(app, turns, seed):
+    rng = random.Random(seed)
+    template = get_prompt('neutral')
+    summarizer = FakeLLM(first_token_delay=0, token_delay=0)
+    previous, budgeted = [], []
+    compactions = 0
+    compaction_tokens = 0
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(username='talker', email='talker@example.com', password='talker-password')
+        db.session.add(user)
+        db.session.commit()
+
+        for _ in range(turns):
+            message = sentence(rng)
+            response = sentence(rng)
+
+            previous.append(count_tokens(previous_prompt(user.id, message, template)))
+
+            context = build_context(user.id)
+            budgeted.append(count_tokens(template.format(history=context.history, input=message)))
+
+            save_chat_turn(user.id, message, response)
+            if context.needs_compaction:
+                spent = compact_history(user.id, llm=summarizer)
+                compactions += 1 if spent else 0
+                compaction_tokens += spent
+
+        db.drop_all()
+
+    def summarize(values):
+        return {
+            'mean': sum(values) / len(values),
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'max': max(values)
+        }
+
+    return {
+        'previous_prompt_tokens': summarize(previous),
+        'budgeted_prompt_tokens': summarize(budgeted),
+        'compactions': compactions,
+        'compaction_prompt_tokens_per_turn': compaction_tokens / turns,
+        'tokens_saved_per_turn': (sum(previous) - sum(budgeted) - compaction_tokens) / turns
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--budget', type=int, default=context_builder.CONTEXT_TOKEN_BUDGET)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    # Also picked up by compact_history when it sizes the verbatim window
+    context_builder.CONTEXT_TOKEN_BUDGET = args.budget
+
+    app = create_app(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'context.db')}")
+    results = run(app, args.turns, args.seed)
+    results['budget'] = args.budget
+    results['tokenizer'] = 'tiktoken' if context_builder._get_encoding() is not None else 'estimate'
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
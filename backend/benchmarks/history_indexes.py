@@ -0,0 +1,130 @@
+"""
+Query plans and latencies of the per-user, newest-first queries with and without the
+composite (user_id, time, id) indexes, on a seeded database (default 1M chats over 10k users).
+
+Run from the backend directory:
+    python -m benchmarks.history_indexes --chats 1000000 --users 10000
+    python -m benchmarks.history_indexes --database-uri postgresql://localhost/friendbot_bench
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from models.user import User, db
+from models.chat import Chat
+from models.journal import Journal
+
+QUERIES = {
+    'chat_send_recent_history': (
+        'SELECT id, message, response FROM chats WHERE user_id = :user_id '
+        'ORDER BY timestamp DESC, id DESC LIMIT 5'
+    ),
+    'chat_history_page': (
+        'SELECT id, user_id, message, response, timestamp FROM chats WHERE user_id = :user_id '
+        'ORDER BY timestamp DESC LIMIT 20 OFFSET 0'
+    ),
+    'journal_list_page': (
+        'SELECT id, user_id, title, content, created_at, updated_at FROM journals WHERE user_id = :user_id '
+        'ORDER BY updated_at DESC LIMIT 10 OFFSET 0'
+    ),
+}
+
+INDEXES = {
+    'ix_chats_user_id_timestamp': 'CREATE INDEX ix_chats_user_id_timestamp ON chats (user_id, timestamp, id)',
+    'ix_journals_user_id_updated_at': 'CREATE INDEX ix_journals_user_id_updated_at ON journals (user_id, updated_at, id)',
+}
+
+
+def seed(engine, users, chats, journals, batch_size=20000):
+    tables = [User.__table__, Chat.__table__, Journal.__table__]
+    db.metadata.drop_all(engine, tables=tables)
+    db.metadata.create_all(engine, tables=tables)
+    with engine.begin() as connection:
+        for name in INDEXES:
+            connection.execute(text(f'DROP INDEX IF EXISTS {name}'))
+
+    start = datetime(2024, 1, 1)
+    rng = random.Random(42)
+    with engine.begin() as connection:
+        connection.execute(User.__table__.insert(), [
+            {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x',
+             'preferred_friend_gender': 'neutral'}
+            for i in range(1, users + 1)
+        ])
+
+    def insert_batches(table, total, make_row):
+        for offset in range(0, total, batch_size):
+            rows = [make_row(i) for i in range(offset, min(total, offset + batch_size))]
+            with engine.begin() as connection:
+                connection.execute(table.insert(), rows)
+
+    insert_batches(Chat.__table__, chats, lambda i: {
+        'user_id': rng.randint(1, users), 'message': f'message {i}', 'response': f'response {i}',
+        'timestamp': start + timedelta(seconds=i)
+    })
+    insert_batches(Journal.__table__, journals, lambda i: {
+        'user_id': rng.randint(1, users), 'title': f'Entry {i}', 'content': f'journal content {i}',
+        'created_at': start + timedelta(minutes=i), 'updated_at': start + timedelta(minutes=i)
+    })
+
+
+def explain(connection, sql, params):
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.dialect.name == 'sqlite' else 'EXPLAIN '
+    rows = connection.execute(text(prefix + sql), params).fetchall()
+    return [str(row[-1]) for row in rows]
+
+
+def measure(engine, users, samples):
+    rng = random.Random(7)
+    results = {}
+    with engine.connect() as connection:
+        for name, sql in QUERIES.items():
+            latencies = []
+            for _ in range(samples):
+                params = {'user_id': rng.randint(1, users)}
+                start = time.perf_counter()
+                connection.execute(text(sql), params).fetchall()
+                latencies.append((time.perf_counter() - start) * 1000)
+            latencies.sort()
+            results[name] = {
+                'p50_ms': statistics.median(latencies),
+                'p95_ms': latencies[int(0.95 * (len(latencies) - 1))],
+                'plan': explain(connection, sql, {'user_id': 1})
+            }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database-uri', default=None)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--chats', type=int, default=1000000)
+    parser.add_argument('--journals', type=int, default=100000)
+    parser.add_argument('--samples', type=int, default=200)
+    args = parser.parse_args()
+
+    uri = args.database_uri or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'indexes.db')}"
+    engine = create_engine(uri)
+
+    seed(engine, args.users, args.chats, args.journals)
+    results = {'without_indexes': measure(engine, args.users, args.samples)}
+
+    with engine.begin() as connection:
+        for sql in INDEXES.values():
+            connection.execute(text(sql))
+        if engine.dialect.name == 'postgresql':
+            connection.execute(text('ANALYZE'))
+    results['with_indexes'] = measure(engine, args.users, args.samples)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
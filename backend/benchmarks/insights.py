@@ -0,0 +1,154 @@
+"""
+The insights endpoint answered from the daily rollups versus computed on demand by
+scanning the user's journal and chat rows, for growing histories over the same year,
+and batch sentiment scoring vectorized versus one vector at a time.
+
+    rollup     GET /api/journal/insights?days=365 (reads at most 365 rollup rows)
+    on_demand  the same numbers from every journal and chat row in the window
+
+Each --sizes value is the number of journal entries (and as many chat turns) spread
+over the last 365 days. Sentiment is scored over --vectors random unit vectors of the
+embedding model's dimension, with the axis calibrated from random anchors, so the model
+itself is not needed.
+
+Run from the backend directory:
+    python -m benchmarks.insights --sizes 1000 10000 100000 --vectors 20000
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+os.environ.setdefault('EMBEDDING_WORKER', 'off')
+os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'insights.db')}"
+
+import numpy as np
+
+TEXT = 'Went for a long walk by the river after work and tried to notice five things I could see.'
+
+
+def seed(app, db, size):
+    from models.chat import Chat
+    from models.journal import Journal
+    from utils.insights import rebuild_rollups
+
+    now = datetime.utcnow()
+    step = timedelta(days=365) / size
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(Journal.__table__.delete())
+            connection.execute(Chat.__table__.delete())
+            for start in range(0, size, 10000):
+                positions = range(start, min(start + 10000, size))
+                connection.execute(Journal.__table__.insert(), [
+                    {'user_id': 1, 'title': f'Entry {i}', 'content': TEXT, 'sentiment': (i % 7 - 3) / 3,
+                     'created_at': now - step * i, 'updated_at': now - step * i}
+                    for i in positions
+                ])
+                connection.execute(Chat.__table__.insert(), [
+                    {'user_id': 1, 'message': TEXT, 'response': TEXT, 'sentiment': (i % 5 - 2) / 2,
+                     'timestamp': now - step * i}
+                    for i in positions
+                ])
+            rebuild_rollups(connection, 1)
+
+
+def on_demand(db, user_id, days):
+    """
+    The per-day numbers computed straight from the rows, as an endpoint without rollups would
+    """
+    from sqlalchemy import select
+    from models.chat import Chat
+    from models.journal import Journal
+    from utils.insights import word_count
+
+    start = datetime.utcnow() - timedelta(days=days)
+    totals = defaultdict(lambda: defaultdict(float))
+    for created_at, content, sentiment in db.session.execute(select(Journal.created_at, Journal.content, Journal.sentiment).where(
+        Journal.user_id == user_id, Journal.created_at >= start
+    )):
+        day = totals[created_at.date()]
+        day['journal_entries'] += 1
+        day['journal_words'] += word_count(content)
+        if sentiment is not None:
+            day['journal_sentiment_sum'] += sentiment
+    for timestamp, message, sentiment in db.session.execute(select(Chat.timestamp, Chat.message, Chat.sentiment).where(
+        Chat.user_id == user_id, Chat.timestamp >= start
+    )):
+        day = totals[timestamp.date()]
+        day['chat_messages'] += 1
+        day['chat_words'] += word_count(message)
+        if sentiment is not None:
+            day['chat_sentiment_sum'] += sentiment
+    return totals
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def sentiment(vectors, dimension):
+    from utils.insights import SentimentScorer
+
+    rng = np.random.default_rng(0)
+
+    def unit(count):
+        batch = rng.standard_normal((count, dimension)).astype('float32')
+        return batch / np.linalg.norm(batch, axis=1, keepdims=True)
+
+    scorer = SentimentScorer(lambda texts: unit(len(texts)))
+    batch = unit(vectors)
+    scorer.calibrate()
+    return {
+        'vectors': vectors,
+        'vectorized_ms': measure(lambda: scorer.score(batch), 5),
+        'per_vector_ms': measure(lambda: [scorer.score(vector[None]) for vector in batch], 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--vectors', type=int, default=20000)
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    from app import app
+    from migrations import run_migrations
+    from models.user import db
+
+    run_migrations(app)
+    client = app.test_client()
+    client.post('/api/auth/register', json={'username': 'bench', 'email': 'bench@example.com', 'password': 'password'})
+    token = client.post('/api/auth/login', json={'username': 'bench', 'password': 'password'}).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+
+    endpoint = []
+    for size in args.sizes:
+        seed(app, db, size)
+        body = client.get('/api/journal/insights?days=365', headers=headers).get_json()
+        with app.app_context():
+            on_demand_ms = measure(lambda: on_demand(db, 1, 365), max(1, args.repeat // 4))
+        endpoint.append({
+            'journals': size,
+            'chats': size,
+            'active_days': body['totals']['active_days'],
+            'rollup_ms': measure(lambda: client.get('/api/journal/insights?days=365', headers=headers), args.repeat),
+            'on_demand_ms': on_demand_ms
+        })
+
+    print(json.dumps({'endpoint': endpoint, 'sentiment': sentiment(args.vectors, args.dimension)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+Throughput and memory of the streaming journal import and export (default 100k entries).
+
+The app is served over HTTP on a WSGI thread in this process. The NDJSON import body is
+sent with chunked transfer encoding as it is generated, and the export is read as a
+stream, so neither side holds the whole data set. Peak Python memory is measured with
+tracemalloc in a second pass, and is compared against loading every entry through the
+ORM and encoding it as one JSON document.
+
+Run from the backend directory:
+    python -m benchmarks.journal_bulk --entries 100000
+"""
+import argparse
+import http.client
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault('EMBEDDING_WORKER', 'off')
+os.environ.setdefault('DATABASE_URI', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bulk.db')}")
+
+from benchmarks.chat_load import start_sync_server
+
+PORT = 5111
+
+
+def ndjson_lines(entries):
+    for i in range(entries):
+        yield (json.dumps({
+            'title': f'Imported entry {i}',
+            'content': f'Entry {i}: went for a walk, talked to a friend and felt a little lighter afterwards. ' * 3,
+            'created_at': '2023-06-01T08:00:00'
+        }) + '\n').encode()
+
+
+def request(method, path, token, body=None, headers=None):
+    connection = http.client.HTTPConnection('127.0.0.1', PORT, timeout=1800)
+    connection.request(method, path, body=body, headers={'Authorization': f'Bearer {token}', **(headers or {})},
+                       encode_chunked=body is not None and not isinstance(body, (bytes, str)))
+    return connection, connection.getresponse()
+
+
+def import_entries(token, entries):
+    connection, response = request('POST', '/api/journal/import', token, ndjson_lines(entries),
+                                   {'Content-Type': 'application/x-ndjson', 'Transfer-Encoding': 'chunked'})
+    result = json.loads(response.read())
+    connection.close()
+    return result
+
+
+def export_entries(token):
+    connection, response = request('GET', '/api/journal/export', token)
+    count = 0
+    while True:
+        chunk = response.read(64 * 1024)
+        if not chunk:
+            break
+        count += chunk.count(b'\n')
+    connection.close()
+    return count
+
+
+def load_everything(app, user_id):
+    from models.journal import Journal
+
+    with app.app_context():
+        return len(json.dumps([journal.to_dict() for journal in Journal.query.filter_by(user_id=user_id).all()]))
+
+
+def measure(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def peak_memory(function, *args):
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    function(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entries', type=int, default=100000)
+    parser.add_argument('--port', type=int, default=5111)
+    args = parser.parse_args()
+
+    global PORT
+    PORT = args.port
+
+    from app import app
+    from migrations import run_migrations
+    from models.user import db
+    from models.journal import Journal
+
+    run_migrations(app)
+    client = app.test_client()
+    for username in ('bulk', 'bulk-memory'):
+        client.post('/api/auth/register', json={'username': username, 'email': f'{username}@example.com', 'password': 'bulk-password'})
+    tokens = [client.post('/api/auth/login', json={'username': username, 'password': 'bulk-password'}).get_json()['token']
+              for username in ('bulk', 'bulk-memory')]
+    start_sync_server(app, PORT, 2)
+
+    imported, import_seconds = measure(import_entries, tokens[0], args.entries)
+    exported, export_seconds = measure(export_entries, tokens[0])
+
+    # Memory pass on a second user, so the export covers the same number of rows
+    import_peak = peak_memory(import_entries, tokens[1], args.entries)
+    export_peak = peak_memory(export_entries, tokens[1])
+    with app.app_context():
+        user_id = db.session.scalar(db.select(Journal.user_id).order_by(Journal.id.desc()).limit(1))
+    load_all_peak = peak_memory(load_everything, app, user_id)
+
+    print(json.dumps({
+        'entries': args.entries,
+        'imported': imported['imported'],
+        'import_seconds': import_seconds,
+        'import_rows_per_sec': imported['imported'] / import_seconds,
+        'import_peak_mb': import_peak,
+        'exported': exported,
+        'export_seconds': export_seconds,
+        'export_rows_per_sec': exported / export_seconds,
+        'export_peak_mb': export_peak,
+        'load_all_then_serialize_peak_mb': load_all_peak
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Journal search latency and response size: the previous unbounded ILIKE scan returning
+whole entries versus the ranked, paginated full-text index returning snippets.
+
+Run from the backend directory:
+    python -m benchmarks.journal_search --journals 100000 --users 1000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from flask import Flask
+from models.user import User, db
+from models.chat import Chat  # noqa: F401 (resolves the User.chats relationship)
+from models.journal import Journal
+from utils.search import search_journals
+
+VOCABULARY = (
+    'anxious calm tired happy grateful stressed work family friend walk sleep run coffee '
+    'rain sunshine meeting deadline therapy breathing meditation lonely excited worried '
+    'proud angry hopeful music book dinner weekend exam project morning evening'
+).split()
+
+# Filler words keep the query terms selective, as in real journals
+FILLER = [f'word{i}' for i in range(5000)]
+
+QUERIES = ['anxious', 'breathing meditation', 'deadline work', 'grateful family', 'sunshine walk']
+
+
+def create_app(database_uri):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def seed(users, journals, heavy_share, batch_size=10000):
+    rng = random.Random(42)
+    start = datetime(2024, 1, 1)
+    db.session.execute(User.__table__.insert(), [
+        {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': 'x'}
+        for i in range(1, users + 1)
+    ])
+    for offset in range(0, journals, batch_size):
+        db.session.execute(Journal.__table__.insert(), [
+            {
+                # User 1 is a heavy journaller holding heavy_share of all entries
+                'user_id': 1 if rng.random() < heavy_share else rng.randint(2, users),
+                'title': ' '.join(rng.choices(VOCABULARY, k=3)).capitalize(),
+                'content': ' '.join(rng.choices(VOCABULARY + FILLER, k=rng.randint(60, 200))),
+                'created_at': start + timedelta(minutes=i),
+                'updated_at': start + timedelta(minutes=i)
+            }
+            for i in range(offset, min(journals, offset + batch_size))
+        ])
+        db.session.commit()
+
+
+def previous_search(user_id, query):
+    journals = Journal.query.filter_by(user_id=user_id).filter(
+        (Journal.title.ilike(f'%{query}%') | Journal.content.ilike(f'%{query}%'))
+    ).order_by(Journal.updated_at.desc()).all()
+    return [journal.to_dict() for journal in journals]
+
+
+def indexed_search(user_id, query):
+    return [
+        dict(result, updated_at=result['updated_at'].isoformat())
+        for result in search_journals(db.session, user_id, query, limit=10)
+    ]
+
+
+def measure(search, pick_user, samples):
+    latencies, sizes = [], []
+    for i in range(samples):
+        start = time.perf_counter()
+        payload = json.dumps(search(pick_user(), QUERIES[i % len(QUERIES)]))
+        latencies.append((time.perf_counter() - start) * 1000)
+        sizes.append(len(payload))
+    latencies.sort()
+    return {
+        'p50_ms': statistics.median(latencies),
+        'p95_ms': latencies[int(0.95 * (len(latencies) - 1))],
+        'mean_response_bytes': statistics.mean(sizes)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database-uri', default=None)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--journals', type=int, default=100000)
+    parser.add_argument('--heavy-share', type=float, default=0.1, help='share of entries owned by user 1')
+    parser.add_argument('--samples', type=int, default=200)
+    args = parser.parse_args()
+
+    app = create_app(args.database_uri or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'search.db')}")
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        seed(args.users, args.journals, args.heavy_share)
+
+        rng = random.Random(7)
+        users = {'typical_user': lambda: rng.randint(2, args.users), 'heavy_user': lambda: 1}
+        results = {
+            name: {
+                'ilike_full_entries': measure(previous_search, pick_user, args.samples),
+                'full_text_snippets': measure(indexed_search, pick_user, args.samples)
+            }
+            for name, pick_user in users.items()
+        }
+        db.drop_all()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
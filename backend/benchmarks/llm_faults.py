@@ -0,0 +1,143 @@
+"""
+/api/chat/send against a faulty upstream: the OpenAI client used directly (the previous
+behaviour) versus wrapped in ResilientLLM, talking to the fault-injecting mock server.
+
+    tail    --slow-rate of upstream calls take --slow-latency instead of --latency
+    errors  --error-rate of upstream calls fail with a 500
+    outage  every upstream call stalls for longer than the attempt timeout
+
+Each scenario sends --requests messages from --concurrency threads and reports the
+status codes, how many answers were the degraded reply, and the latency percentiles.
+The deadlines are scaled down (LLM_ATTEMPT_TIMEOUT, LLM_TIMEOUT) so a run stays short;
+the direct client gets the same per-request timeout.
+
+Run from the backend directory:
+    python -m benchmarks.llm_faults --requests 300 --concurrency 16
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+os.environ.setdefault('EMBEDDING_WORKER', 'off')
+os.environ.setdefault('OPENAI_API_KEY', 'sk-benchmark')
+os.environ.setdefault('RATE_LIMIT', 'off')
+os.environ.setdefault('LLM_MAX_PENDING_PER_USER', '1000')
+os.environ.setdefault('LLM_ATTEMPT_TIMEOUT', '1')
+os.environ.setdefault('LLM_TIMEOUT', '2.5')
+os.environ.setdefault('LLM_BREAKER_COOLDOWN', '5')
+os.environ.setdefault('LLM_HEDGE', 'on')
+os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'llm_faults.db')}"
+
+from benchmarks.chat_load import percentile, start_sync_server
+from benchmarks.mock_llm_server import start_mock_llm_server
+
+
+def send(url, message, token):
+    request = urllib.request.Request(url, data=json.dumps({'message': message}).encode(), headers={
+        'Content-Type': 'application/json', 'Authorization': f'Bearer {token}'
+    })
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            status, body = response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        status, body = e.code, {}
+    except Exception:
+        status, body = 'error', {}
+    return status, bool(body.get('degraded')), time.perf_counter() - start
+
+
+def run_load(url, token, requests, concurrency):
+    results = []
+    counter = iter(range(requests))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            results.append(send(url, f'message {i}', token))
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    answered = [latency for status, degraded, latency in results if status == 200 and not degraded]
+    latencies = [latency for _, _, latency in results]
+    return {
+        'status_codes': dict(Counter(str(status) for status, _, _ in results)),
+        'answered': len(answered),
+        'degraded': sum(degraded for _, degraded, _ in results),
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'answered_p99_ms': percentile(answered, 99) * 1000 if answered else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--latency', type=float, default=0.1, help='normal mock LLM latency in seconds')
+    parser.add_argument('--slow-rate', type=float, default=0.05)
+    parser.add_argument('--slow-latency', type=float, default=0.9)
+    parser.add_argument('--error-rate', type=float, default=0.2)
+    parser.add_argument('--sync-workers', type=int, default=32, help='worker threads for the WSGI server')
+    args = parser.parse_args()
+
+    server, base_url = start_mock_llm_server(latency=args.latency)
+    os.environ['OPENAI_API_BASE'] = base_url
+
+    from app import app
+    from migrations import run_migrations
+    from routes import chat
+    from utils.llm import llm_stats, reset_llm
+
+    run_migrations(app)
+    client = app.test_client()
+    client.post('/api/auth/register', json={'username': 'faults', 'email': 'faults@example.com', 'password': 'password'})
+    token = client.post('/api/auth/login', json={'username': 'faults', 'password': 'password'}).get_json()['token']
+
+    start_sync_server(app, 5105, args.sync_workers)
+    url = 'http://127.0.0.1:5105/api/chat/send'
+
+    scenarios = {
+        'tail': {'slow_rate': args.slow_rate, 'slow_latency': args.slow_latency},
+        'errors': {'error_rate': args.error_rate},
+        'outage': {'stall_rate': 1.0, 'stall_seconds': 3 * float(os.environ['LLM_ATTEMPT_TIMEOUT'])}
+    }
+    handler = server.RequestHandlerClass
+    results = {}
+    for name, faults in scenarios.items():
+        results[name] = {}
+        for client_name, resilience in (('direct', 'off'), ('resilient', 'on')):
+            os.environ['LLM_RESILIENCE'] = resilience
+            reset_llm()
+            chat._chain_registry.clear()
+
+            # A healthy warm-up gives the hedging its latency baseline
+            run_load(url, token, 40, args.concurrency)
+            for key, value in faults.items():
+                setattr(handler, key, value)
+            results[name][client_name] = run_load(url, token, args.requests, args.concurrency)
+            if resilience == 'on':
+                results[name][client_name]['client'] = llm_stats()
+            for key in faults:
+                delattr(handler, key)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Mixed login and chat load: chat latency while a login burst is running, with password
+hashing inline in the request threads versus on the bounded hashing process pool.
+
+Serves the Flask app on a fixed pool of WSGI worker threads with the fake LLM, then for
+--duration seconds runs login clients and chat clients side by side.
+
+Run from the backend directory:
+    python -m benchmarks.login_load --duration 10 --login-clients 16 --chat-clients 4
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+os.environ.setdefault('EMBEDDING_WORKER', 'off')
+os.environ.setdefault('LLM_BACKEND', 'fake')
+os.environ.setdefault('FAKE_LLM_FIRST_TOKEN_DELAY', '0.05')
+os.environ.setdefault('FAKE_LLM_TOKEN_DELAY', '0')
+os.environ.setdefault('DATABASE_URI', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'login.db')}")
+
+from benchmarks.chat_load import percentile, start_sync_server
+
+
+def post(url, payload, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(), headers=headers)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except Exception:
+        status = 'error'
+    return status, time.perf_counter() - start
+
+
+def run_mixed(base_url, tokens, duration, login_clients, chat_clients):
+    deadline = time.perf_counter() + duration
+    logins, chats = [], []
+
+    def login_client(i):
+        while time.perf_counter() < deadline:
+            logins.append(post(f'{base_url}/api/auth/login', {'username': f'user{i}', 'password': 'password'}))
+
+    def chat_client(i):
+        while time.perf_counter() < deadline:
+            chats.append(post(f'{base_url}/api/chat/send', {'message': 'hi'}, tokens[i]))
+
+    threads = [threading.Thread(target=login_client, args=(i,)) for i in range(login_clients)]
+    threads += [threading.Thread(target=chat_client, args=(i,)) for i in range(chat_clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    chat_ok = [latency for status, latency in chats if status == 200]
+    return {
+        'logins_per_sec': sum(1 for status, _ in logins if status == 200) / duration,
+        'login_status_codes': dict(Counter(str(status) for status, _ in logins)),
+        'chats_per_sec': len(chat_ok) / duration,
+        'chat_p50_ms': statistics.median(chat_ok) * 1000 if chat_ok else None,
+        'chat_p95_ms': percentile(chat_ok, 95) * 1000 if chat_ok else None,
+        'chat_p99_ms': percentile(chat_ok, 99) * 1000 if chat_ok else None
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--login-clients', type=int, default=16)
+    parser.add_argument('--chat-clients', type=int, default=4)
+    parser.add_argument('--sync-workers', type=int, default=16, help='worker threads for the WSGI server')
+    parser.add_argument('--hash-workers', type=int, default=2)
+    args = parser.parse_args()
+
+    from app import app
+    from migrations import run_migrations
+    from utils.password_hashing import password_hasher
+
+    run_migrations(app)
+    client = app.test_client()
+    tokens = []
+    for i in range(max(args.login_clients, args.chat_clients)):
+        client.post('/api/auth/register', json={'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'password'})
+        tokens.append(client.post('/api/auth/login', json={'username': f'user{i}', 'password': 'password'}).get_json()['token'])
+
+    start_sync_server(app, 5103, args.sync_workers)
+    base_url = 'http://127.0.0.1:5103'
+
+    results = {}
+    for name, workers in (('inline', 0), ('process_pool', args.hash_workers)):
+        password_hasher.workers = workers
+        results[name] = run_mixed(base_url, tokens, args.duration, args.login_clients, args.chat_clients)
+    password_hasher.shutdown()
+
+    results['pbkdf2_rounds'] = password_hasher.rounds
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
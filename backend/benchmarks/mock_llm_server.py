@@ -0,0 +1,140 @@
+"""
+Local stand-in for the OpenAI completions API with configurable latency and faults.
+
+Each request independently fails with error_status at error_rate, stalls for
+stall_seconds at stall_rate (an upstream that hangs), or takes slow_latency instead of
+latency at slow_rate (a latency tail). The fault settings are attributes of the handler
+class, so a running server can be reconfigured through server.RequestHandlerClass.
+Requests with "stream": true are answered as server-sent events, one word per event.
+
+Point the app at it with OPENAI_API_BASE=http://127.0.0.1:<port>/v1, or run it standalone:
+    python -m benchmarks.mock_llm_server --port 8001 --latency 0.5 --error-rate 0.2
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_TEXT = " That sounds really tough. I'm here for you - what's on your mind?"
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    latency = 0.5
+    text = DEFAULT_TEXT
+    error_rate = 0.0
+    error_status = 500
+    stall_rate = 0.0
+    stall_seconds = 60.0
+    slow_rate = 0.0
+    slow_latency = 2.0
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        if random.random() < self.stall_rate:
+            time.sleep(self.stall_seconds)
+        time.sleep(self.slow_latency if random.random() < self.slow_rate else self.latency)
+        if random.random() < self.error_rate:
+            return self.send_error_body()
+
+        prompts = request.get('prompt') or ['']
+        if isinstance(prompts, str):
+            prompts = [prompts]
+        if request.get('stream'):
+            return self.send_stream(request, len(prompts))
+
+        self.send_json({
+            **self.completion(request),
+            'choices': [
+                {'text': self.text, 'index': i, 'logprobs': None, 'finish_reason': 'stop'}
+                for i in range(len(prompts))
+            ],
+            'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0}
+        })
+
+    def completion(self, request):
+        return {'id': 'cmpl-mock', 'object': 'text_completion', 'created': int(time.time()),
+                'model': request.get('model', 'mock')}
+
+    def send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_body(self):
+        self.send_json({'error': {'message': 'Injected fault', 'type': 'server_error', 'param': None, 'code': None}},
+                       self.error_status)
+
+    def send_stream(self, request, choices):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        for token in re.findall(r'\s*\S+', self.text):
+            for i in range(choices):
+                event = {**self.completion(request),
+                         'choices': [{'text': token, 'index': i, 'logprobs': None, 'finish_reason': None}]}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up on a stalled or slow request are expected, not errors
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def start_mock_llm_server(port=0, latency=0.5, text=DEFAULT_TEXT, **faults):
+    """
+    Start the mock server on a background thread and return (server, base_url); faults
+    sets any of the MockLLMHandler fault attributes
+    """
+    handler = type('ConfiguredMockLLMHandler', (MockLLMHandler,), {'latency': latency, 'text': text, **faults})
+    server = MockLLMServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=500)
+    parser.add_argument('--stall-rate', type=float, default=0.0)
+    parser.add_argument('--stall-seconds', type=float, default=60.0)
+    parser.add_argument('--slow-rate', type=float, default=0.0)
+    parser.add_argument('--slow-latency', type=float, default=2.0)
+    args = parser.parse_args()
+
+    server, base_url = start_mock_llm_server(
+        args.port, args.latency, error_rate=args.error_rate, error_status=args.error_status,
+        stall_rate=args.stall_rate, stall_seconds=args.stall_seconds,
+        slow_rate=args.slow_rate, slow_latency=args.slow_latency
+    )
+    print(f"mock LLM listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
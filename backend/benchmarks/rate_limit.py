@@ -0,0 +1,111 @@
+"""
+One abusive client against a handful of well-behaved users: chat latency for the
+well-behaved users with and without per-user rate limiting and fair LLM scheduling.
+
+Serves the Flask app on a fixed pool of WSGI worker threads with the fake LLM. For
+--duration seconds, --users clients each send a message every --interval seconds (well
+under the per-user limits) while one more user loops on /api/chat/send from
+--abuser-concurrency threads without pausing. Two runs:
+    unlimited  RATE_LIMIT=off and no per-user cap on LLM slots (the previous behaviour)
+    limited    token buckets and FairScheduler with their configured limits
+
+Run from the backend directory:
+    python -m benchmarks.rate_limit --duration 15 --users 8 --abuser-concurrency 32
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+
+os.environ.setdefault('EMBEDDING_WORKER', 'off')
+os.environ.setdefault('LLM_BACKEND', 'fake')
+os.environ.setdefault('FAKE_LLM_FIRST_TOKEN_DELAY', '0.2')
+os.environ.setdefault('FAKE_LLM_TOKEN_DELAY', '0')
+os.environ.setdefault('LLM_MAX_INFLIGHT', '8')
+os.environ.setdefault('DATABASE_URI', f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'rate_limit.db')}")
+
+from benchmarks.chat_load import percentile, start_sync_server
+from benchmarks.login_load import post
+
+
+def run_mixed(url, tokens, abuser_token, args):
+    deadline = time.perf_counter() + args.duration
+    polite, abusive = [], []
+
+    def polite_client(token, offset):
+        # Spread the users out so they do not all send at the same instant
+        time.sleep(offset)
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            polite.append(post(url, {'message': 'I had a rough day'}, token))
+            time.sleep(max(0, args.interval - (time.perf_counter() - start)))
+
+    def abusive_client():
+        while time.perf_counter() < deadline:
+            abusive.append(post(url, {'message': 'spam'}, abuser_token))
+
+    threads = [threading.Thread(target=polite_client, args=(token, args.interval * i / len(tokens)))
+               for i, token in enumerate(tokens)]
+    threads += [threading.Thread(target=abusive_client) for _ in range(args.abuser_concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    polite_ok = [latency for status, latency in polite if status == 200]
+    return {
+        'polite_requests': len(polite),
+        'polite_status_codes': dict(Counter(str(status) for status, _ in polite)),
+        'polite_p50_ms': statistics.median(polite_ok) * 1000 if polite_ok else None,
+        'polite_p95_ms': percentile(polite_ok, 95) * 1000 if polite_ok else None,
+        'polite_p99_ms': percentile(polite_ok, 99) * 1000 if polite_ok else None,
+        'abuser_requests': len(abusive),
+        'abuser_status_codes': dict(Counter(str(status) for status, _ in abusive)),
+        'abuser_served_per_sec': sum(1 for status, _ in abusive if status == 200) / args.duration
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--interval', type=float, default=4.0, help='seconds between a well-behaved user\'s messages')
+    parser.add_argument('--abuser-concurrency', type=int, default=32)
+    parser.add_argument('--sync-workers', type=int, default=16, help='worker threads for the WSGI server')
+    args = parser.parse_args()
+
+    from app import app
+    from migrations import run_migrations
+    from routes.chat import llm_scheduler
+    from utils.rate_limit import rate_limiter
+
+    run_migrations(app)
+    client = app.test_client()
+    tokens = []
+    for i in range(args.users + 1):
+        client.post('/api/auth/register', json={'username': f'user{i}', 'email': f'user{i}@example.com', 'password': 'password'})
+        tokens.append(client.post('/api/auth/login', json={'username': f'user{i}', 'password': 'password'}).get_json()['token'])
+
+    start_sync_server(app, 5104, args.sync_workers)
+    url = 'http://127.0.0.1:5104/api/chat/send'
+
+    max_pending_per_user = llm_scheduler.max_pending_per_user
+    results = {}
+    for name, limited in (('unlimited', False), ('limited', True)):
+        rate_limiter.enabled = limited
+        rate_limiter.store.clear()
+        llm_scheduler.max_pending_per_user = max_pending_per_user if limited else args.abuser_concurrency + args.users
+        results[name] = run_mixed(url, tokens[1:], tokens[0], args)
+        time.sleep(1)
+
+    results['llm_max_inflight'] = llm_scheduler.max_inflight
+    results['llm_max_pending_per_user'] = max_pending_per_user
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Read replica routing against two local SQLite replicas of a SQLite primary.
+
+A replicator thread copies the primary onto each replica every --lag seconds with the
+SQLite backup API, standing in for asynchronous replication, and the replicas are
+opened read-only. Three checks:
+    routing          reads of the read-only endpoints per database, round-robin
+    read_your_writes a user creates a journal entry and reads it back at once, with
+                     the stickiness window off and at DB_REPLICA_STICKY_SECONDS
+    failover         one replica goes away: the health check drops it and reads
+                     continue on the other
+
+Run from the backend directory:
+    python -m benchmarks.replicas --reads 300 --writes 100 --lag 0.5
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+
+workdir = tempfile.mkdtemp()
+PRIMARY = os.path.join(workdir, 'primary.db')
+REPLICAS = [os.path.join(workdir, f'replica{i}.db') for i in range(2)]
+
+os.environ.setdefault('EMBEDDING_WORKER', 'off')
+os.environ.setdefault('LLM_BACKEND', 'fake')
+os.environ.setdefault('FAKE_LLM_FIRST_TOKEN_DELAY', '0')
+os.environ.setdefault('FAKE_LLM_TOKEN_DELAY', '0')
+os.environ.setdefault('RATE_LIMIT', 'off')
+os.environ.setdefault('USER_CACHE_TTL', '0')
+os.environ.setdefault('DB_REPLICA_CHECK_INTERVAL', '0.5')
+os.environ['DATABASE_URI'] = f'sqlite:///{PRIMARY}'
+os.environ['DATABASE_REPLICA_URIS'] = ','.join(f'sqlite:///file:{path}?mode=ro&uri=true' for path in REPLICAS)
+
+
+def replicate(replicas, lag, stop):
+    while not stop.wait(lag):
+        source = sqlite3.connect(PRIMARY)
+        for path in list(replicas):
+            target = sqlite3.connect(path)
+            source.backup(target)
+            target.close()
+        source.close()
+
+
+def reads_per_database(router, before):
+    after = router.stats()
+    names = ['primary_reads', 'sticky_reads', 'replica_reads'] + [f'replica_{i}_reads' for i in range(len(REPLICAS))]
+    return {name: after[name] - before[name] for name in names}
+
+
+def routing(client, headers, router, reads):
+    before = router.stats()
+    urls = ['/api/journal/', '/api/chat/history', '/api/journal/search?q=walk', '/api/auth/profile']
+    statuses = Counter(client.get(urls[i % len(urls)], headers=headers).status_code for i in range(reads))
+    return {'status_codes': {str(code): count for code, count in statuses.items()}, **reads_per_database(router, before)}
+
+
+def read_your_writes(client, headers, router, writes, sticky_seconds):
+    router.sticky_seconds = sticky_seconds
+    found = 0
+    for i in range(writes):
+        journal_id = client.post('/api/journal/', json={'title': f'Entry {i}', 'content': 'Walked by the river.'},
+                                 headers=headers).get_json()['journal']['id']
+        found += client.get(f'/api/journal/{journal_id}', headers=headers).status_code == 200
+    return {'sticky_seconds': sticky_seconds, 'writes': writes, 'read_back': found, 'not_found': writes - found}
+
+
+def failover(app, client, headers, router, replicas, reads):
+    from models.user import db
+
+    # The replica's server goes away: its file disappears and pooled connections drop
+    replicas.remove(REPLICAS[1])
+    os.remove(REPLICAS[1])
+    with app.app_context():
+        db.engines['replica_1'].dispose()
+    time.sleep(router.check_interval * 2)
+
+    before = router.stats()
+    statuses = Counter(client.get('/api/journal/', headers=headers).status_code for _ in range(reads))
+    return {'healthy_replicas': router.stats()['healthy_replicas'],
+            'status_codes': {str(code): count for code, count in statuses.items()}, **reads_per_database(router, before)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--reads', type=int, default=300)
+    parser.add_argument('--writes', type=int, default=100)
+    parser.add_argument('--lag', type=float, default=0.5, help='seconds between replica copies')
+    args = parser.parse_args()
+
+    from app import app
+    from migrations import run_migrations
+    from utils.replicas import replica_router
+
+    run_migrations(app)
+    client = app.test_client()
+    client.post('/api/auth/register', json={'username': 'reader', 'email': 'reader@example.com', 'password': 'password'})
+    token = client.post('/api/auth/login', json={'username': 'reader', 'password': 'password'}).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    for i in range(20):
+        client.post('/api/journal/', json={'title': f'Walk {i}', 'content': 'A long walk after work.'}, headers=headers)
+        client.post('/api/chat/send', json={'message': f'hello {i}'}, headers=headers)
+
+    stop = threading.Event()
+    replicas = list(REPLICAS)
+    threading.Thread(target=replicate, args=(replicas, args.lag, stop), daemon=True).start()
+    time.sleep(args.lag * 2)
+    replica_router.start(app)
+    sticky_seconds = replica_router.sticky_seconds
+
+    # Past the stickiness window of the setup writes
+    time.sleep(sticky_seconds)
+    results = {
+        'replicas': len(REPLICAS),
+        'lag_seconds': args.lag,
+        'routing': routing(client, headers, replica_router, args.reads),
+        'read_your_writes': [read_your_writes(client, headers, replica_router, args.writes, seconds)
+                             for seconds in (0, sticky_seconds)]
+    }
+    time.sleep(sticky_seconds)
+    results['failover'] = failover(app, client, headers, replica_router, replicas, args.reads)
+    stop.set()
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
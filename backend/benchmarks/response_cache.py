@@ -0,0 +1,62 @@
+"""
+Response cache on a workload of repeated and near-duplicate chat openers.
+
+Each simulated request is a fresh conversation (empty history) picking one of a handful
+of openers with random casing and punctuation; a share of the messages are unique. The
+LLM is the local FakeLLM, so the latency saved is the configured fake latency.
+
+Run from the backend directory:
+    python -m benchmarks.response_cache --requests 500 --mode exact
+    python -m benchmarks.response_cache --requests 500 --mode semantic
+"""
+import argparse
+import json
+import random
+import time
+
+from routes.chat import PersonaChain, get_prompt
+from utils.fake_llm import FakeLLM
+from utils.response_cache import ResponseCache, cached_predict
+
+OPENERS = [
+    'hi', 'hey', 'hello', 'I feel anxious today', "I'm feeling anxious today", 'I feel so anxious today',
+    'I feel sad', "can't sleep", 'I cannot sleep', 'good morning', 'I had a bad day', 'I had a really bad day'
+]
+
+
+def vary(rng, text):
+    text = text.upper() if rng.random() < 0.1 else text.capitalize() if rng.random() < 0.5 else text
+    return text + rng.choice(['', '', '!', '.', '...', ' :('])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--mode', choices=['exact', 'semantic'], default='exact')
+    parser.add_argument('--unique-share', type=float, default=0.3)
+    parser.add_argument('--llm-latency', type=float, default=0.05)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    chain = PersonaChain(get_prompt('neutral'), FakeLLM(first_token_delay=args.llm_latency, token_delay=0))
+    cache = ResponseCache(mode=args.mode)
+
+    start = time.perf_counter()
+    for i in range(args.requests):
+        if rng.random() < args.unique_share:
+            message = f'something only I would say, number {i}'
+        else:
+            message = vary(rng, rng.choice(OPENERS))
+        cached_predict(cache, chain, '', message)
+    elapsed = time.perf_counter() - start
+
+    results = cache.stats()
+    results['requests'] = args.requests
+    results['wall_seconds'] = elapsed
+    results['uncached_wall_seconds_estimate'] = args.requests * args.llm_latency
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Recall and latency of the per-user semantic index.
+
+Each probe takes a random fragment of one of a user's journals as the query and checks
+whether that journal comes back in the top k (recall@k). Also times query encoding,
+index search, and loading a user's index from disk.
+
+Run from the backend directory:
+    python -m benchmarks.semantic_search --entries 2000 --probes 200
+"""
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+
+VOCABULARY = (
+    'anxious calm tired happy grateful stressed work family friend walk sleep run coffee rain '
+    'sunshine meeting deadline therapy breathing meditation lonely excited worried proud angry '
+    'hopeful music book dinner weekend exam project morning evening garden cooking movie beach'
+).split()
+
+
+def summarize(values):
+    values = sorted(values)
+    return {'p50_ms': statistics.median(values), 'p95_ms': values[int(0.95 * (len(values) - 1))]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entries', type=int, default=2000, help='journals in the user index')
+    parser.add_argument('--probes', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    args = parser.parse_args()
+
+    from utils.embeddings import EmbeddingManager
+    from utils.vector_index import UserVectorIndexStore
+
+    manager = EmbeddingManager(index_dir=tempfile.mkdtemp())
+
+    rng = random.Random(42)
+    texts = [' '.join(rng.choices(VOCABULARY, k=rng.randint(20, 80))) for _ in range(args.entries)]
+
+    start = time.perf_counter()
+    vectors = manager.encode(texts)
+    encode_seconds = time.perf_counter() - start
+    manager.indexes.upsert(1, [i * 2 for i in range(args.entries)], vectors)
+
+    hits, encode_ms, search_ms = 0, [], []
+    for _ in range(args.probes):
+        target = rng.randrange(args.entries)
+        words = texts[target].split()
+        offset = rng.randrange(max(1, len(words) - 8))
+        query = ' '.join(words[offset:offset + 8])
+
+        start = time.perf_counter()
+        vector = manager.encode([query])[0]
+        encoded = time.perf_counter()
+        matches = manager.indexes.search(1, vector, args.k)
+        searched = time.perf_counter()
+
+        encode_ms.append((encoded - start) * 1000)
+        search_ms.append((searched - encoded) * 1000)
+        hits += any(vector_id == target * 2 for vector_id, _ in matches)
+
+    load_ms = []
+    for _ in range(20):
+        fresh = UserVectorIndexStore(manager.indexes.dimension, index_dir=manager.indexes.index_dir)
+        start = time.perf_counter()
+        fresh.count(1)
+        load_ms.append((time.perf_counter() - start) * 1000)
+
+    print(json.dumps({
+        'entries': args.entries,
+        f'recall_at_{args.k}': hits / args.probes,
+        'bulk_encode_texts_per_sec': args.entries / encode_seconds,
+        'query_encode': summarize(encode_ms),
+        'index_search': summarize(search_ms),
+        'index_load_mmap': summarize(load_ms)
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
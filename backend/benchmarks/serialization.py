@@ -0,0 +1,128 @@
+"""
+Time to build and encode a page of the journal list and of chat history, and the size of
+the response body, before and after column projection, summary mode and orjson.
+
+    orm_to_dict_stdlib   the previous path: ORM objects, to_dict(), Flask's json.dumps
+    projected_stdlib     column-projected rows serialized directly, json.dumps
+    projected_orjson     the same rows encoded with orjson (the default when installed)
+    summary_orjson       ?view=summary: previews truncated in SQL, orjson
+
+Each variant is timed over --repeat pages of --per-page rows, inside a request context
+but without HTTP, so the numbers are query + row handling + encoding only.
+
+Run from the backend directory:
+    python -m benchmarks.serialization --entries 2000 --per-page 100
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('EMBEDDING_WORKER', 'off')
+os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'serialization.db')}"
+
+PARAGRAPH = ('Went for a long walk by the river after work and tried to notice five things I could see. '
+             'Still anxious about the exam on Friday, but talking to Sam helped more than I expected. ')
+
+
+def seed(app, db, entries):
+    from models.user import User
+    from models.chat import Chat
+    from models.journal import Journal
+
+    start = datetime(2024, 1, 1)
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(User.__table__.insert(), [{'id': 1, 'username': 'bench', 'email': 'bench@example.com', 'password_hash': 'x'}])
+            connection.execute(Journal.__table__.insert(), [
+                {'user_id': 1, 'title': f'Entry {i}', 'content': PARAGRAPH * 12,
+                 'created_at': start + timedelta(hours=i), 'updated_at': start + timedelta(hours=i)}
+                for i in range(entries)
+            ])
+            connection.execute(Chat.__table__.insert(), [
+                {'user_id': 1, 'message': PARAGRAPH[:120], 'response': PARAGRAPH * 3, 'timestamp': start + timedelta(minutes=i)}
+                for i in range(entries)
+            ])
+
+
+def variants(app, db, per_page):
+    from models.chat import Chat
+    from models.journal import Journal
+    from routes.journal import journal_list_fields
+    from routes.chat import chat_history_fields
+
+    def orm_page(model, time_column):
+        return [row.to_dict() for row in model.query.filter_by(user_id=1).order_by(time_column.desc(), model.id.desc()).limit(per_page)]
+
+    def projected_page(serializer, names, time_column, id_column):
+        rows = db.session.query(*serializer.columns(names, required=(time_column, id_column))).filter(
+            time_column.class_.user_id == 1
+        ).order_by(time_column.desc(), id_column.desc()).limit(per_page).all()
+        return serializer.serialize(rows, names)
+
+    def stdlib(obj):
+        return json.dumps(obj, sort_keys=True, separators=(',', ':')).encode()
+
+    def orjson(obj):
+        return app.json._orjson_dumps(obj)
+
+    journal_full = journal_list_fields.default
+    journal_summary = journal_list_fields.views['summary']
+    chat_full = chat_history_fields.default
+    chat_summary = chat_history_fields.views['summary']
+
+    return {
+        'journal_list': {
+            'orm_to_dict_stdlib': lambda: stdlib({'journals': orm_page(Journal, Journal.updated_at)}),
+            'projected_stdlib': lambda: stdlib({'journals': projected_page(journal_list_fields, journal_full, Journal.updated_at, Journal.id)}),
+            'projected_orjson': lambda: orjson({'journals': projected_page(journal_list_fields, journal_full, Journal.updated_at, Journal.id)}),
+            'summary_orjson': lambda: orjson({'journals': projected_page(journal_list_fields, journal_summary, Journal.updated_at, Journal.id)})
+        },
+        'chat_history': {
+            'orm_to_dict_stdlib': lambda: stdlib({'chats': orm_page(Chat, Chat.timestamp)}),
+            'projected_stdlib': lambda: stdlib({'chats': projected_page(chat_history_fields, chat_full, Chat.timestamp, Chat.id)}),
+            'projected_orjson': lambda: orjson({'chats': projected_page(chat_history_fields, chat_full, Chat.timestamp, Chat.id)}),
+            'summary_orjson': lambda: orjson({'chats': projected_page(chat_history_fields, chat_summary, Chat.timestamp, Chat.id)})
+        }
+    }
+
+
+def measure(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = function()
+        timings.append(time.perf_counter() - start)
+    return {'median_ms': statistics.median(timings) * 1000, 'payload_bytes': len(body)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--entries', type=int, default=2000)
+    parser.add_argument('--per-page', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    from app import app
+    from migrations import run_migrations
+    from models.user import db
+
+    run_migrations(app)
+    seed(app, db, args.entries)
+
+    results = {}
+    with app.test_request_context():
+        for endpoint, functions in variants(app, db, args.per_page).items():
+            for function in functions.values():
+                function()  # warm up
+            results[endpoint] = {name: measure(function, args.repeat) for name, function in functions.items()}
+            db.session.remove()
+
+    print(json.dumps({'entries': args.entries, 'per_page': args.per_page, **results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Smoke load against the production entry point (serve.py) with several worker processes.
+
+Initializes a fresh database with the migrations command, starts serve.py, then runs
+concurrent clients mixing journal writes with reads and reports status codes and
+latency. On SQLite it runs twice: with the previous connection settings (rollback
+journal, 5 s timeout) and with WAL + busy timeout. Pass --database-uri to run once
+against PostgreSQL (or another local stand-in) instead.
+
+Run from the backend directory:
+    python -m benchmarks.server_smoke --requests 2000 --concurrency 32 --workers 4
+    python -m benchmarks.server_smoke --database-uri postgresql://localhost/friendbot_bench
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.chat_load import percentile
+
+
+def call(method, url, payload=None, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, headers=headers, method=method)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            body = response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        status = e.code
+    except Exception:
+        body, status = b'', 'error'
+    return status, time.perf_counter() - start, body
+
+
+def wait_until_up(base_url, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'{base_url}/health', timeout=1):
+                return
+        except Exception:
+            time.sleep(0.2)
+    raise RuntimeError('server did not start')
+
+
+def run(env_overrides, database_uri, args):
+    env = dict(os.environ, DATABASE_URI=database_uri, PORT=str(args.port), WEB_WORKERS=str(args.workers),
+               EMBEDDING_WORKER='off', LLM_BACKEND='fake', **env_overrides)
+    subprocess.run([sys.executable, '-m', 'migrations'], env=env, check=True, capture_output=True)
+
+    server = subprocess.Popen([sys.executable, 'serve.py'], env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f'http://127.0.0.1:{args.port}'
+    try:
+        wait_until_up(base_url)
+        call('POST', f'{base_url}/api/auth/register', {'username': 'smoke', 'email': 'smoke@example.com', 'password': 'smoke-password'})
+        token = json.loads(call('POST', f'{base_url}/api/auth/login', {'username': 'smoke', 'password': 'smoke-password'})[2])['token']
+
+        def one(i):
+            if i % 2:
+                return call('GET', f'{base_url}/api/journal/?per_page=10', token=token)[:2]
+            return call('POST', f'{base_url}/api/journal/', {'title': f'entry {i}', 'content': 'smoke test ' * 20}, token)[:2]
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            results = list(pool.map(one, range(args.requests)))
+        elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    ok = [latency for status, latency in results if status in (200, 201)]
+    return {
+        'requests_per_sec': len(ok) / elapsed,
+        'p50_ms': statistics.median(ok) * 1000 if ok else None,
+        'p95_ms': percentile(ok, 95) * 1000 if ok else None,
+        'status_codes': dict(Counter(str(status) for status, _ in results))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--port', type=int, default=5104)
+    parser.add_argument('--database-uri', default=os.getenv('BENCH_DATABASE_URI'))
+    args = parser.parse_args()
+
+    if args.database_uri:
+        results = {'configured': run({}, args.database_uri, args)}
+    else:
+        results = {}
+        for name, overrides in (('previous', {'SQLITE_WAL': '0', 'SQLITE_BUSY_TIMEOUT': '5'}),
+                                ('wal_busy_timeout', {'SQLITE_WAL': '1', 'SQLITE_BUSY_TIMEOUT': '15'})):
+            uri = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'smoke.db')}"
+            results[name] = run(overrides, uri, args)
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""
+Cold-start time and resident memory of `import app`, measured in fresh interpreters.
+
+Run from the backend directory:
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --runs 5 --warmup   # also load the embedding model (EMBEDDING_WARMUP=1)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app
+elapsed = time.perf_counter() - start
+with open('/proc/self/status') as status:
+    rss_kb = next(int(line.split()[1]) for line in status if line.startswith('VmRSS:'))
+heavy = [name for name in ('langchain', 'openai', 'sentence_transformers', 'torch', 'faiss') if name in __import__('sys').modules]
+print(json.dumps({'seconds': elapsed, 'rss_mb': rss_kb / 1024, 'heavy_modules': heavy}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--warmup', action='store_true', help='set EMBEDDING_WARMUP=1')
+    args = parser.parse_args()
+
+    env = dict(os.environ, EMBEDDING_WORKER='off', DATABASE_URI='sqlite:///:memory:')
+    if args.warmup:
+        env['EMBEDDING_WARMUP'] = '1'
+
+    runs = []
+    for _ in range(args.runs):
+        output = subprocess.run([sys.executable, '-c', PROBE], env=env, capture_output=True, text=True, check=True)
+        runs.append(json.loads(output.stdout.strip().splitlines()[-1]))
+
+    print(json.dumps({
+        'import_app_seconds_p50': statistics.median(run['seconds'] for run in runs),
+        'rss_mb_p50': statistics.median(run['rss_mb'] for run in runs),
+        'heavy_modules_loaded': runs[-1]['heavy_modules']
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
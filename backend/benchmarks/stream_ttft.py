@@ -0,0 +1,65 @@
+"""
+Time-to-first-token benchmark for /api/chat/stream against the local fake LLM.
+
+Run from the backend directory:
+    python -m benchmarks.stream_ttft --requests 20
+"""
+import argparse
+import os
+import statistics
+import time
+
+os.environ.setdefault('DATABASE_URI', 'sqlite:///:memory:')
+os.environ.setdefault('LLM_BACKEND', 'fake')
+os.environ.setdefault('EMBEDDING_WORKER', 'off')
+os.environ.setdefault('RATE_LIMIT', 'off')
+
+from app import app
+from models.user import db
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def login(client):
+    client.post('/api/auth/register', json={
+        'username': 'bench', 'email': 'bench@example.com', 'password': 'bench-password'
+    })
+    response = client.post('/api/auth/login', json={'username': 'bench', 'password': 'bench-password'})
+    return {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        db.create_all()
+
+    client = app.test_client()
+    headers = login(client)
+
+    first_token, total = [], []
+    for i in range(args.requests):
+        start = time.perf_counter()
+        response = client.post('/api/chat/stream', json={'message': f'hello {i}'},
+                               headers=headers, buffered=False)
+        chunks = iter(response.response)
+        next(chunks)
+        first_token.append(time.perf_counter() - start)
+        for _ in chunks:
+            pass
+        total.append(time.perf_counter() - start)
+        response.close()
+
+    for name, values in (('time to first token', first_token), ('full response', total)):
+        print(f"{name:>20}: p50={statistics.median(values) * 1000:.1f}ms "
+              f"p95={percentile(values, 95) * 1000:.1f}ms")
+
+
+if __name__ == '__main__':
+    main()
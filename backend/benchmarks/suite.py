@@ -0,0 +1,288 @@
+"""
+End-to-end benchmark suite across the auth, chat and journal blueprints.
+
+Builds the app from app.py on SQLite (default, a temporary file) or PostgreSQL, seeds
+synthetic users, chats and journals, swaps the OpenAI LLM for the deterministic FakeLLM
+with a configurable latency, and serves the app over HTTP on a pool of WSGI threads.
+A shuffled mix of requests against every endpoint is then driven concurrently, and each
+endpoint reports throughput, p50/p95/p99 latency, error count and SQL statements per
+request. Results are JSON; --compare flags regressions against an earlier run.
+
+Run from the backend directory:
+    python -m benchmarks.suite --users 200 --requests-per-endpoint 200 --output results.json
+    python -m benchmarks.suite --compare results.json
+    python -m benchmarks.suite --database-uri postgresql://localhost/friendbot_bench
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from benchmarks.chat_load import percentile, start_sync_server
+
+WORDS = ('today', 'work', 'sleep', 'family', 'anxious', 'walk', 'friend', 'tired', 'grateful', 'run', 'exam', 'coffee')
+
+
+def configure_environment(args):
+    # Must happen before app.py is imported
+    os.environ['DATABASE_URI'] = args.database_uri
+    os.environ['LLM_BACKEND'] = 'fake'
+    os.environ['FAKE_LLM_FIRST_TOKEN_DELAY'] = str(args.llm_latency)
+    os.environ['FAKE_LLM_TOKEN_DELAY'] = '0'
+    os.environ['EMBEDDING_WORKER'] = 'off'
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '1')
+
+
+def sentence(rng, length):
+    return ' '.join(rng.choice(WORDS) for _ in range(length))
+
+
+def reset_database(app, db):
+    from sqlalchemy import text
+    from migrations import run_migrations
+
+    with app.app_context():
+        db.drop_all()
+        with db.engine.begin() as connection:
+            connection.execute(text('DROP TABLE IF EXISTS schema_migrations'))
+    run_migrations(app)
+
+
+def seed(app, db, users, chats_per_user, journals_per_user, seed_value):
+    """
+    Bulk-insert the synthetic data set; every user's password is 'password'
+    """
+    from passlib.hash import pbkdf2_sha256
+    from models.user import User
+    from models.chat import Chat
+    from models.journal import Journal
+
+    rng = random.Random(seed_value)
+    password_hash = pbkdf2_sha256.hash('password')
+    start = datetime(2024, 1, 1)
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(User.__table__.insert(), [
+                {'id': i, 'username': f'user{i}', 'email': f'user{i}@example.com', 'password_hash': password_hash,
+                 'preferred_friend_gender': ('male', 'female', 'neutral')[i % 3], 'created_at': start}
+                for i in range(1, users + 1)
+            ])
+            for user_id in range(1, users + 1):
+                if chats_per_user:
+                    connection.execute(Chat.__table__.insert(), [
+                        {'user_id': user_id, 'message': sentence(rng, 12), 'response': sentence(rng, 30),
+                         'timestamp': start + timedelta(minutes=i)}
+                        for i in range(chats_per_user)
+                    ])
+                if journals_per_user:
+                    connection.execute(Journal.__table__.insert(), [
+                        {'user_id': user_id, 'title': sentence(rng, 3), 'content': sentence(rng, 80),
+                         'created_at': start + timedelta(hours=i), 'updated_at': start + timedelta(hours=i)}
+                        for i in range(journals_per_user)
+                    ])
+
+        journal_ids = defaultdict(list)
+        for journal_id, user_id in db.session.execute(db.select(Journal.id, Journal.user_id)):
+            journal_ids[user_id].append(journal_id)
+        db.session.remove()
+    return journal_ids
+
+
+def scenarios(rng, journal_ids):
+    """
+    Endpoint name -> function(user_id) returning (method, path, body)
+    """
+    def existing_journal(user_id):
+        return rng.choice(journal_ids[user_id]) if journal_ids[user_id] else 0
+
+    return {
+        'auth.login': lambda user_id: ('POST', '/api/auth/login', {'username': f'user{user_id}', 'password': 'password'}),
+        'auth.profile': lambda user_id: ('GET', '/api/auth/profile', None),
+        'chat.send': lambda user_id: ('POST', '/api/chat/send', {'message': sentence(rng, 8)}),
+        'chat.history': lambda user_id: ('GET', '/api/chat/history?per_page=20', None),
+        'journal.create': lambda user_id: ('POST', '/api/journal/', {'title': sentence(rng, 3), 'content': sentence(rng, 60)}),
+        'journal.list': lambda user_id: ('GET', '/api/journal/?per_page=10', None),
+        'journal.get': lambda user_id: ('GET', f'/api/journal/{existing_journal(user_id)}', None),
+        'journal.update': lambda user_id: ('PUT', f'/api/journal/{existing_journal(user_id)}', {'content': sentence(rng, 60)}),
+        'journal.search': lambda user_id: ('GET', f'/api/journal/search?q={rng.choice(WORDS)}', None),
+    }
+
+
+def call(base_url, method, path, body, token):
+    headers = {'Content-Type': 'application/json', 'Authorization': f'Bearer {token}'}
+    data = json.dumps(body).encode() if body is not None else None
+    request = urllib.request.Request(base_url + path, data=data, headers=headers, method=method)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=120) as response:
+            response.read()
+            status, queries = response.status, response.headers.get('X-Query-Count')
+    except urllib.error.HTTPError as e:
+        e.read()
+        status, queries = e.code, e.headers.get('X-Query-Count')
+    except Exception:
+        status, queries = 'error', None
+    return status, time.perf_counter() - start, int(queries) if queries is not None else None
+
+
+def run_mixed(base_url, tokens, plan, concurrency):
+    def one(item):
+        name, user_id, (method, path, body) = item
+        return name, call(base_url, method, path, body, tokens[user_id])
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, plan))
+    elapsed = time.perf_counter() - start
+
+    by_endpoint = defaultdict(list)
+    for name, result in results:
+        by_endpoint[name].append(result)
+
+    report = {}
+    for name, calls in sorted(by_endpoint.items()):
+        ok = [latency for status, latency, _ in calls if status in (200, 201)]
+        queries = [count for status, _, count in calls if count is not None]
+        report[name] = {
+            'requests': len(calls),
+            'errors': len(calls) - len(ok),
+            'throughput_rps': len(ok) / elapsed,
+            'p50_ms': statistics.median(ok) * 1000 if ok else None,
+            'p95_ms': percentile(ok, 95) * 1000 if ok else None,
+            'p99_ms': percentile(ok, 99) * 1000 if ok else None,
+            'queries_per_request': sum(queries) / len(queries) if queries else None
+        }
+    return report, elapsed
+
+
+def compare(results, baseline, tolerance):
+    """
+    Endpoints whose p95 grew by more than tolerance, or that issue more queries
+    """
+    regressions = []
+    for name, current in results['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if not previous:
+            continue
+        if previous['p95_ms'] and current['p95_ms'] and current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {previous['p95_ms']:.1f} -> {current['p95_ms']:.1f} ms")
+        if (previous['queries_per_request'] is not None and current['queries_per_request'] is not None
+                and current['queries_per_request'] > previous['queries_per_request'] + 0.01):
+            regressions.append(f"{name}: queries/request {previous['queries_per_request']:.2f} -> {current['queries_per_request']:.2f}")
+        if current['errors'] > previous['errors']:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-uri', default=os.getenv('BENCH_DATABASE_URI'))
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--chats-per-user', type=int, default=50)
+    parser.add_argument('--journals-per-user', type=int, default=20)
+    parser.add_argument('--requests-per-endpoint', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--server-threads', type=int, default=16)
+    parser.add_argument('--llm-latency', type=float, default=0.2, help='fake LLM latency in seconds')
+    parser.add_argument('--port', type=int, default=5110)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='write the JSON results to this file as well')
+    parser.add_argument('--compare', help='baseline JSON from an earlier run')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 growth before flagging (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    if not args.database_uri:
+        args.database_uri = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'suite.db')}"
+    configure_environment(args)
+
+    import jwt
+    from flask import g
+    from app import app
+    from models.user import db
+    from routes.auth import JWT_SECRET
+
+    # Report the SQL statement count of each request back to the client
+    @app.after_request
+    def add_query_count(response):
+        if 'query_count' in g:
+            response.headers['X-Query-Count'] = str(g.query_count)
+        return response
+
+    reset_database(app, db)
+    seed_start = time.perf_counter()
+    journal_ids = seed(app, db, args.users, args.chats_per_user, args.journals_per_user, args.seed)
+    seed_seconds = time.perf_counter() - seed_start
+
+    tokens = {user_id: jwt.encode({'user_id': user_id}, JWT_SECRET, algorithm='HS256') for user_id in range(1, args.users + 1)}
+
+    rng = random.Random(args.seed)
+    endpoints = scenarios(rng, journal_ids)
+    plan = []
+    for name, build in endpoints.items():
+        for _ in range(args.requests_per_endpoint):
+            user_id = rng.randint(1, args.users)
+            plan.append((name, user_id, build(user_id)))
+    rng.shuffle(plan)
+
+    server = start_sync_server(app, args.port, args.server_threads)
+    try:
+        report, elapsed = run_mixed(f'http://127.0.0.1:{args.port}', tokens, plan, args.concurrency)
+    finally:
+        threading.Thread(target=server.shutdown, daemon=True).start()
+
+    results = {
+        'meta': {
+            'revision': git_revision(),
+            'timestamp': datetime.utcnow().isoformat(),
+            'python': platform.python_version(),
+            'database': args.database_uri.split(':', 1)[0],
+            'users': args.users,
+            'chats_per_user': args.chats_per_user,
+            'journals_per_user': args.journals_per_user,
+            'requests_per_endpoint': args.requests_per_endpoint,
+            'concurrency': args.concurrency,
+            'server_threads': args.server_threads,
+            'llm_latency': args.llm_latency,
+            'seed_seconds': seed_seconds,
+            'total_seconds': elapsed
+        },
+        'endpoints': report
+    }
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
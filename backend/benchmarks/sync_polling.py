@@ -0,0 +1,206 @@
+"""
+A client polling the journal list and chat history: bytes downloaded, server time and
+SQL statements per poll, with three strategies:
+    full_page   GET the first page of each list on every poll (the previous frontend)
+    etag        the same requests with If-None-Match, answered 304 while nothing changed
+    delta       ?since=<cursor>, applying deletions then upserts to a local copy
+
+Every --change-every polls the user sends a chat message and edits a journal entry, and
+every --delete-every polls deletes one. The delta client's initial sync is reported
+separately and its local copy is checked against the database at the end. Polls are
+--interval seconds apart; SYNC_SETTLE_SECONDS is scaled down to match (a real client
+polling every 30 s would see the default 2 s window the same way).
+
+Run from the backend directory:
+    python -m benchmarks.sync_polling --journals 200 --chats 1000 --polls 100
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault('EMBEDDING_WORKER', 'off')
+os.environ.setdefault('LLM_BACKEND', 'fake')
+os.environ.setdefault('FAKE_LLM_FIRST_TOKEN_DELAY', '0')
+os.environ.setdefault('FAKE_LLM_TOKEN_DELAY', '0')
+os.environ.setdefault('RATE_LIMIT', 'off')
+os.environ.setdefault('SYNC_SETTLE_SECONDS', '0.05')
+os.environ['DATABASE_URI'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'sync.db')}"
+
+PARAGRAPH = ('Went for a long walk by the river after work and tried to notice five things I could see. '
+             'Still anxious about the exam on Friday, but talking to Sam helped more than I expected. ')
+
+
+def seed(app, db, journals, chats):
+    from models.chat import Chat
+    from models.journal import Journal
+
+    start = datetime.utcnow() - timedelta(days=30)
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(Journal.__table__.insert(), [
+                {'user_id': 1, 'title': f'Entry {i}', 'content': PARAGRAPH * 6,
+                 'created_at': start + timedelta(minutes=i), 'updated_at': start + timedelta(minutes=i)}
+                for i in range(journals)
+            ])
+            connection.execute(Chat.__table__.insert(), [
+                {'user_id': 1, 'message': PARAGRAPH[:120], 'response': PARAGRAPH * 2, 'timestamp': start + timedelta(minutes=i)}
+                for i in range(chats)
+            ])
+
+
+class Meter:
+    """
+    Counts SQL statements issued while a poll is served
+    """
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.statements = 0
+        event.listen(engine, 'before_cursor_execute', self.count)
+
+    def count(self, *args):
+        self.statements += 1
+
+
+class Poller:
+    def __init__(self, client, headers, meter):
+        self.client, self.headers, self.meter = client, headers, meter
+        self.reset()
+
+    def reset(self):
+        self.requests = self.bytes = self.not_modified = self.statements = 0
+        self.seconds = 0.0
+
+    def get(self, url, headers=None):
+        self.meter.statements = 0
+        start = time.perf_counter()
+        response = self.client.get(url, headers={**self.headers, **(headers or {})})
+        self.seconds += time.perf_counter() - start
+        self.statements += self.meter.statements
+        self.requests += 1
+        self.bytes += len(response.data)
+        self.not_modified += response.status_code == 304
+        return response
+
+    def report(self, polls):
+        return {
+            'requests': self.requests,
+            'not_modified': self.not_modified,
+            'kb_per_poll': self.bytes / polls / 1024,
+            'server_ms_per_poll': self.seconds / polls * 1000,
+            'sql_statements_per_poll': self.statements / polls
+        }
+
+
+class FullPageClient(Poller):
+    def __init__(self, *args, per_page, conditional=False):
+        super().__init__(*args)
+        self.urls = [f'/api/journal/?per_page={per_page}', f'/api/chat/history?per_page={per_page}']
+        self.conditional = conditional
+        self.etags = {}
+
+    def poll(self):
+        for url in self.urls:
+            headers = {'If-None-Match': self.etags[url]} if self.conditional and url in self.etags else None
+            response = self.get(url, headers)
+            self.etags[url] = response.headers.get('ETag')
+
+
+class DeltaClient(Poller):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.local = {'journals': {}, 'chats': {}}
+        self.cursors = {'journals': '', 'chats': ''}
+        self.urls = {'journals': '/api/journal/', 'chats': '/api/chat/history'}
+
+    def poll(self):
+        for key, url in self.urls.items():
+            while True:
+                body = self.get(f'{url}?since={self.cursors[key]}').get_json()
+                if body['cleared']:
+                    self.local[key].clear()
+                for item_id in body['deleted']:
+                    self.local[key].pop(item_id, None)
+                for row in body[key]:
+                    self.local[key][row['id']] = row
+                self.cursors[key] = body['cursor']
+                if not body['has_more']:
+                    break
+
+
+def change(client, headers, poll, args, journal_ids):
+    if poll % args.change_every == 0:
+        client.post('/api/chat/send', json={'message': f'update {poll}'}, headers=headers)
+        client.put(f'/api/journal/{journal_ids[poll % len(journal_ids)]}', json={'title': f'Edited {poll}'}, headers=headers)
+    if poll % args.delete_every == 0:
+        client.delete(f'/api/journal/{journal_ids.pop()}', headers=headers)
+
+
+def matches_database(app, local):
+    from models.chat import Chat
+    from models.journal import Journal
+
+    with app.app_context():
+        journals = {journal.id: journal.title for journal in Journal.query.filter_by(user_id=1)}
+        chats = {chat.id for chat in Chat.query.filter_by(user_id=1)}
+    return journals == {item_id: row['title'] for item_id, row in local['journals'].items()} and chats == set(local['chats'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--journals', type=int, default=200)
+    parser.add_argument('--chats', type=int, default=1000)
+    parser.add_argument('--polls', type=int, default=100)
+    parser.add_argument('--per-page', type=int, default=50, help='page size of the full-page clients')
+    parser.add_argument('--interval', type=float, default=0.1, help='seconds between polls')
+    parser.add_argument('--change-every', type=int, default=10)
+    parser.add_argument('--delete-every', type=int, default=25)
+    args = parser.parse_args()
+
+    from app import app
+    from migrations import run_migrations
+    from models.user import db
+
+    run_migrations(app)
+    client = app.test_client()
+    client.post('/api/auth/register', json={'username': 'poller', 'email': 'poller@example.com', 'password': 'password'})
+    token = client.post('/api/auth/login', json={'username': 'poller', 'password': 'password'}).get_json()['token']
+    headers = {'Authorization': f'Bearer {token}'}
+    seed(app, db, args.journals, args.chats)
+
+    with app.app_context():
+        meter = Meter(db.engine)
+    journal_ids = list(range(1, args.journals + 1))
+
+    clients = {
+        'full_page': FullPageClient(client, headers, meter, per_page=args.per_page),
+        'etag': FullPageClient(client, headers, meter, per_page=args.per_page, conditional=True),
+        'delta': DeltaClient(client, headers, meter)
+    }
+
+    results = {}
+    for name, poller in clients.items():
+        if name == 'delta':
+            poller.poll()
+            results['delta_initial_sync'] = poller.report(1)
+            poller.reset()
+
+        for poll in range(1, args.polls + 1):
+            change(client, headers, poll, args, journal_ids)
+            poller.poll()
+            time.sleep(args.interval)
+        results[name] = poller.report(args.polls)
+
+    # One last poll so the delta copy includes the final changes
+    time.sleep(float(os.environ['SYNC_SETTLE_SECONDS']))
+    clients['delta'].poll()
+    results['delta']['local_copy_matches_database'] = matches_database(app, clients['delta'].local)
+
+    print(json.dumps({'journals': args.journals, 'chats': args.chats, 'polls': args.polls, **results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
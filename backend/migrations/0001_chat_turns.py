@@ -0,0 +1,28 @@
+"""
+Store one chats row per conversation turn.
+
+Previously every turn wrote a user row (is_from_user = true) that later received the
+response, plus an AI row repeating both the message and the response. The AI copies
+of turns whose user row already holds the response are deleted, and is_from_user is
+dropped. AI rows without a matching user row are kept, since they are complete turns.
+"""
+from sqlalchemy import inspect, text
+
+def upgrade(connection):
+    columns = {column['name'] for column in inspect(connection).get_columns('chats')}
+    if 'is_from_user' not in columns:
+        return
+
+    connection.execute(text("""
+        DELETE FROM chats
+        WHERE is_from_user = :ai
+          AND EXISTS (
+            SELECT 1 FROM chats AS turn
+            WHERE turn.user_id = chats.user_id
+              AND turn.is_from_user = :user
+              AND turn.message = chats.message
+              AND turn.response = chats.response
+          )
+    """), {'ai': False, 'user': True})
+
+    connection.execute(text('ALTER TABLE chats DROP COLUMN is_from_user'))
@@ -0,0 +1,13 @@
+"""
+Composite (user_id, time, id) indexes backing the per-user, newest-first queries:
+recent chat history, paginated chat history and the journal listing.
+"""
+from sqlalchemy import text
+
+def upgrade(connection):
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_chats_user_id_timestamp ON chats (user_id, timestamp, id)'
+    ))
+    connection.execute(text(
+        'CREATE INDEX IF NOT EXISTS ix_journals_user_id_updated_at ON journals (user_id, updated_at, id)'
+    ))
@@ -0,0 +1,9 @@
+"""
+Full-text search index for journals (FTS5 on SQLite, tsvector + GIN on PostgreSQL),
+backfilled from the existing rows.
+"""
+from utils.search import create_search_index, rebuild_search_index
+
+def upgrade(connection):
+    create_search_index(connection)
+    rebuild_search_index(connection)
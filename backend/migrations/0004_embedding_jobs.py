@@ -0,0 +1,7 @@
+"""
+Durable queue table for the background embedding worker.
+"""
+from models.embedding_job import EmbeddingJob
+
+def upgrade(connection):
+    EmbeddingJob.__table__.create(connection, checkfirst=True)
@@ -0,0 +1,7 @@
+"""
+Per-user rolling conversation summaries used by the token-budgeted chat context.
+"""
+from models.conversation_summary import ConversationSummary
+
+def upgrade(connection):
+    ConversationSummary.__table__.create(connection, checkfirst=True)
@@ -0,0 +1,9 @@
+"""
+Per-user opt-out from the shared chat response cache.
+"""
+from sqlalchemy import inspect, text
+
+def upgrade(connection):
+    columns = {column['name'] for column in inspect(connection).get_columns('users')}
+    if 'allow_response_cache' not in columns:
+        connection.execute(text('ALTER TABLE users ADD COLUMN allow_response_cache BOOLEAN NOT NULL DEFAULT TRUE'))
@@ -0,0 +1,62 @@
+"""
+ON DELETE CASCADE on every foreign key to users, plus the deletion_jobs progress table.
+
+PostgreSQL swaps the constraints in place. SQLite cannot alter a foreign key, so each
+child table is rebuilt: a copy is created from the model, the rows are copied over,
+the old table is dropped and the copy renamed, then its indexes (and, for journals,
+the full-text triggers) are recreated. Row ids are kept, so the FTS index stays valid.
+"""
+from sqlalchemy import MetaData, inspect, text
+from models.user import User
+from models.chat import Chat
+from models.journal import Journal
+from models.conversation_summary import ConversationSummary
+from models.deletion_job import DeletionJob
+from utils.search import create_search_index
+
+CHILD_TABLES = [Chat.__table__, Journal.__table__, ConversationSummary.__table__]
+
+def _cascades(inspector, table_name):
+    foreign_keys = [fk for fk in inspector.get_foreign_keys(table_name) if fk['referred_table'] == 'users']
+    return bool(foreign_keys) and all((fk.get('options') or {}).get('ondelete', '').upper() == 'CASCADE'
+                                      for fk in foreign_keys)
+
+def _rebuild_sqlite_table(connection, table, existing_columns):
+    metadata = MetaData()
+    User.__table__.to_metadata(metadata)
+    copy = table.to_metadata(metadata, name=f'{table.name}__new')
+    copy.indexes.clear()
+    copy.create(connection)
+
+    columns = ', '.join(column.name for column in table.columns if column.name in existing_columns)
+    connection.execute(text(f'INSERT INTO {copy.name} ({columns}) SELECT {columns} FROM {table.name}'))
+    connection.execute(text(f'DROP TABLE {table.name}'))
+    connection.execute(text(f'ALTER TABLE {copy.name} RENAME TO {table.name}'))
+    for index in table.indexes:
+        index.create(connection)
+
+def _replace_postgres_constraint(connection, inspector, table):
+    for fk in inspector.get_foreign_keys(table.name):
+        if fk['referred_table'] == 'users' and fk.get('name'):
+            connection.execute(text(f'ALTER TABLE {table.name} DROP CONSTRAINT {fk["name"]}'))
+    connection.execute(text(
+        f'ALTER TABLE {table.name} ADD CONSTRAINT {table.name}_user_id_fkey '
+        'FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE'
+    ))
+
+def upgrade(connection):
+    inspector = inspect(connection)
+    for table in CHILD_TABLES:
+        if not inspector.has_table(table.name) or _cascades(inspector, table.name):
+            continue
+
+        if connection.dialect.name == 'sqlite':
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            _rebuild_sqlite_table(connection, table, existing_columns)
+            if table is Journal.__table__:
+                # Dropping the old table dropped its triggers
+                create_search_index(connection)
+        elif connection.dialect.name == 'postgresql':
+            _replace_postgres_constraint(connection, inspector, table)
+
+    DeletionJob.__table__.create(connection, checkfirst=True)
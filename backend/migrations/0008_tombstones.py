@@ -0,0 +1,7 @@
+"""
+Tombstones recording deleted journal entries and cleared chat histories for delta sync.
+"""
+from models.tombstone import Tombstone
+
+def upgrade(connection):
+    Tombstone.__table__.create(connection, checkfirst=True)
@@ -0,0 +1,18 @@
+"""
+Sentiment scores on journals and chats, and the daily_activity rollups behind the
+insights endpoint, back-filled from the existing rows (scores come later, from the
+embedding worker or python -m utils.insights --rescore).
+"""
+from sqlalchemy import inspect, text
+from models.daily_activity import DailyActivity
+from utils.insights import rebuild_rollups
+
+def upgrade(connection):
+    inspector = inspect(connection)
+    for table in ('journals', 'chats'):
+        columns = {column['name'] for column in inspector.get_columns(table)}
+        if 'sentiment' not in columns:
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN sentiment FLOAT'))
+
+    DailyActivity.__table__.create(connection, checkfirst=True)
+    rebuild_rollups(connection)
@@ -0,0 +1,8 @@
+"""
+Queue the journal entries and chat turns written before writes enqueued embedding
+jobs (0004), so the semantic index covers existing data.
+"""
+from utils.embedding_worker import enqueue_backfill
+
+def upgrade(connection):
+    enqueue_backfill(connection)
@@ -0,0 +1,11 @@
+"""
+Sharing cached chat replies between users becomes opt-in: users who never chose were
+opted in by 0006's default, so everyone starts opted out and new users default to it.
+"""
+from sqlalchemy import text
+
+def upgrade(connection):
+    connection.execute(text('UPDATE users SET allow_response_cache = FALSE'))
+    # SQLite cannot change a column default; the model supplies FALSE on insert there
+    if connection.dialect.name == 'postgresql':
+        connection.execute(text('ALTER TABLE users ALTER COLUMN allow_response_cache SET DEFAULT FALSE'))
@@ -0,0 +1,78 @@
+"""
+Minimal schema migrations for FriendBot.
+
+Each module listed in MIGRATIONS defines upgrade(connection) and is applied once, in
+order, inside its own transaction. Applied versions are recorded in schema_migrations.
+A brand-new database is created straight from the models and marked as up to date.
+
+Run from the backend directory:
+    python -m migrations
+"""
+import importlib
+from sqlalchemy import inspect, text
+from models.user import db
+
+# Applied in order; never reorder or remove entries
+MIGRATIONS = [
+    '0001_chat_turns',
+    '0002_user_time_indexes',
+    '0003_journal_search',
+    '0004_embedding_jobs',
+    '0005_conversation_summaries',
+    '0006_response_cache_opt_out',
+    '0007_cascading_deletes',
+    '0008_tombstones',
+    '0009_daily_activity',
+    '0010_embedding_backfill',
+    '0011_response_cache_opt_in',
+]
+
+def _applied_versions(connection):
+    connection.execute(text('CREATE TABLE IF NOT EXISTS schema_migrations (version VARCHAR(64) PRIMARY KEY)'))
+    return {row[0] for row in connection.execute(text('SELECT version FROM schema_migrations'))}
+
+def _mark_applied(connection, version):
+    connection.execute(text('INSERT INTO schema_migrations (version) VALUES (:version)'), {'version': version})
+
+def run_migrations(app):
+    """
+    Bring the database behind app up to date, returning the versions that were applied
+    """
+    # Import every model so create_all sees the full schema
+    import models.chat  # noqa: F401
+    import models.journal  # noqa: F401
+    import models.embedding_job  # noqa: F401
+    import models.conversation_summary  # noqa: F401
+    import models.deletion_job  # noqa: F401
+    import models.tombstone  # noqa: F401
+    import models.daily_activity  # noqa: F401
+
+    applied_now = []
+    with app.app_context():
+        engine = db.engine
+
+        with engine.begin() as connection:
+            fresh = not inspect(connection).has_table('users')
+            applied = _applied_versions(connection)
+
+        # Only on the primary; replicas (utils/replicas.py) get the schema by replication
+        if fresh:
+            db.create_all(bind_key=None)
+            with engine.begin() as connection:
+                for version in MIGRATIONS:
+                    _mark_applied(connection, version)
+            return applied_now
+
+        for version in MIGRATIONS:
+            if version in applied:
+                continue
+            module = importlib.import_module(f'migrations.{version}')
+            with engine.begin() as connection:
+                module.upgrade(connection)
+                _mark_applied(connection, version)
+            applied_now.append(version)
+
+        # Create any tables introduced since the database was first built
+        db.create_all(bind_key=None)
+
+    return applied_now
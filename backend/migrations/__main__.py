@@ -0,0 +1,9 @@
+from app import app
+from migrations import run_migrations
+
+if __name__ == '__main__':
+    applied = run_migrations(app)
+    if applied:
+        print(f"Applied migrations: {', '.join(applied)}")
+    else:
+        print('Database is up to date.')
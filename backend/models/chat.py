@@ -3,19 +3,23 @@ from models.user import db
 
 class Chat(db.Model):
     __tablename__ = 'chats'
+    __table_args__ = (
+        # Every hot query filters on user_id and sorts newest first
+        db.Index('ix_chats_user_id_timestamp', 'user_id', 'timestamp', 'id'),
+    )
     
+    # One row per conversation turn: the user's message and the AI reply to it
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     message = db.Column(db.Text, nullable=False)
     response = db.Column(db.Text, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    is_from_user = db.Column(db.Boolean, default=True)  # True if message is from user, False if from AI
+    sentiment = db.Column(db.Float, nullable=True)  # -1..1, scored from the turn's embedding
     
-    def __init__(self, user_id, message, response=None, is_from_user=True):
+    def __init__(self, user_id, message, response=None):
         self.user_id = user_id
         self.message = message
         self.response = response
-        self.is_from_user = is_from_user
     
     def to_dict(self):
         return {
@@ -23,6 +27,5 @@ class Chat(db.Model):
             'user_id': self.user_id,
             'message': self.message,
             'response': self.response,
-            'timestamp': self.timestamp.isoformat() if self.timestamp else None,
-            'is_from_user': self.is_from_user
+            'timestamp': self.timestamp.isoformat() if self.timestamp else None
         }
\ No newline at end of file
@@ -0,0 +1,17 @@
+from datetime import datetime
+from models.user import db
+
+class ConversationSummary(db.Model):
+    __tablename__ = 'conversation_summaries'
+    
+    # Rolling summary of a user's older chat turns, extended as turns fall out of the prompt
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), unique=True, nullable=False)
+    summary = db.Column(db.Text, nullable=False, default='')
+    last_chat_id = db.Column(db.Integer, nullable=False, default=0)  # Turns up to this id are summarized
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __init__(self, user_id, summary='', last_chat_id=0):
+        self.user_id = user_id
+        self.summary = summary
+        self.last_chat_id = last_chat_id
\ No newline at end of file
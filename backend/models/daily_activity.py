@@ -0,0 +1,21 @@
+from models.user import db
+
+class DailyActivity(db.Model):
+    __tablename__ = 'daily_activity'
+    
+    # Per-user, per-day (UTC) rollup behind the insights dashboard, kept up to date by the
+    # journal and chat write paths (counts, words) and the embedding worker (sentiment)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    journal_entries = db.Column(db.Integer, nullable=False, default=0)
+    journal_words = db.Column(db.Integer, nullable=False, default=0)
+    journal_sentiment_sum = db.Column(db.Float, nullable=False, default=0.0)
+    journal_sentiment_count = db.Column(db.Integer, nullable=False, default=0)  # Entries scored so far
+    chat_messages = db.Column(db.Integer, nullable=False, default=0)
+    chat_words = db.Column(db.Integer, nullable=False, default=0)  # Words the user wrote, not the replies
+    chat_sentiment_sum = db.Column(db.Float, nullable=False, default=0.0)
+    chat_sentiment_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    @property
+    def active(self):
+        return self.journal_entries > 0 or self.chat_messages > 0
\ No newline at end of file
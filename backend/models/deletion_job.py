@@ -0,0 +1,41 @@
+from datetime import datetime
+from models.user import db
+
+class DeletionJob(db.Model):
+    __tablename__ = 'deletion_jobs'
+    
+    # Progress of a chunked background delete; kept after the user row is gone, so no foreign key
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # 'chat_history' or 'account'
+    status = db.Column(db.String(10), nullable=False, default='pending')  # 'pending', 'running', 'done' or 'failed'
+    total = db.Column(db.Integer, nullable=False, default=0)  # Rows to delete, counted when the job starts
+    deleted = db.Column(db.Integer, nullable=False, default=0)
+    error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    
+    def __init__(self, user_id, kind, total=0):
+        self.user_id = user_id
+        self.kind = kind
+        self.status = 'pending'
+        self.total = total
+        self.deleted = 0
+    
+    @property
+    def active(self):
+        return self.status in ('pending', 'running')
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'total': self.total,
+            'deleted': self.deleted,
+            'progress': min(self.deleted / self.total, 1.0) if self.total else (1.0 if self.status == 'done' else 0.0),
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
\ No newline at end of file
@@ -0,0 +1,23 @@
+from datetime import datetime
+from models.user import db
+
+class EmbeddingJob(db.Model):
+    __tablename__ = 'embedding_jobs'
+    
+    # Durable queue of texts waiting to be (re-)embedded or removed from a user's semantic index
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # 'journal' or 'chat'
+    item_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(10), nullable=False, default='upsert')  # 'upsert' or 'delete'
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    claimed_at = db.Column(db.DateTime, nullable=True)
+    claimed_by = db.Column(db.String(100), nullable=True)
+    
+    def __init__(self, user_id, kind, item_id, action='upsert'):
+        self.user_id = user_id
+        self.kind = kind
+        self.item_id = item_id
+        self.action = action
+        self.attempts = 0
\ No newline at end of file
@@ -1,15 +1,22 @@
 from datetime import datetime
+from sqlalchemy import event
 from models.user import db
+from utils.search import create_search_index, drop_search_index
 
 class Journal(db.Model):
     __tablename__ = 'journals'
+    __table_args__ = (
+        # Journal listings filter on user_id and sort by most recently updated
+        db.Index('ix_journals_user_id_updated_at', 'user_id', 'updated_at', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     title = db.Column(db.String(100), nullable=False)
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sentiment = db.Column(db.Float, nullable=True)  # -1..1, scored from the entry's embedding
     
     def __init__(self, user_id, title, content):
         self.user_id = user_id
@@ -24,4 +31,8 @@ class Journal(db.Model):
             'content': self.content,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
\ No newline at end of file
+        }
+
+# Keep the dialect-specific full-text index (see utils/search.py) alongside the table
+event.listen(Journal.__table__, 'after_create', lambda target, connection, **kw: create_search_index(connection))
+event.listen(Journal.__table__, 'before_drop', lambda target, connection, **kw: drop_search_index(connection))
\ No newline at end of file
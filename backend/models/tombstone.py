@@ -0,0 +1,22 @@
+from datetime import datetime
+from models.user import db
+
+class Tombstone(db.Model):
+    __tablename__ = 'tombstones'
+    __table_args__ = (
+        # Delta sync reads a user's deletions of one kind after a point in time
+        db.Index('ix_tombstones_user_id_kind_deleted_at', 'user_id', 'kind', 'deleted_at'),
+    )
+    
+    # Record of a deleted row, so clients syncing with ?since= learn it is gone
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    kind = db.Column(db.String(10), nullable=False)  # 'journal' or 'chat'
+    item_id = db.Column(db.Integer, nullable=True)  # None when every row of the kind was deleted
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def __init__(self, user_id, kind, item_id=None, deleted_at=None):
+        self.user_id = user_id
+        self.kind = kind
+        self.item_id = item_id
+        self.deleted_at = deleted_at or datetime.utcnow()
\ No newline at end of file
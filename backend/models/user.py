@@ -1,8 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from passlib.hash import pbkdf2_sha256
+from utils.password_hashing import password_hasher
+from utils.replicas import RoutingSession
 
-db = SQLAlchemy()
+# Reads of read-only handlers may be routed to a replica (utils/replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 def init_db(app):
     db.init_app(app)
@@ -17,10 +19,11 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime, nullable=True)
     preferred_friend_gender = db.Column(db.String(10), default='neutral')  # 'male', 'female', or 'neutral'
+    allow_response_cache = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())  # Opt in to cached replies shared between users
     
-    # Relationships
-    chats = db.relationship('Chat', backref='user', lazy=True, cascade='all, delete-orphan')
-    journals = db.relationship('Journal', backref='user', lazy=True, cascade='all, delete-orphan')
+    # Relationships; child rows are removed by the database (ON DELETE CASCADE), not loaded
+    chats = db.relationship('Chat', backref='user', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
+    journals = db.relationship('Journal', backref='user', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     
     def __init__(self, username, email, password, preferred_friend_gender='neutral'):
         self.username = username
@@ -29,10 +32,14 @@ class User(db.Model):
         self.preferred_friend_gender = preferred_friend_gender
     
     def hash_password(self, password):
-        return pbkdf2_sha256.hash(password)
+        return password_hasher.hash(password)
     
     def verify_password(self, password):
-        return pbkdf2_sha256.verify(password, self.password_hash)
+        # Stored hashes made with outdated parameters are replaced; the caller commits
+        matches, new_hash = password_hasher.verify(password, self.password_hash)
+        if new_hash:
+            self.password_hash = new_hash
+        return matches
     
     def to_dict(self):
         return {
@@ -41,5 +48,6 @@ class User(db.Model):
             'email': self.email,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'last_login': self.last_login.isoformat() if self.last_login else None,
-            'preferred_friend_gender': self.preferred_friend_gender
+            'preferred_friend_gender': self.preferred_friend_gender,
+            'allow_response_cache': self.allow_response_cache
         }
\ No newline at end of file
@@ -1,8 +1,14 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, url_for, g
 import jwt
 import datetime
 from models.user import User, db
+from models.deletion_job import DeletionJob
 from functools import wraps
+from utils.user_cache import user_cache, AuthenticatedUser
+from utils.password_hashing import PasswordHashingBusy
+from utils.metrics import timed
+from utils.deletion import start_deletion, ACCOUNT
+from utils.replicas import reading_from_replica
 import os
 
 auth_bp = Blueprint('auth', __name__)
@@ -10,8 +16,22 @@ auth_bp = Blueprint('auth', __name__)
 # JWT Secret Key
 JWT_SECRET = os.getenv('JWT_SECRET', 'default-jwt-secret')
 
-# Token required decorator
-def token_required(f):
+# Hashing is offloaded to a bounded pool; when it is saturated, ask the client to retry
+@auth_bp.errorhandler(PasswordHashingBusy)
+def password_hashing_busy(e):
+    return jsonify({'message': str(e)}), 503, {'Retry-After': str(e.retry_after)}
+
+def load_user(user_id):
+    return db.session.get(User, user_id)
+
+# Token required decorator. user= picks what the view receives as current_user:
+#   'cached' (default) - a read-only CachedUser, from the user cache when possible
+#   'id'               - only the id from the token, without touching the database
+#   'db'               - the User row itself, for views that modify it
+def token_required(f=None, user='cached'):
+    if f is None:
+        return lambda f: token_required(f, user=user)
+    
     @wraps(f)
     def decorated(*args, **kwargs):
         token = None
@@ -22,10 +42,24 @@ def token_required(f):
             return jsonify({'message': 'Token is missing!'}), 401
         
         try:
-            data = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-            current_user = User.query.filter_by(id=data['user_id']).first()
+            with timed('auth'):
+                data = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+            # Known before any query, so a user who just wrote reads from the primary
+            g.user_id = data['user_id']
+            with timed('user_lookup'):
+                if user == 'id':
+                    current_user = AuthenticatedUser(data['user_id'])
+                elif user == 'db':
+                    current_user = load_user(data['user_id'])
+                else:
+                    # A cache miss may be read from a replica
+                    with reading_from_replica():
+                        current_user = user_cache.get(data['user_id'], load_user)
         except:
             return jsonify({'message': 'Token is invalid!'}), 401
+        
+        if current_user is None:
+            return jsonify({'message': 'Token is invalid!'}), 401
             
         return f(current_user, *args, **kwargs)
     
@@ -83,6 +117,7 @@ def login():
         # Update last login
         user.last_login = datetime.datetime.utcnow()
         db.session.commit()
+        user_cache.invalidate(user.id)
         
         return jsonify({
             'message': 'Login successful!',
@@ -98,7 +133,7 @@ def get_profile(current_user):
     return jsonify({'user': current_user.to_dict()}), 200
 
 @auth_bp.route('/profile', methods=['PUT'])
-@token_required
+@token_required(user='db')
 def update_profile(current_user):
     data = request.get_json()
     
@@ -119,8 +154,46 @@ def update_profile(current_user):
         current_user.preferred_friend_gender = data['preferred_friend_gender']
     
     db.session.commit()
+    user_cache.invalidate(current_user.id)
     
     return jsonify({
         'message': 'Profile updated successfully!',
         'user': current_user.to_dict()
-    }), 200
\ No newline at end of file
+    }), 200
+
+@auth_bp.route('/profile', methods=['DELETE'])
+@token_required(user='db')
+def delete_account(current_user):
+    data = request.get_json(silent=True)
+    
+    # Deleting everything is irreversible, so ask for the password again
+    if not data or not data.get('password'):
+        return jsonify({'message': 'Password is required!'}), 400
+    
+    if not current_user.verify_password(data['password']):
+        return jsonify({'message': 'Invalid password!'}), 401
+    
+    # Chats and journals are deleted in chunks; a large account is deleted in the background
+    job = start_deletion(current_app._get_current_object(), current_user.id, ACCOUNT)
+    
+    if job.status == 'failed':
+        return jsonify({'message': 'Failed to delete account!'}), 500
+    
+    if job.status == 'done':
+        return jsonify({'message': 'Account deleted successfully!', 'deletion': job.to_dict()}), 200
+    
+    return jsonify({
+        'message': 'Account is being deleted!',
+        'deletion': job.to_dict()
+    }), 202, {'Location': url_for('auth.get_deletion', job_id=job.id)}
+
+@auth_bp.route('/deletions/<int:job_id>', methods=['GET'])
+@token_required(user='id')
+def get_deletion(current_user, job_id):
+    # Progress of a chat history clear or account deletion; works after the account is gone
+    job = DeletionJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    
+    if not job:
+        return jsonify({'message': 'Deletion not found!'}), 404
+    
+    return jsonify({'deletion': job.to_dict()}), 200
\ No newline at end of file
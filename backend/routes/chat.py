@@ -1,17 +1,81 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app, url_for
+from sqlalchemy import select
 from models.chat import Chat, db
 from models.user import User
 from routes.auth import token_required
+from utils.user_cache import user_cache
+from utils.metrics import timed
+from utils.ndjson import NDJSON_MIMETYPE, stream_ndjson
+from utils.serialization import RowSerializer, InvalidFields, isoformat, preview, truncate
+from utils.llm import get_llm
+from utils.embedding_worker import enqueue_embedding
+from utils.vector_index import CHAT
+from utils.pagination import paginate, InvalidCursor
+from utils import insights
+from utils.sync import sync_since, CursorExpired, collection_etag, tagged, not_modified
+from utils.replicas import replica_reads
+from utils.context import build_context, schedule_compaction, count_tokens
+from utils.deletion import start_deletion, CHAT_HISTORY
+from utils.response_cache import response_cache, cached_predict
+from utils.rate_limit import rate_limiter, RateLimitExceeded
+from utils.concurrency import FairScheduler, LLMGateSaturated
+from utils.llm_client import LLMUnavailable
+import json
+import logging
 import os
-from langchain.llms import OpenAI
-from langchain.chains import ConversationChain
-from langchain.memory import ConversationBufferMemory
-from langchain.prompts import PromptTemplate
+import threading
+import time
 
 chat_bp = Blueprint('chat', __name__)
 
-# Initialize OpenAI API
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+logger = logging.getLogger(__name__)
+
+# Bound the upstream LLM concurrency for this process and share it fairly between users
+llm_scheduler = FairScheduler(
+    max_inflight=int(os.getenv('LLM_MAX_INFLIGHT', '16')),
+    max_waiting=int(os.getenv('LLM_MAX_QUEUE', '32')),
+    max_pending_per_user=int(os.getenv('LLM_MAX_PENDING_PER_USER', '2')),
+    acquire_timeout=float(os.getenv('LLM_QUEUE_TIMEOUT', '5'))
+)
+
+# A user over their budget, or no LLM slot free: tell the client when to retry
+@chat_bp.errorhandler(RateLimitExceeded)
+def rate_limit_exceeded(e):
+    return jsonify({'message': str(e)}), 429, {'Retry-After': str(e.retry_after)}
+
+@chat_bp.errorhandler(LLMGateSaturated)
+def llm_gate_saturated(e):
+    return jsonify({'message': str(e)}), e.status_code, {'Retry-After': str(e.retry_after)}
+
+# Longest chat message accepted, so a single message cannot overflow the prompt
+MAX_MESSAGE_CHARS = int(os.getenv('CHAT_MAX_MESSAGE_CHARS', '4000'))
+
+def message_error(data):
+    """
+    Why a chat request body is not acceptable, or None
+    """
+    if not isinstance(data, dict) or not data.get('message'):
+        return 'No message provided!'
+    if not isinstance(data['message'], str):
+        return 'Message must be text!'
+    if len(data['message']) > MAX_MESSAGE_CHARS:
+        return f'Message is longer than {MAX_MESSAGE_CHARS} characters!'
+    return None
+
+# Sent instead of a reply while the LLM is unavailable, so the UI stays usable; the turn
+# is not saved and the user's token budget is refunded
+DEGRADED_RESPONSE = (
+    "I'm having a little trouble finding my words right now, but I'm still here with you. "
+    "Could you give me a moment and send that again?"
+)
+
+def degraded_reply():
+    return {
+        'message': 'Your AI friend is having trouble responding right now!',
+        'response': DEGRADED_RESPONSE,
+        'chat_id': None,
+        'degraded': True
+    }
 
 # Define prompt templates for different genders
 male_template = """
@@ -47,84 +111,157 @@ Current conversation:
 Human: {input}
 AI Friend: """
 
-# Function to get the appropriate LLM chain based on gender preference
-def get_llm_chain(gender_preference):
+# Function to get the prompt template based on gender preference
+def get_prompt(gender_preference):
     if gender_preference == 'male':
-        template = male_template
+        return male_template
     elif gender_preference == 'female':
-        template = female_template
+        return female_template
     else:
-        template = neutral_template
-        
-    prompt = PromptTemplate(
-        input_variables=["history", "input"],
-        template=template
-    )
+        return neutral_template
+
+class PersonaChain:
+    """
+    Prompt template plus the shared LLM client for one persona.
+    History is passed in per request, so one instance serves every user.
+    """
+    def __init__(self, prompt, llm):
+        self.prompt = prompt
+        self.llm = llm
     
-    llm = OpenAI(temperature=0.7, openai_api_key=OPENAI_API_KEY)
-    memory = ConversationBufferMemory(return_messages=True)
-    chain = ConversationChain(
-        llm=llm,
-        prompt=prompt,
-        memory=memory,
-        verbose=True
-    )
+    def format(self, input, history):
+        return self.prompt.format(input=input, history=history)
     
-    return chain
-
-@chat_bp.route('/send', methods=['POST'])
-@token_required
-def send_message(current_user):
-    data = request.get_json()
+    def predict(self, input, history):
+        with timed('llm'):
+            return self.llm.predict(self.format(input, history))
     
-    if not data or not data.get('message'):
-        return jsonify({'message': 'No message provided!'}), 400
+    def stream(self, input, history):
+        # Only the time spent waiting on the LLM counts, not the time spent sending tokens
+        tokens = iter(self.llm.stream(self.format(input, history)))
+        while True:
+            with timed('llm'):
+                token = next(tokens, None)
+            if token is None:
+                return
+            yield token
     
-    user_message = data['message']
+    async def apredict(self, input, history):
+        return await self.llm.apredict(self.format(input, history))
+
+# Persona chains are built once per process and reused across requests
+_chain_registry = {}
+_chain_registry_lock = threading.Lock()
+
+# Function to get the appropriate LLM chain based on gender preference
+def get_llm_chain(gender_preference):
+    if gender_preference not in ('male', 'female'):
+        gender_preference = 'neutral'
     
-    # Save user message to database
+    chain = _chain_registry.get(gender_preference)
+    if chain is None:
+        with _chain_registry_lock:
+            chain = _chain_registry.get(gender_preference)
+            if chain is None:
+                chain = PersonaChain(get_prompt(gender_preference), get_llm())
+                _chain_registry[gender_preference] = chain
+    
+    return chain
+
+# Function to store a complete conversation turn in a single transaction
+def save_chat_turn(user_id, user_message, ai_response):
     chat_entry = Chat(
-        user_id=current_user.id,
+        user_id=user_id,
         message=user_message,
-        is_from_user=True
+        response=ai_response
     )
     db.session.add(chat_entry)
+    db.session.flush()
+    
+    # Queue the turn for semantic recall and count it in the day's insights, in the same transaction
+    enqueue_embedding(user_id, CHAT, chat_entry.id)
+    insights.chat_added(chat_entry)
     db.session.commit()
     
-    # Get recent conversation history
-    recent_chats = Chat.query.filter_by(user_id=current_user.id).order_by(Chat.timestamp.desc()).limit(10).all()
-    recent_chats.reverse()  # Oldest first
+    return chat_entry
+
+def chat_export_row(row):
+    return {
+        'id': row.id,
+        'message': row.message,
+        'response': row.response,
+        'timestamp': row.timestamp.isoformat() if row.timestamp else None
+    }
+
+# Keys chat history can return: ?fields=... or ?view=summary (previews of both sides)
+chat_history_fields = RowSerializer({
+    'id': (Chat.id, None),
+    'user_id': (Chat.user_id, None),
+    'message': (Chat.message, None),
+    'response': (Chat.response, None),
+    'message_preview': (preview(Chat.message), truncate),
+    'response_preview': (preview(Chat.response), truncate),
+    'timestamp': (Chat.timestamp, isoformat)
+}, default=['id', 'user_id', 'message', 'response', 'timestamp'], views={
+    'summary': ['id', 'message_preview', 'response_preview', 'timestamp']
+})
+
+# Function to encode one server-sent event
+def format_sse(data, event=None):
+    payload = f"data: {json.dumps(data)}\n\n"
+    if event:
+        payload = f"event: {event}\n" + payload
+    return payload
+
+@chat_bp.route('/send', methods=['POST'])
+@token_required
+def send_message(current_user):
+    data = request.get_json()
+    
+    error = message_error(data)
+    if error:
+        return jsonify({'message': error}), 400
     
-    # Format conversation history for LLM
-    conversation_history = ""
-    for chat in recent_chats:
-        if chat.is_from_user:
-            conversation_history += f"Human: {chat.message}\n"
-        else:
-            conversation_history += f"AI Friend: {chat.response}\n"
+    user_message = data['message']
     
-    # Get LLM chain based on user's preference
-    chain = get_llm_chain(current_user.preferred_friend_gender)
+    # Charge the user's request and token budgets (429 when over) before doing any work;
+    # the token charge is settled once the full prompt and reply are known
+    charged = rate_limiter.admit(current_user.id, count_tokens(user_message))
     
-    # Generate AI response
+    # Every way out below that produces no reply refunds the charge
     try:
-        ai_response = chain.predict(input=user_message, history=conversation_history)
-    except Exception as e:
-        return jsonify({'message': f'Error generating response: {str(e)}'}), 500
+        # Get the summarized, token-budgeted conversation history
+        context = build_context(current_user.id)
+        
+        # Get LLM chain based on user's preference
+        chain = get_llm_chain(current_user.preferred_friend_gender)
+        prompt_tokens = count_tokens(chain.format(user_message, context.history))
+        
+        # Generate AI response in a fair share of the LLM slots, answering repeated prompts
+        # from the cache; replies are shared with other users only for opted-in openers
+        with llm_scheduler.slot(current_user.id):
+            ai_response, cache_hit = cached_predict(response_cache, chain, context.history, user_message,
+                                                    current_user.id, current_user.allow_response_cache)
+    except LLMUnavailable:
+        rate_limiter.settle(current_user.id, charged, 0)
+        return jsonify(degraded_reply()), 200
+    except LLMGateSaturated:
+        # No slot was free; the blueprint's handler answers 503
+        rate_limiter.settle(current_user.id, charged, 0)
+        raise
+    except Exception:
+        logger.exception('Generating a chat response failed')
+        rate_limiter.settle(current_user.id, charged, 0)
+        return jsonify({'message': 'Failed to generate a response!'}), 500
     
-    # Save AI response to database
-    chat_entry.response = ai_response
-    db.session.commit()
+    rate_limiter.settle(current_user.id, charged, 0 if cache_hit else prompt_tokens + count_tokens(ai_response))
     
-    # Create AI message entry
-    ai_chat_entry = Chat(
-        user_id=current_user.id,
-        message=user_message,
-        response=ai_response,
-        is_from_user=False
-    )
-    db.session.add(ai_chat_entry)
-    db.session.commit()
+    # Save the whole turn to the database
+    chat_entry = save_chat_turn(current_user.id, user_message, ai_response)
+    
+    # Fold turns that no longer fit into the rolling summary, off the request path
+    if context.needs_compaction:
+        schedule_compaction(current_app._get_current_object(), current_user.id, llm_scheduler.slot)
     
     return jsonify({
         'message': 'Message sent successfully!',
@@ -132,54 +269,186 @@ def send_message(current_user):
         'chat_id': chat_entry.id
     }), 200
 
-@chat_bp.route('/history', methods=['GET'])
+@chat_bp.route('/stream', methods=['POST'])
 @token_required
+def stream_message(current_user):
+    data = request.get_json()
+    
+    error = message_error(data)
+    if error:
+        return jsonify({'message': error}), 400
+    
+    user_message = data['message']
+    user_id = current_user.id
+    
+    # Budgets and the LLM slot are taken before streaming, so a 429/503 is a real status;
+    # the slot is held until the reply is complete or the response is closed
+    charged = rate_limiter.admit(user_id, count_tokens(user_message))
+    
+    # Gather everything the generator needs before the response starts
+    app = current_app._get_current_object()
+    release_slot = None
+    try:
+        context = build_context(current_user.id)
+        chain = get_llm_chain(current_user.preferred_friend_gender)
+        prompt_tokens = count_tokens(chain.format(user_message, context.history))
+        release_slot = llm_scheduler.acquire(user_id)
+        
+        # A cached reply is sent as a single token
+        cached_response, cache_key = response_cache.lookup(chain.prompt, context.history, user_message,
+                                                           user_id, current_user.allow_response_cache)
+    except Exception:
+        # Nothing will be streamed: give back the slot and the charge
+        if release_slot is not None:
+            release_slot()
+        rate_limiter.settle(user_id, charged, 0)
+        raise
+    
+    def generate():
+        if cached_response is not None:
+            ai_response = cached_response
+            release_slot()
+            rate_limiter.settle(user_id, charged, 0)
+            yield format_sse({'token': ai_response})
+        else:
+            tokens = []
+            start = time.perf_counter()
+            
+            # Send each token to the client as soon as the LLM produces it; if the LLM
+            # fails before the first one, send the degraded reply instead
+            try:
+                for token in chain.stream(input=user_message, history=context.history):
+                    tokens.append(token)
+                    yield format_sse({'token': token})
+            except Exception as e:
+                release_slot()
+                rate_limiter.settle(user_id, charged, 0)
+                if not isinstance(e, LLMUnavailable):
+                    logger.exception('Streaming a chat response failed')
+                if isinstance(e, LLMUnavailable) and not tokens:
+                    yield format_sse({'token': DEGRADED_RESPONSE})
+                    yield format_sse(degraded_reply(), event='done')
+                else:
+                    yield format_sse({'message': 'Failed to generate a response!'}, event='error')
+                return
+            
+            ai_response = ''.join(tokens)
+            release_slot()
+            rate_limiter.settle(user_id, charged, prompt_tokens + count_tokens(ai_response))
+            response_cache.store(cache_key, ai_response, time.perf_counter() - start,
+                                 prompt_tokens + count_tokens(ai_response), user_id)
+        
+        # Persist the turn once the stream has finished
+        chat_entry = save_chat_turn(user_id, user_message, ai_response)
+        if context.needs_compaction:
+            schedule_compaction(app, user_id, llm_scheduler.slot)
+        
+        yield format_sse({'chat_id': chat_entry.id, 'response': ai_response}, event='done')
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.call_on_close(release_slot)
+    return response
+
+@chat_bp.route('/history', methods=['GET'])
+@token_required(user='id')
+@replica_reads
 def get_chat_history(current_user):
-    # Get pagination parameters
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
+    try:
+        fields = chat_history_fields.requested()
+    except InvalidFields:
+        return jsonify({'message': 'Invalid fields!'}), 400
     
-    # Query chat history with pagination
-    chats = Chat.query.filter_by(user_id=current_user.id).order_by(Chat.timestamp.desc()).paginate(page=page, per_page=per_page)
+    # Answer from the validator alone when the client's copy is still current
+    etag = collection_etag(Chat, Chat.timestamp, current_user.id, CHAT)
+    if etag and request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
+    
+    # Query only the requested columns: the turns after a ?since= sync cursor, or a
+    # page-number or cursor page
+    query = db.session.query(*chat_history_fields.columns(fields, required=(Chat.timestamp, Chat.id)))
+    query = query.filter(Chat.user_id == current_user.id)
+    try:
+        if 'since' in request.args:
+            chats = sync_since(query, Chat.timestamp, Chat.id, current_user.id, CHAT)
+        else:
+            chats = paginate(query, Chat.timestamp, Chat.id, default_per_page=20)
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor!'}), 400
+    except CursorExpired:
+        return jsonify({'message': 'Sync cursor expired, please sync again from the start!'}), 410
     
     # Format response
-    chat_history = [chat.to_dict() for chat in chats.items]
+    chat_history = chat_history_fields.serialize(chats.items, fields)
     
-    return jsonify({
+    return tagged(jsonify({
         'chats': chat_history,
-        'total': chats.total,
-        'pages': chats.pages,
-        'current_page': chats.page
-    }), 200
+        **chats.meta
+    }), etag), 200
+
+@chat_bp.route('/export', methods=['GET'])
+@token_required(user='id')
+def export_chat_history(current_user):
+    # Stream every turn as NDJSON, oldest first, without loading them all
+    statement = select(
+        Chat.id, Chat.message, Chat.response, Chat.timestamp
+    ).where(Chat.user_id == current_user.id).order_by(Chat.timestamp, Chat.id)
+    
+    return Response(
+        stream_with_context(stream_ndjson(db.session, statement, chat_export_row)),
+        mimetype=NDJSON_MIMETYPE,
+        headers={'Content-Disposition': 'attachment; filename=chats.ndjson'}
+    )
 
 @chat_bp.route('/clear', methods=['DELETE'])
-@token_required
+@token_required(user='id')
 def clear_chat_history(current_user):
-    # Delete all chat history for the user
-    Chat.query.filter_by(user_id=current_user.id).delete()
-    db.session.commit()
+    # Delete all chat history for the user in chunks; a long history is cleared in the background
+    job = start_deletion(current_app._get_current_object(), current_user.id, CHAT_HISTORY)
+    
+    if job.status == 'failed':
+        return jsonify({'message': 'Failed to clear chat history!'}), 500
+    
+    if job.status == 'done':
+        return jsonify({'message': 'Chat history cleared successfully!', 'deletion': job.to_dict()}), 200
     
-    return jsonify({'message': 'Chat history cleared successfully!'}), 200
+    return jsonify({
+        'message': 'Chat history is being cleared!',
+        'deletion': job.to_dict()
+    }), 202, {'Location': url_for('auth.get_deletion', job_id=job.id)}
 
 @chat_bp.route('/preferences', methods=['PUT'])
-@token_required
+@token_required(user='db')
 def update_chat_preferences(current_user):
     data = request.get_json()
     
-    if not data or not data.get('preferred_friend_gender'):
+    if not data or (not data.get('preferred_friend_gender') and 'allow_response_cache' not in data):
         return jsonify({'message': 'No preference provided!'}), 400
     
-    gender_preference = data['preferred_friend_gender']
+    if data.get('preferred_friend_gender'):
+        gender_preference = data['preferred_friend_gender']
+        
+        # Validate gender preference
+        if gender_preference not in ['male', 'female', 'neutral']:
+            return jsonify({'message': 'Invalid gender preference! Choose from: male, female, neutral'}), 400
+        
+        current_user.preferred_friend_gender = gender_preference
     
-    # Validate gender preference
-    if gender_preference not in ['male', 'female', 'neutral']:
-        return jsonify({'message': 'Invalid gender preference! Choose from: male, female, neutral'}), 400
+    if 'allow_response_cache' in data:
+        if not isinstance(data['allow_response_cache'], bool):
+            return jsonify({'message': 'allow_response_cache must be true or false!'}), 400
+        
+        current_user.allow_response_cache = data['allow_response_cache']
     
-    # Update user preference
-    current_user.preferred_friend_gender = gender_preference
+    # Update user preferences
     db.session.commit()
+    user_cache.invalidate(current_user.id)
     
     return jsonify({
         'message': 'Chat preferences updated successfully!',
-        'preferred_friend_gender': current_user.preferred_friend_gender
+        'preferred_friend_gender': current_user.preferred_friend_gender,
+        'allow_response_cache': current_user.allow_response_cache
     }), 200
\ No newline at end of file
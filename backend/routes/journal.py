@@ -1,10 +1,72 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from sqlalchemy import insert, select
 from models.journal import Journal, db
+from models.chat import Chat
 from routes.auth import token_required
-from datetime import datetime
+from utils.pagination import paginate, get_per_page, InvalidCursor, MAX_PER_PAGE
+from utils import search as search_index
+from utils.embeddings import embedding_manager
+from utils.embedding_worker import enqueue_embedding, enqueue_embeddings
+from utils.vector_index import JOURNAL, CHAT
+from utils.ndjson import NDJSON_MIMETYPE, read_ndjson, stream_ndjson
+from utils.serialization import RowSerializer, InvalidFields, isoformat, preview, truncate
+from utils import insights
+from utils.sync import sync_since, record_deletion, CursorExpired, collection_etag, make_etag, tagged, not_modified
+from utils.replicas import replica_reads
+from datetime import datetime, timezone
+import os
 
 journal_bp = Blueprint('journal', __name__)
 
+# Entries inserted and committed together by the bulk import
+IMPORT_CHUNK_SIZE = int(os.getenv('JOURNAL_IMPORT_CHUNK_SIZE', '1000'))
+# Rejected lines reported back in the import response
+MAX_IMPORT_ERRORS = 20
+
+# Function to turn one imported NDJSON object into a journal row; returns (row, error)
+def journal_import_row(user_id, item):
+    title = item.get('title')
+    content = item.get('content')
+    if not isinstance(title, str) or not title or not isinstance(content, str) or not content:
+        return None, 'missing title or content'
+    if len(title) > 100:
+        return None, 'title longer than 100 characters'
+    
+    try:
+        created_at = datetime.fromisoformat(item['created_at']) if item.get('created_at') else datetime.utcnow()
+    except (TypeError, ValueError):
+        return None, 'invalid timestamp'
+    
+    # Timestamps are stored as naive UTC; an offset is converted rather than dropped
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    
+    # The original date is kept in created_at; updated_at is the time of the import, so
+    # delta sync (which follows updated_at) sends imported entries to clients already synced
+    return {'user_id': user_id, 'title': title, 'content': content, 'created_at': created_at, 'updated_at': datetime.utcnow()}, None
+
+# Keys the journal list can return: ?fields=... or ?view=summary (previews instead of content)
+journal_list_fields = RowSerializer({
+    'id': (Journal.id, None),
+    'user_id': (Journal.user_id, None),
+    'title': (Journal.title, None),
+    'content': (Journal.content, None),
+    'preview': (preview(Journal.content), truncate),
+    'created_at': (Journal.created_at, isoformat),
+    'updated_at': (Journal.updated_at, isoformat)
+}, default=['id', 'user_id', 'title', 'content', 'created_at', 'updated_at'], views={
+    'summary': ['id', 'title', 'preview', 'created_at', 'updated_at']
+})
+
+def journal_export_row(row):
+    return {
+        'id': row.id,
+        'title': row.title,
+        'content': row.content,
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'updated_at': row.updated_at.isoformat() if row.updated_at else None
+    }
+
 @journal_bp.route('/', methods=['POST'])
 @token_required
 def create_journal(current_user):
@@ -22,6 +84,12 @@ def create_journal(current_user):
     
     # Add journal to database
     db.session.add(new_journal)
+    db.session.flush()
+    
+    # Queue the entry for the user's semantic index and count it in the day's insights,
+    # in the same transaction
+    enqueue_embedding(current_user.id, JOURNAL, new_journal.id)
+    insights.journal_added(new_journal)
     db.session.commit()
     
     return jsonify({
@@ -30,38 +98,67 @@ def create_journal(current_user):
     }), 201
 
 @journal_bp.route('/', methods=['GET'])
-@token_required
+@token_required(user='id')
+@replica_reads
 def get_journals(current_user):
-    # Get pagination parameters
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 10, type=int)
+    try:
+        fields = journal_list_fields.requested()
+    except InvalidFields:
+        return jsonify({'message': 'Invalid fields!'}), 400
+    
+    # Answer from the validator alone when the client's copy is still current
+    etag = collection_etag(Journal, Journal.updated_at, current_user.id, JOURNAL)
+    if etag and request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
     
-    # Query journals with pagination
-    journals = Journal.query.filter_by(user_id=current_user.id).order_by(Journal.updated_at.desc()).paginate(page=page, per_page=per_page)
+    # Query only the requested columns: the changes after a ?since= sync cursor, or a
+    # page-number or cursor page
+    query = db.session.query(*journal_list_fields.columns(fields, required=(Journal.updated_at, Journal.id)))
+    query = query.filter(Journal.user_id == current_user.id)
+    try:
+        if 'since' in request.args:
+            journals = sync_since(query, Journal.updated_at, Journal.id, current_user.id, JOURNAL)
+        else:
+            journals = paginate(query, Journal.updated_at, Journal.id, default_per_page=10)
+    except InvalidCursor:
+        return jsonify({'message': 'Invalid cursor!'}), 400
+    except CursorExpired:
+        return jsonify({'message': 'Sync cursor expired, please sync again from the start!'}), 410
     
     # Format response
-    journal_list = [journal.to_dict() for journal in journals.items]
+    journal_list = journal_list_fields.serialize(journals.items, fields)
     
-    return jsonify({
+    return tagged(jsonify({
         'journals': journal_list,
-        'total': journals.total,
-        'pages': journals.pages,
-        'current_page': journals.page
-    }), 200
+        **journals.meta
+    }), etag), 200
 
 @journal_bp.route('/<int:journal_id>', methods=['GET'])
-@token_required
+@token_required(user='id')
+@replica_reads
 def get_journal(current_user, journal_id):
+    # Check the client's copy against the entry's last update before loading the entry
+    version = db.session.execute(
+        select(Journal.updated_at).where(Journal.id == journal_id, Journal.user_id == current_user.id)
+    ).first()
+    
+    if not version:
+        return jsonify({'message': 'Journal not found!'}), 404
+    
+    etag = make_etag(current_user.id, JOURNAL, journal_id, version.updated_at)
+    if request.if_none_match.contains_weak(etag):
+        return not_modified(etag)
+    
     # Get journal by ID
     journal = Journal.query.filter_by(id=journal_id, user_id=current_user.id).first()
     
     if not journal:
         return jsonify({'message': 'Journal not found!'}), 404
     
-    return jsonify({'journal': journal.to_dict()}), 200
+    return tagged(jsonify({'journal': journal.to_dict()}), make_etag(current_user.id, JOURNAL, journal_id, journal.updated_at)), 200
 
 @journal_bp.route('/<int:journal_id>', methods=['PUT'])
-@token_required
+@token_required(user='id')
 def update_journal(current_user, journal_id):
     # Get journal by ID
     journal = Journal.query.filter_by(id=journal_id, user_id=current_user.id).first()
@@ -75,6 +172,7 @@ def update_journal(current_user, journal_id):
         return jsonify({'message': 'No data provided!'}), 400
     
     # Update journal fields
+    old_content = journal.content
     if data.get('title'):
         journal.title = data['title']
     
@@ -82,6 +180,11 @@ def update_journal(current_user, journal_id):
         journal.content = data['content']
     
     journal.updated_at = datetime.utcnow()
+    
+    # Queue a refresh of the entry's vector in the user's semantic index
+    if data.get('title') or data.get('content'):
+        enqueue_embedding(current_user.id, JOURNAL, journal.id)
+    insights.journal_edited(journal, old_content)
     db.session.commit()
     
     return jsonify({
@@ -90,7 +193,7 @@ def update_journal(current_user, journal_id):
     }), 200
 
 @journal_bp.route('/<int:journal_id>', methods=['DELETE'])
-@token_required
+@token_required(user='id')
 def delete_journal(current_user, journal_id):
     # Get journal by ID
     journal = Journal.query.filter_by(id=journal_id, user_id=current_user.id).first()
@@ -98,14 +201,94 @@ def delete_journal(current_user, journal_id):
     if not journal:
         return jsonify({'message': 'Journal not found!'}), 404
     
-    # Delete journal
+    # Take the entry out of its day's insights, then delete journal
+    insights.journal_removed(journal)
     db.session.delete(journal)
+    
+    # Queue removal of the entry's vector from the user's semantic index, and leave a
+    # tombstone for clients syncing with ?since=
+    enqueue_embedding(current_user.id, JOURNAL, journal_id, action='delete')
+    record_deletion(current_user.id, JOURNAL, journal_id)
     db.session.commit()
     
     return jsonify({'message': 'Journal deleted successfully!'}), 200
 
-@journal_bp.route('/search', methods=['GET'])
+@journal_bp.route('/import', methods=['POST'])
 @token_required
+def import_journals(current_user):
+    imported = 0
+    failed = 0
+    errors = []
+    chunk = []
+    
+    def insert_chunk(rows):
+        # One multi-row insert and one commit per chunk; new entries are queued for
+        # embedding and rolled up into the insights
+        journal_ids = db.session.scalars(insert(Journal).returning(Journal.id), rows).all()
+        enqueue_embeddings(current_user.id, JOURNAL, journal_ids)
+        insights.journals_imported(current_user.id, rows)
+        db.session.commit()
+        return len(journal_ids)
+    
+    # Read the NDJSON body line by line instead of loading it whole
+    try:
+        for line_number, item, error in read_ndjson(request.stream):
+            row = None
+            if error is None:
+                row, error = journal_import_row(current_user.id, item)
+            
+            if error:
+                failed += 1
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    errors.append({'line': line_number, 'error': error})
+                continue
+            
+            chunk.append(row)
+            if len(chunk) >= IMPORT_CHUNK_SIZE:
+                imported += insert_chunk(chunk)
+                chunk = []
+        
+        if chunk:
+            imported += insert_chunk(chunk)
+    except Exception:
+        db.session.rollback()
+        return jsonify({'message': 'Import failed!', 'imported': imported}), 500
+    
+    if not imported and not failed:
+        return jsonify({'message': 'No entries provided!'}), 400
+    
+    return jsonify({
+        'message': 'Journals imported successfully!',
+        'imported': imported,
+        'failed': failed,
+        'errors': errors
+    }), 200
+
+@journal_bp.route('/export', methods=['GET'])
+@token_required(user='id')
+def export_journals(current_user):
+    # Stream every entry as NDJSON, oldest first, without loading them all
+    statement = select(
+        Journal.id, Journal.title, Journal.content, Journal.created_at, Journal.updated_at
+    ).where(Journal.user_id == current_user.id).order_by(Journal.id)
+    
+    return Response(
+        stream_with_context(stream_ndjson(db.session, statement, journal_export_row)),
+        mimetype=NDJSON_MIMETYPE,
+        headers={'Content-Disposition': 'attachment; filename=journals.ndjson'}
+    )
+
+@journal_bp.route('/insights', methods=['GET'])
+@token_required(user='id')
+def get_insights(current_user):
+    # Activity, streaks and sentiment per day and week, read from the daily rollups
+    days = request.args.get('days', 30, type=int)
+    
+    return jsonify(insights.insights(current_user.id, days)), 200
+
+@journal_bp.route('/search', methods=['GET'])
+@token_required(user='id')
+@replica_reads
 def search_journals(current_user):
     # Get search query
     query = request.args.get('q', '')
@@ -113,15 +296,87 @@ def search_journals(current_user):
     if not query:
         return jsonify({'message': 'No search query provided!'}), 400
     
-    # Search journals by title or content
-    journals = Journal.query.filter_by(user_id=current_user.id).filter(
-        (Journal.title.ilike(f'%{query}%') | Journal.content.ilike(f'%{query}%'))
-    ).order_by(Journal.updated_at.desc()).all()
+    # Run a ranked full-text search, fetching one extra row to detect another page
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = get_per_page(10)
+    results = search_index.search_journals(
+        db.session, current_user.id, query,
+        limit=per_page + 1, offset=(page - 1) * per_page
+    )
     
-    # Format response
-    journal_list = [journal.to_dict() for journal in journals]
+    # Format response with snippets instead of full entries
+    journal_list = [{
+        'id': result['id'],
+        'title': result['title'],
+        'snippet': result['snippet'],
+        'updated_at': result['updated_at'].isoformat() if result['updated_at'] else None
+    } for result in results[:per_page]]
     
     return jsonify({
         'journals': journal_list,
-        'count': len(journal_list)
+        'count': len(journal_list),
+        'current_page': page,
+        'has_more': len(results) > per_page
+    }), 200
+
+@journal_bp.route('/semantic-search', methods=['GET'])
+@token_required(user='id')
+@replica_reads
+def semantic_search(current_user):
+    # Get search query
+    query = request.args.get('q', '')
+    
+    if not query:
+        return jsonify({'message': 'No search query provided!'}), 400
+    
+    k = max(1, min(request.args.get('k', 5, type=int), MAX_PER_PAGE))
+    
+    # Find the nearest journal entries and chat turns in the user's index
+    matches = embedding_manager.search_similar(current_user.id, query, k=k)
+    
+    journal_ids = [item_id for kind, item_id, _ in matches if kind == JOURNAL]
+    chat_ids = [item_id for kind, item_id, _ in matches if kind == CHAT]
+    journals = {journal.id: journal for journal in Journal.query.filter(
+        Journal.user_id == current_user.id, Journal.id.in_(journal_ids)
+    )} if journal_ids else {}
+    chats = {chat.id: chat for chat in Chat.query.filter(
+        Chat.user_id == current_user.id, Chat.id.in_(chat_ids)
+    )} if chat_ids else {}
+    
+    # Format response, skipping vectors whose rows no longer exist
+    results = []
+    for kind, item_id, score in matches:
+        if kind == JOURNAL and item_id in journals:
+            journal = journals[item_id]
+            results.append({
+                'type': JOURNAL,
+                'id': journal.id,
+                'title': journal.title,
+                'snippet': journal.content[:200],
+                'updated_at': journal.updated_at.isoformat() if journal.updated_at else None,
+                'score': score
+            })
+        elif kind == CHAT and item_id in chats:
+            chat = chats[item_id]
+            results.append({
+                'type': CHAT,
+                'id': chat.id,
+                'message': chat.message,
+                'response': chat.response,
+                'timestamp': chat.timestamp.isoformat() if chat.timestamp else None,
+                'score': score
+            })
+    
+    # Vectors whose rows were not found may only be missing from a lagging replica, so the
+    # embedding worker re-checks them on the primary and removes the ones really gone
+    stale_journals = [item_id for item_id in journal_ids if item_id not in journals]
+    stale_chats = [item_id for item_id in chat_ids if item_id not in chats]
+    if stale_journals or stale_chats:
+        enqueue_embeddings(current_user.id, JOURNAL, stale_journals)
+        enqueue_embeddings(current_user.id, CHAT, stale_chats)
+        db.session.commit()
+    
+    return jsonify({
+        'results': results,
+        'count': len(results)
     }), 200
\ No newline at end of file
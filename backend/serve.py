@@ -0,0 +1,78 @@
+"""
+Production entry point for FriendBot, served by gunicorn.
+
+    python serve.py                     # WSGI app.py on threaded (gthread) workers
+    SERVER_MODE=asgi python serve.py    # asgi.py on uvicorn workers
+
+Settings (environment):
+    PORT          listen port (5000)
+    WEB_WORKERS   worker processes (2 x CPUs + 1)
+    WEB_THREADS   threads per worker in WSGI mode (8)
+    WEB_TIMEOUT   seconds before a stuck worker is restarted (120)
+    WEB_PRELOAD   import the app once in the master before forking (1 when EMBEDDING_WARMUP=1)
+
+Read replicas (DATABASE_REPLICA_URIS) with more than one worker need DB_STICKY_BACKEND=redis,
+so a user's read-your-writes window is seen by whichever worker serves their next read;
+the server refuses to start otherwise.
+
+Tables are not created here; run `flask --app app init-db` (or `python -m migrations`) first.
+"""
+import multiprocessing
+import os
+from gunicorn.app.base import BaseApplication
+
+def server_options():
+    asgi = os.getenv('SERVER_MODE', 'wsgi') == 'asgi'
+    workers = int(os.getenv('WEB_WORKERS', str(multiprocessing.cpu_count() * 2 + 1)))
+    if os.getenv('DATABASE_REPLICA_URIS') and workers > 1 and os.getenv('DB_STICKY_BACKEND', 'local') != 'redis':
+        raise SystemExit('Read replicas with WEB_WORKERS > 1 need DB_STICKY_BACKEND=redis '
+                         '(or set WEB_WORKERS=1): per-process stickiness would break read-your-writes')
+
+    options = {
+        'bind': f"0.0.0.0:{os.getenv('PORT', '5000')}",
+        'workers': workers,
+        'timeout': int(os.getenv('WEB_TIMEOUT', '120')),
+        'preload_app': os.getenv('WEB_PRELOAD', os.getenv('EMBEDDING_WARMUP', '0')) == '1',
+        'accesslog': '-',
+        'post_fork': post_fork
+    }
+    if asgi:
+        options['worker_class'] = 'uvicorn.workers.UvicornWorker'
+    else:
+        options['worker_class'] = 'gthread'
+        options['threads'] = int(os.getenv('WEB_THREADS', '8'))
+    return options
+
+def post_fork(server, worker):
+    from app import app, start_background_workers
+    from models.user import db
+
+    # Pooled connections a preloading master opened must not be shared with its children
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    # Background threads belong to the workers that serve requests, never the master;
+    # uvicorn workers start (and stop) them in asgi.py's lifespan instead
+    if os.getenv('SERVER_MODE', 'wsgi') != 'asgi':
+        start_background_workers()
+
+class FriendBotServer(BaseApplication):
+    def __init__(self, options):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        if os.getenv('SERVER_MODE', 'wsgi') == 'asgi':
+            from asgi import application
+            return application
+
+        from app import app
+        return app
+
+if __name__ == '__main__':
+    FriendBotServer(server_options()).run()
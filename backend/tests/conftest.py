@@ -0,0 +1,112 @@
+"""
+Shared fixtures: the app on a temporary SQLite database with the fake LLM and no
+background threads. Each test registers its own user, so tests do not see each
+other's rows.
+"""
+import itertools
+import os
+import re
+import sys
+import tempfile
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_workdir = tempfile.mkdtemp()
+os.environ.update({
+    'DATABASE_URI': f"sqlite:///{os.path.join(_workdir, 'test.db')}",
+    'VECTOR_INDEX_DIR': os.path.join(_workdir, 'indexes'),
+    'EMBEDDING_WORKER': 'off',
+    'LLM_BACKEND': 'fake',
+    'FAKE_LLM_FIRST_TOKEN_DELAY': '0',
+    'FAKE_LLM_TOKEN_DELAY': '0',
+    'RATE_LIMIT': 'off',
+    'RESPONSE_CACHE': 'off',
+    'PASSWORD_HASH_ROUNDS': '1000',
+    'SYNC_SETTLE_SECONDS': '0'
+})
+
+import numpy as np
+import pytest
+
+_usernames = itertools.count()
+
+@pytest.fixture(scope='session')
+def app():
+    from app import app
+    from migrations import run_migrations
+
+    run_migrations(app)
+    app.config['TESTING'] = True
+    return app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def register(client):
+    """
+    Register and log in a new user, returning (user_id, headers)
+    """
+    def register(**fields):
+        username = f'user{next(_usernames)}'
+        client.post('/api/auth/register', json={
+            'username': username, 'email': f'{username}@example.com', 'password': 'password', **fields
+        })
+        body = client.post('/api/auth/login', json={'username': username, 'password': 'password'}).get_json()
+        return body['user']['id'], {'Authorization': f"Bearer {body['token']}"}
+
+    return register
+
+@pytest.fixture
+def user(register):
+    return register()
+
+@pytest.fixture
+def headers(user):
+    return user[1]
+
+class FakeEmbeddingModel:
+    """
+    Hashed bag-of-words vectors, so texts sharing words are close
+    """
+    dimension = 64
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def encode(self, texts, batch_size=32, normalize_embeddings=True, convert_to_numpy=True):
+        vectors = np.zeros((len(texts), self.dimension), dtype='float32')
+        for row, text in enumerate(texts):
+            for word in re.findall(r'\w+', text.lower()):
+                vectors[row, zlib.crc32(word.encode()) % self.dimension] += 1
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms, norms, 1)
+
+@pytest.fixture
+def embedding_model(monkeypatch, tmp_path):
+    """
+    Stand in for MiniLM, with indexes in a fresh directory
+    """
+    from utils import embeddings, insights
+
+    monkeypatch.setattr(embeddings, '_model', FakeEmbeddingModel())
+    monkeypatch.setattr(embeddings.embedding_manager, 'index_dir', str(tmp_path))
+    monkeypatch.setattr(embeddings.embedding_manager, '_indexes', None)
+    monkeypatch.setattr(insights.sentiment_scorer, '_calibration', None)
+
+@pytest.fixture
+def drain(app, embedding_model):
+    """
+    Process every queued embedding job
+    """
+    from utils.embedding_worker import EmbeddingWorker
+
+    worker = EmbeddingWorker(app)
+
+    def drain():
+        while worker.run_once():
+            pass
+
+    return drain
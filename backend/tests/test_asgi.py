@@ -0,0 +1,111 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import asgi
+from routes.chat import MAX_MESSAGE_CHARS
+from utils.fake_llm import DEFAULT_RESPONSE
+
+async def call(method, path, body=None, headers=None):
+    """
+    Send one request straight to the ASGI application; returns (status, parsed body)
+    """
+    messages = []
+    payload = json.dumps(body).encode() if body is not None else b''
+
+    async def receive():
+        return {'type': 'http.request', 'body': payload, 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method, 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())] + [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+        'client': ('127.0.0.1', 1234), 'server': ('testserver', 80)
+    }
+    await asgi.application(scope, receive, send)
+    return messages[0]['status'], json.loads(b''.join(message.get('body', b'') for message in messages[1:]))
+
+def post(path, body, headers):
+    return asyncio.run(call('POST', path, body, headers))
+
+def test_native_send_answers_and_saves_the_turn(client, headers):
+    status, body = post('/api/chat/send', {'message': 'hello'}, headers)
+    assert status == 200 and body['response'] == DEFAULT_RESPONSE
+
+    history = client.get('/api/chat/history', headers=headers).get_json()['chats']
+    assert [chat['id'] for chat in history] == [body['chat_id']]
+
+def test_native_send_validates_before_any_work(headers):
+    assert post('/api/chat/send', {'message': 'hello'}, {})[0] == 401
+    assert post('/api/chat/send', {'message': 'x' * (MAX_MESSAGE_CHARS + 1)}, headers)[0] == 400
+
+def test_native_send_refunds_the_charge_on_failure(headers, monkeypatch):
+    settled = []
+    monkeypatch.setattr(asgi.rate_limiter, 'admit', lambda user_id, tokens: tokens)
+    monkeypatch.setattr(asgi.rate_limiter, 'settle', lambda user_id, charged, used: settled.append(used))
+
+    def broken_chain(gender):
+        raise RuntimeError('no chain')
+
+    monkeypatch.setattr(asgi, 'get_llm_chain', broken_chain)
+    status, body = post('/api/chat/send', {'message': 'hello'}, headers)
+    assert status == 500 and settled == [0]
+
+def test_other_routes_fall_through_to_flask(headers):
+    status, body = post('/api/journal/', {'title': 'Via ASGI', 'content': 'Text.'}, headers)
+    assert status == 201 and body['journal']['title'] == 'Via ASGI'
+
+def test_flask_routes_do_not_wait_for_each_other(app, monkeypatch):
+    release = threading.Event()
+
+    def blocked():
+        release.wait(5)
+        return {'status': 'released'}
+
+    monkeypatch.setitem(app.view_functions, 'index', blocked)
+
+    async def health_while_blocked():
+        slow = asyncio.create_task(call('GET', '/'))
+        try:
+            await asyncio.sleep(0.1)
+            start = time.perf_counter()
+            status, _ = await asyncio.wait_for(call('GET', '/health'), 2)
+            return status, time.perf_counter() - start
+        finally:
+            release.set()
+            await slow
+
+    status, elapsed = asyncio.run(health_while_blocked())
+    assert status == 200 and elapsed < 1
+
+def test_the_gate_slot_is_taken_after_the_context_is_loaded(headers, monkeypatch):
+    order = []
+    load_turn_context = asgi.load_turn_context
+    monkeypatch.setattr(asgi, 'load_turn_context', lambda user_id: order.append('context') or load_turn_context(user_id))
+    slot = asgi.llm_gate.slot
+    monkeypatch.setattr(asgi.llm_gate, 'slot', lambda user_id: order.append('slot') or slot(user_id))
+
+    assert post('/api/chat/send', {'message': 'hello'}, headers)[0] == 200
+    assert order == ['context', 'slot']
+
+def test_lifespan_starts_and_stops_the_background_workers(monkeypatch):
+    calls = []
+    monkeypatch.setattr(asgi, 'start_background_workers', lambda: calls.append('start'))
+    monkeypatch.setattr(asgi, 'stop_background_workers', lambda: calls.append('stop'))
+    monkeypatch.setattr(asgi, 'flask_executor', ThreadPoolExecutor(1))
+    messages = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+    sent = []
+
+    async def receive():
+        return next(messages)
+
+    async def send(message):
+        sent.append(message['type'])
+
+    asyncio.run(asgi.application({'type': 'lifespan'}, receive, send))
+    assert calls == ['start', 'stop']
+    assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
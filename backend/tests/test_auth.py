@@ -0,0 +1,31 @@
+from utils.password_hashing import PasswordHasher
+from utils.user_cache import user_cache
+
+def test_pool_does_not_fork_the_server_process():
+    hasher = PasswordHasher(rounds=1000, workers=1)
+    pool = hasher._get_pool()
+    try:
+        assert pool._mp_context.get_start_method() in ('forkserver', 'spawn')
+        assert hasher.verify('password', hasher.hash('password'))[0]
+    finally:
+        pool.shutdown()
+
+def test_register_and_login_hash_in_the_pool(client, register):
+    user_id, headers = register()
+    response = client.get('/api/auth/profile', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['user']['id'] == user_id
+
+def test_profile_reads_are_cached_until_an_update(client, headers):
+    client.get('/api/auth/profile', headers=headers)
+    hits = user_cache.stats()['hits']
+    assert client.get('/api/auth/profile', headers=headers).status_code == 200
+    assert user_cache.stats()['hits'] == hits + 1
+
+    client.put('/api/auth/profile', json={'preferred_friend_gender': 'female'}, headers=headers)
+    assert client.get('/api/auth/profile', headers=headers).get_json()['user']['preferred_friend_gender'] == 'female'
+
+def test_login_rejects_a_wrong_password(client, headers):
+    username = client.get('/api/auth/profile', headers=headers).get_json()['user']['username']
+    assert client.post('/api/auth/login', json={'username': username, 'password': 'wrong'}).status_code == 401
+    assert client.post('/api/auth/login', json={'username': 'nobody', 'password': 'password'}).status_code == 404
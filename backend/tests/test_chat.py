@@ -0,0 +1,198 @@
+import json
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from routes import chat
+from utils.fake_llm import DEFAULT_RESPONSE, FakeLLM
+from utils.llm_client import CircuitBreaker, ResilientLLM
+from utils.rate_limit import LocalBucketStore
+from utils.response_cache import ResponseCache
+
+class InvalidRequestError(Exception):
+    http_status = 400
+
+class RefusingLLM:
+    def predict(self, prompt):
+        raise InvalidRequestError('prompt too long')
+
+    def stream(self, prompt):
+        raise InvalidRequestError('prompt too long')
+        yield
+
+@pytest.fixture
+def llm(monkeypatch):
+    """
+    Serve every persona from the given LLM client for one test
+    """
+    def install(client):
+        registry = {gender: chat.PersonaChain(chat.get_prompt(gender), client) for gender in ('male', 'female', 'neutral')}
+        monkeypatch.setattr(chat, '_chain_registry', registry)
+        return client
+
+    return install
+
+def test_overlong_message_is_rejected(client, headers):
+    response = client.post('/api/chat/send', json={'message': 'x' * (chat.MAX_MESSAGE_CHARS + 1)}, headers=headers)
+    assert response.status_code == 400
+    response = client.post('/api/chat/stream', json={'message': 'x' * (chat.MAX_MESSAGE_CHARS + 1)}, headers=headers)
+    assert response.status_code == 400
+
+def test_refused_prompts_fail_without_degrading_other_users(client, register, llm):
+    resilient = llm(ResilientLLM(RefusingLLM(), retries=1, breaker=CircuitBreaker(failure_threshold=2, cooldown=60)))
+    _, headers = register()
+    for _ in range(5):
+        response = client.post('/api/chat/send', json={'message': 'hello'}, headers=headers)
+        assert response.status_code == 500
+        assert not response.get_json().get('degraded')
+    assert resilient.breaker.state == CircuitBreaker.CLOSED
+
+@pytest.fixture
+def settlements(monkeypatch):
+    """
+    Record rate limiter settlements as (charged, used) pairs
+    """
+    calls = []
+    monkeypatch.setattr(chat.rate_limiter, 'admit', lambda user_id, tokens: tokens)
+    monkeypatch.setattr(chat.rate_limiter, 'settle', lambda user_id, charged, used: calls.append((charged, used)))
+    return calls
+
+@pytest.mark.parametrize('url', ['/api/chat/send', '/api/chat/stream'])
+def test_saturated_gate_refunds_the_charge(client, headers, settlements, monkeypatch, url):
+    def saturated(user_id):
+        raise chat.LLMGateSaturated('Busy', 503)
+
+    monkeypatch.setattr(chat.llm_scheduler, 'acquire', saturated)
+    response = client.post(url, json={'message': 'hello'}, headers=headers)
+    assert response.status_code == 503
+    assert len(settlements) == 1 and settlements[0][1] == 0
+
+def test_failed_cache_lookup_releases_the_stream_slot(client, headers, settlements, monkeypatch):
+    def broken_lookup(*args):
+        raise RuntimeError('cache down')
+
+    monkeypatch.setattr(chat.response_cache, 'lookup', broken_lookup)
+    pending = chat.llm_scheduler.stats()['inflight']
+    with pytest.raises(RuntimeError):
+        client.post('/api/chat/stream', json={'message': 'hello'}, headers=headers)
+    assert chat.llm_scheduler.stats()['inflight'] == pending
+    assert len(settlements) == 1 and settlements[0][1] == 0
+
+def sse_events(response):
+    """
+    Parse a text/event-stream body into [(event, data)]
+    """
+    events = []
+    for block in response.get_data(as_text=True).strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((lines.get('event', 'message'), json.loads(lines['data'])))
+    return events
+
+def test_stream_sends_tokens_then_done(client, headers):
+    response = client.post('/api/chat/stream', json={'message': 'hello'}, headers=headers)
+    assert response.mimetype == 'text/event-stream'
+
+    events = sse_events(response)
+    tokens = [data['token'] for event, data in events if event == 'message']
+    assert len(tokens) > 1 and ''.join(tokens) == DEFAULT_RESPONSE
+    assert events[-1][0] == 'done' and events[-1][1]['response'] == DEFAULT_RESPONSE
+
+    history = client.get('/api/chat/history', headers=headers).get_json()['chats']
+    assert [chat['id'] for chat in history] == [events[-1][1]['chat_id']]
+
+def test_chains_are_built_once_per_persona(monkeypatch):
+    monkeypatch.setattr(chat, '_chain_registry', {})
+    assert chat.get_llm_chain('female') is chat.get_llm_chain('female')
+    assert chat.get_llm_chain('unknown') is chat.get_llm_chain('neutral')
+    assert chat.get_llm_chain('male') is not chat.get_llm_chain('female')
+
+def test_send_saves_the_turn(client, headers):
+    response = client.post('/api/chat/send', json={'message': 'I had a long day'}, headers=headers)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['response'] == DEFAULT_RESPONSE
+
+    history = client.get('/api/chat/history', headers=headers).get_json()['chats']
+    assert [(chat['id'], chat['message']) for chat in history] == [(body['chat_id'], 'I had a long day')]
+
+def test_a_chat_turn_is_saved_in_one_transaction(client, headers):
+    commits = []
+
+    def listener(session):
+        commits.append(session)
+
+    event.listen(Session, 'after_commit', listener)
+    try:
+        assert client.post('/api/chat/send', json={'message': 'hello'}, headers=headers).status_code == 200
+    finally:
+        event.remove(Session, 'after_commit', listener)
+    assert len(commits) == 1
+
+class CountingLLM(FakeLLM):
+    def __init__(self):
+        super().__init__(first_token_delay=0, token_delay=0)
+        self.calls = 0
+
+    def stream(self, prompt):
+        self.calls += 1
+        return super().stream(prompt)
+
+def test_repeated_openers_are_answered_from_the_response_cache(client, register, llm, monkeypatch):
+    counting = llm(CountingLLM())
+    monkeypatch.setattr(chat.response_cache, 'mode', 'exact')
+    chat.response_cache.clear()
+
+    # Replies are not shared between users who did not opt in
+    for headers in [register()[1] for _ in range(2)]:
+        assert client.post('/api/chat/send', json={'message': 'Hi!'}, headers=headers).status_code == 200
+    assert counting.calls == 2
+
+    opted_in = [register()[1] for _ in range(2)]
+    for headers in opted_in:
+        client.put('/api/chat/preferences', json={'allow_response_cache': True}, headers=headers)
+        assert client.post('/api/chat/send', json={'message': 'Hi!'}, headers=headers).status_code == 200
+    assert counting.calls == 3
+
+    # Once there is a conversation, the same message is never answered from another user's turn
+    for headers in opted_in:
+        client.post('/api/chat/send', json={'message': 'hi'}, headers=headers)
+    assert counting.calls == 5
+    chat.response_cache.clear()
+
+def test_response_cache_entries_are_scoped_to_their_user():
+    cache = ResponseCache(mode='exact')
+    _, key = cache.lookup('persona', 'User: I lost my job', 'thanks', user_id=1, shared=True)
+    cache.store(key, 'Sorry about your job', 1.0, 10, user_id=1)
+
+    assert cache.lookup('persona', 'User: I lost my job', 'thanks', user_id=2, shared=True)[0] is None
+    assert cache.lookup('persona', 'User: I lost my job', 'Thanks!', user_id=1)[0] == 'Sorry about your job'
+
+def test_requests_over_the_burst_are_rate_limited(client, headers, monkeypatch):
+    monkeypatch.setattr(chat.rate_limiter, 'store', LocalBucketStore())
+    monkeypatch.setattr(chat.rate_limiter, 'enabled', True)
+    monkeypatch.setattr(chat.rate_limiter, 'request_burst', 2)
+
+    statuses = [client.post('/api/chat/send', json={'message': 'hello'}, headers=headers).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    response = client.post('/api/chat/send', json={'message': 'hello'}, headers=headers)
+    assert int(response.headers['Retry-After']) >= 1
+
+class UnreachableLLM:
+    def predict(self, prompt):
+        raise ConnectionError('refused')
+
+    def stream(self, prompt):
+        raise ConnectionError('refused')
+        yield
+
+def test_unavailable_llm_gets_the_degraded_reply(client, headers, llm):
+    llm(ResilientLLM(UnreachableLLM(), retries=1, backoff=0.001, breaker=CircuitBreaker(failure_threshold=100, cooldown=60)))
+
+    body = client.post('/api/chat/send', json={'message': 'hello'}, headers=headers).get_json()
+    assert body['degraded'] and body['response'] == chat.DEGRADED_RESPONSE
+
+    events = sse_events(client.post('/api/chat/stream', json={'message': 'hello'}, headers=headers))
+    assert events[0][1]['token'] == chat.DEGRADED_RESPONSE
+    assert events[-1][0] == 'done' and events[-1][1]['degraded']
+
+    # Degraded turns are not saved
+    assert client.get('/api/chat/history', headers=headers).get_json()['chats'] == []
@@ -0,0 +1,49 @@
+from contextlib import contextmanager
+from models.conversation_summary import ConversationSummary
+from routes.chat import save_chat_turn
+from utils import context
+
+class RecordingLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def predict(self, prompt):
+        self.prompts.append(prompt)
+        return f'summary {len(self.prompts)}'
+
+def test_long_backlog_is_compacted_in_bounded_batches(app, user):
+    user_id, _ = user
+    llm = RecordingLLM()
+    with app.app_context():
+        turns = [save_chat_turn(user_id, f'message {i} ' + 'word ' * 40, 'reply ' * 40).id for i in range(60)]
+        spent = context.compact_history(user_id, llm=llm)
+        summary = ConversationSummary.query.filter_by(user_id=user_id).one()
+
+        assert len(llm.prompts) > 1
+        assert all(context.count_tokens(prompt) <= context.COMPACTION_INPUT_TOKENS + 200 for prompt in llm.prompts)
+        assert spent == sum(context.count_tokens(prompt) for prompt in llm.prompts)
+        assert summary.summary == f'summary {len(llm.prompts)}'
+        kept = context.build_context(user_id).turns
+        assert 0 < kept < len(turns)
+        assert summary.last_chat_id == turns[-kept - 1]
+        assert context.compact_history(user_id, llm=llm) == 0
+
+def test_compaction_takes_an_llm_slot_and_is_charged_to_the_budget(app, user, monkeypatch):
+    user_id, _ = user
+    llm = RecordingLLM()
+    slots, charges = [], []
+
+    @contextmanager
+    def slot(slot_user_id):
+        slots.append(slot_user_id)
+        yield
+
+    monkeypatch.setattr(context.rate_limiter, 'settle', lambda *args: charges.append(args))
+    with app.app_context():
+        for i in range(30):
+            save_chat_turn(user_id, f'message {i} ' + 'word ' * 40, 'reply ' * 40)
+        context.compact_history(user_id, llm=llm, slot=slot)
+
+    assert slots == [user_id] * len(llm.prompts)
+    assert charges == [(user_id, 0, context.count_tokens(prompt) + context.count_tokens(f'summary {i}'))
+                       for i, prompt in enumerate(llm.prompts, 1)]
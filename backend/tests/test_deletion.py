@@ -0,0 +1,49 @@
+import time
+from utils import deletion
+
+def chat(client, headers, count):
+    for i in range(count):
+        assert client.post('/api/chat/send', json={'message': f'message {i}'}, headers=headers).status_code == 200
+
+def wait_for(client, headers, location, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(location, headers=headers).get_json()['deletion']
+        if job['status'] in ('done', 'failed'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError('deletion did not finish')
+
+def test_short_history_is_cleared_inline(client, headers):
+    chat(client, headers, 3)
+    response = client.delete('/api/chat/clear', headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['deletion']['deleted'] == 3
+    assert client.get('/api/chat/history', headers=headers).get_json()['chats'] == []
+
+def test_long_history_is_cleared_in_the_background(client, headers, monkeypatch):
+    monkeypatch.setattr(deletion, 'DELETE_CHUNK_SIZE', 2)
+    chat(client, headers, 5)
+    response = client.delete('/api/chat/clear', headers=headers)
+    assert response.status_code == 202
+
+    job = wait_for(client, headers, response.headers['Location'])
+    assert (job['status'], job['total'], job['deleted'], job['progress']) == ('done', 5, 5, 1.0)
+    assert client.get('/api/chat/history', headers=headers).get_json()['chats'] == []
+
+def test_account_deletion_needs_the_password_and_removes_everything(client, user):
+    user_id, headers = user
+    chat(client, headers, 2)
+    client.post('/api/journal/', json={'title': 'Entry', 'content': 'Text.'}, headers=headers)
+
+    assert client.delete('/api/auth/profile', json={'password': 'wrong'}, headers=headers).status_code == 401
+    response = client.delete('/api/auth/profile', json={'password': 'password'}, headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['deletion']['deleted'] == 3
+
+    # The job stays readable with the old token; the user and their rows are gone
+    location = f"/api/auth/deletions/{response.get_json()['deletion']['id']}"
+    assert client.get(location, headers=headers).get_json()['deletion']['status'] == 'done'
+    assert client.get('/api/auth/profile', headers=headers).status_code == 401
+    assert client.get('/api/journal/', headers=headers).get_json()['journals'] == []
+    assert client.get('/api/chat/history', headers=headers).get_json()['chats'] == []
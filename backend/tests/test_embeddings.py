@@ -0,0 +1,44 @@
+from models.embedding_job import EmbeddingJob
+from models.user import db
+from utils import embeddings
+from utils.embedding_worker import enqueue_backfill
+
+def test_backfill_queues_existing_rows(app, client, user):
+    user_id, headers = user
+    for i in range(3):
+        client.post('/api/journal/', json={'title': f'Entry {i}', 'content': 'A walk.'}, headers=headers)
+    client.post('/api/chat/send', json={'message': 'hello'}, headers=headers)
+
+    with app.app_context():
+        EmbeddingJob.query.filter_by(user_id=user_id).delete()
+        db.session.commit()
+        with db.engine.begin() as connection:
+            queued = enqueue_backfill(connection, user_id)
+        jobs = EmbeddingJob.query.filter_by(user_id=user_id).all()
+
+    assert queued == len(jobs)
+    assert sorted(job.kind for job in jobs) == ['chat', 'journal', 'journal', 'journal']
+    assert {job.action for job in jobs} == {'upsert'}
+
+def test_semantic_search_finds_entries_and_chats(client, headers, drain):
+    river = client.post('/api/journal/', json={'title': 'Evening', 'content': 'A long walk along the river'}, headers=headers).get_json()['journal']
+    client.post('/api/journal/', json={'title': 'Work', 'content': 'Budget meeting with the team'}, headers=headers)
+    client.post('/api/chat/send', json={'message': 'I like river walks'}, headers=headers)
+    drain()
+
+    results = client.get('/api/journal/semantic-search?q=river walk&k=2', headers=headers).get_json()['results']
+    assert {(result['type'], result.get('title')) for result in results} == {('journal', 'Evening'), ('chat', None)}
+
+    client.delete(f"/api/journal/{river['id']}", headers=headers)
+    drain()
+    results = client.get('/api/journal/semantic-search?q=river walk&k=5', headers=headers).get_json()['results']
+    assert 'Evening' not in [result.get('title') for result in results]
+
+def test_importing_the_app_does_not_load_the_model(app):
+    assert embeddings._model is None
+
+def test_worker_scores_sentiment_for_insights(client, headers, drain):
+    client.post('/api/journal/', json={'title': 'Great', 'content': 'Today was a really good day, I feel happy and grateful'}, headers=headers)
+    drain()
+    totals = client.get('/api/journal/insights', headers=headers).get_json()['totals']
+    assert totals['journal_sentiment'] > 0
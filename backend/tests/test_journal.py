@@ -0,0 +1,123 @@
+import json
+from routes import journal as journal_routes
+from utils.search import HIGHLIGHT_START
+
+def create(client, headers, title, content='Some thoughts.'):
+    response = client.post('/api/journal/', json={'title': title, 'content': content}, headers=headers)
+    assert response.status_code == 201
+    return response.get_json()['journal']
+
+def titles(body):
+    return [journal['title'] for journal in body['journals']]
+
+def test_page_numbers_report_totals(client, headers):
+    for i in range(5):
+        create(client, headers, f'Entry {i}')
+
+    body = client.get('/api/journal/?page=2&per_page=2', headers=headers).get_json()
+    assert titles(body) == ['Entry 2', 'Entry 1']
+    assert (body['total'], body['pages'], body['current_page']) == (5, 3, 2)
+
+def test_cursor_pages_cover_every_entry_once(client, headers):
+    for i in range(7):
+        create(client, headers, f'Entry {i}')
+
+    seen, cursor = [], ''
+    while cursor is not None:
+        body = client.get(f'/api/journal/?cursor={cursor}&per_page=3', headers=headers).get_json()
+        assert 'total' not in body
+        seen += titles(body)
+        cursor = body['next_cursor']
+    assert seen == [f'Entry {i}' for i in reversed(range(7))]
+
+    assert client.get('/api/journal/?cursor=not-a-cursor', headers=headers).status_code == 400
+
+def test_full_text_search_follows_edits_and_deletes(client, headers):
+    river = create(client, headers, 'Evening', 'Walked along the river after dinner.')
+    create(client, headers, 'Work', 'Long meetings all day.')
+
+    body = client.get('/api/journal/search?q=walking', headers=headers).get_json()
+    assert titles(body) == ['Evening']
+    assert HIGHLIGHT_START in body['journals'][0]['snippet']
+
+    client.put(f"/api/journal/{river['id']}", json={'content': 'Sat by the lake instead.'}, headers=headers)
+    assert titles(client.get('/api/journal/search?q=river', headers=headers).get_json()) == []
+    assert titles(client.get('/api/journal/search?q=lake', headers=headers).get_json()) == ['Evening']
+
+    client.delete(f"/api/journal/{river['id']}", headers=headers)
+    assert titles(client.get('/api/journal/search?q=lake', headers=headers).get_json()) == []
+    assert client.get('/api/journal/search', headers=headers).status_code == 400
+
+def test_search_does_not_cross_users(client, register):
+    _, alice = register()
+    _, bob = register()
+    create(client, alice, 'Secret', 'A hidden garden.')
+    assert titles(client.get('/api/journal/search?q=garden', headers=bob).get_json()) == []
+
+def test_entries_belong_to_their_author(client, register):
+    _, alice = register()
+    _, bob = register()
+    entry = create(client, alice, 'Private')
+
+    assert client.get(f"/api/journal/{entry['id']}", headers=alice).status_code == 200
+    assert client.get(f"/api/journal/{entry['id']}", headers=bob).status_code == 404
+    assert client.put(f"/api/journal/{entry['id']}", json={'title': 'Mine'}, headers=bob).status_code == 404
+    assert client.delete(f"/api/journal/{entry['id']}", headers=bob).status_code == 404
+    assert titles(client.get('/api/journal/', headers=bob).get_json()) == []
+
+def test_import_reports_bad_lines_and_export_round_trips(client, headers, monkeypatch):
+    monkeypatch.setattr(journal_routes, 'IMPORT_CHUNK_SIZE', 2)
+    lines = [
+        json.dumps({'title': 'One', 'content': 'First.', 'created_at': '2022-01-01T08:00:00'}),
+        'not json',
+        json.dumps({'title': 'Two'}),
+        json.dumps({'title': 'Three', 'content': 'Third.', 'created_at': 'yesterday'}),
+        '',
+        json.dumps({'title': 'Four', 'content': 'Fourth.'}),
+        json.dumps({'title': 'Five', 'content': 'Fifth.'})
+    ]
+    response = client.post('/api/journal/import', data='\n'.join(lines),
+                           headers={**headers, 'Content-Type': 'application/x-ndjson'})
+    body = response.get_json()
+    assert (body['imported'], body['failed']) == (3, 3)
+    assert [error['line'] for error in body['errors']] == [2, 3, 4]
+
+    export = client.get('/api/journal/export', headers=headers)
+    assert export.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in export.get_data(as_text=True).splitlines()]
+    assert [row['title'] for row in rows] == ['One', 'Four', 'Five']
+    assert rows[0]['created_at'] == '2022-01-01T08:00:00'
+
+def test_empty_import_is_rejected(client, headers):
+    response = client.post('/api/journal/import', data='\n\n', headers={**headers, 'Content-Type': 'application/x-ndjson'})
+    assert response.status_code == 400
+
+def test_fields_and_summary_view(client, headers):
+    create(client, headers, 'Long', 'word ' * 100)
+
+    body = client.get('/api/journal/?fields=id,title', headers=headers).get_json()
+    assert set(body['journals'][0]) == {'id', 'title'}
+
+    summary = client.get('/api/journal/?view=summary', headers=headers).get_json()['journals'][0]
+    assert 'content' not in summary and summary['preview'].endswith('…')
+    assert len(summary['preview']) <= 201
+
+    assert client.get('/api/journal/?fields=id,password', headers=headers).status_code == 400
+
+def test_insights_count_todays_activity(client, headers):
+    entry = create(client, headers, 'Today', 'one two three')
+    create(client, headers, 'Later', 'four five')
+    client.post('/api/chat/send', json={'message': 'six seven'}, headers=headers)
+    client.delete(f"/api/journal/{entry['id']}", headers=headers)
+
+    body = client.get('/api/journal/insights?days=7', headers=headers).get_json()
+    totals = body['totals']
+    assert (totals['journal_entries'], totals['journal_words']) == (1, 2)
+    assert (totals['chat_messages'], totals['chat_words']) == (1, 2)
+    assert totals['active_days'] == 1
+    assert body['streaks'] == {'current': 1, 'longest': 1}
+
+def test_search_snippets_escape_the_entry_text(client, headers):
+    create(client, headers, 'Markup', 'Walked by the <b>river</b> & <script>alert(1)</script>')
+    snippet = client.get('/api/journal/search?q=river', headers=headers).get_json()['journals'][0]['snippet']
+    assert snippet == 'Walked by the &lt;b&gt;<mark>river</mark>&lt;/b&gt; &amp; &lt;script&gt;alert(1)&lt;/script&gt;'
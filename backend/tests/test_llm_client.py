@@ -0,0 +1,76 @@
+import pytest
+from utils.llm_client import CircuitBreaker, LLMUnavailable, ResilientLLM
+
+class InvalidRequestError(Exception):
+    """
+    Named like the openai error for a request the upstream refused
+    """
+    http_status = 400
+
+class APIError(Exception):
+    def __init__(self, http_status):
+        super().__init__(f'HTTP {http_status}')
+        self.http_status = http_status
+
+class FailingLLM:
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    def predict(self, prompt):
+        self.calls += 1
+        raise self.error
+
+def resilient(llm, **options):
+    return ResilientLLM(llm, retries=1, backoff=0.001, breaker=CircuitBreaker(failure_threshold=3, cooldown=60), **options)
+
+def test_client_errors_are_raised_and_do_not_open_the_breaker():
+    llm = FailingLLM(InvalidRequestError('prompt too long'))
+    client = resilient(llm)
+    for _ in range(5):
+        with pytest.raises(InvalidRequestError):
+            client.predict('x' * 10)
+    assert llm.calls == 5
+    assert client.breaker.state == CircuitBreaker.CLOSED
+    assert client.stats()['client_errors'] == 5
+
+@pytest.mark.parametrize('error', [ConnectionError('refused'), APIError(503)])
+def test_transport_errors_and_5xx_open_the_breaker(error):
+    client = resilient(FailingLLM(error))
+    for _ in range(3):
+        with pytest.raises(LLMUnavailable):
+            client.predict('hello')
+    assert client.breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(LLMUnavailable, match='circuit breaker open'):
+        client.predict('hello')
+
+def test_rate_limited_calls_do_not_open_the_breaker():
+    client = resilient(FailingLLM(APIError(429)))
+    for _ in range(5):
+        with pytest.raises(LLMUnavailable):
+            client.predict('hello')
+    assert client.breaker.state == CircuitBreaker.CLOSED
+
+@pytest.mark.parametrize('error', [APIError(429), InvalidRequestError('prompt too long')])
+def test_a_probe_ending_in_a_4xx_leaves_the_breaker_half_open(error):
+    llm = FailingLLM(ConnectionError('refused'))
+    client = resilient(llm)
+    for _ in range(3):
+        with pytest.raises(LLMUnavailable):
+            client.predict('hello')
+    client.breaker._opened_at -= client.breaker.cooldown
+
+    llm.error = error
+    with pytest.raises((LLMUnavailable, InvalidRequestError)):
+        client.predict('hello')
+    assert client.breaker.state == CircuitBreaker.HALF_OPEN
+    assert client.breaker.allow()
+
+def test_client_errors_do_not_reset_the_failure_count():
+    llm = FailingLLM(ConnectionError('refused'))
+    client = resilient(llm)
+    for error in [ConnectionError('refused'), ConnectionError('refused'), APIError(429), ConnectionError('refused')]:
+        llm.error = error
+        with pytest.raises(LLMUnavailable):
+            client.predict('hello')
+    assert client.breaker.state == CircuitBreaker.OPEN
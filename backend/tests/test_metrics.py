@@ -0,0 +1,32 @@
+import os
+import pytest
+from flask import Flask
+from utils import metrics
+
+def test_requests_are_timed_by_phase(client, headers):
+    # Timings are recorded when the response is closed
+    client.get('/api/journal/', headers=headers).close()
+    body = client.get('/metrics').get_data(as_text=True)
+
+    assert 'friendbot_request_duration_seconds_count{method="GET",endpoint="journal.get_journals",status="200"}' in body
+    for phase in ('auth', 'db', 'serialization'):
+        assert f'friendbot_request_phase_duration_seconds_count{{endpoint="journal.get_journals",phase="{phase}"}}' in body
+    assert 'rate_limit' in body
+
+def test_profiling_needs_a_configured_token(monkeypatch):
+    monkeypatch.setattr(metrics, 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(metrics, 'PROFILE_TOKEN', None)
+    with pytest.raises(RuntimeError):
+        metrics.init_metrics(Flask(__name__))
+
+def test_only_the_token_starts_a_profile(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, 'PROFILING_ENABLED', True)
+    monkeypatch.setattr(metrics, 'PROFILE_TOKEN', 'a-long-secret')
+    monkeypatch.setattr(metrics, 'PROFILE_DIR', str(tmp_path))
+
+    for token in ('1', 'a-long-secret-not', 'é'):
+        assert 'X-Profile-File' not in client.get('/health', headers={'X-Profile': token}).headers
+
+    response = client.get('/health', headers={'X-Profile': 'a-long-secret'})
+    response.close()
+    assert os.path.exists(response.headers['X-Profile-File'])
@@ -0,0 +1,14 @@
+from sqlalchemy import inspect
+from migrations import run_migrations
+from models.user import db
+
+def test_migrations_are_applied_once(app):
+    assert run_migrations(app) == []
+
+def test_list_queries_have_covering_indexes(app):
+    with app.app_context():
+        inspector = inspect(db.engine)
+        chats = {index['name']: index['column_names'] for index in inspector.get_indexes('chats')}
+        journals = {index['name']: index['column_names'] for index in inspector.get_indexes('journals')}
+    assert chats['ix_chats_user_id_timestamp'] == ['user_id', 'timestamp', 'id']
+    assert journals['ix_journals_user_id_updated_at'] == ['user_id', 'updated_at', 'id']
@@ -0,0 +1,108 @@
+import sqlite3
+import pytest
+from sqlalchemy import create_engine, event
+from models.user import db
+from utils import replicas
+from utils.replicas import ReplicaRouter
+from utils.user_cache import LocalCacheBackend
+
+@pytest.fixture
+def replica(app, tmp_path, monkeypatch):
+    """
+    Route reads to a read-only copy of the test database; returns (router, refresh),
+    where refresh() copies the primary onto the replica again
+    """
+    path = tmp_path / 'replica.db'
+    with app.app_context():
+        primary_path = db.engine.url.database
+
+    def refresh():
+        source, target = sqlite3.connect(primary_path), sqlite3.connect(path)
+        source.backup(target)
+        target.close()
+        source.close()
+
+    refresh()
+    engine = create_engine(f'sqlite:///file:{path}?mode=ro&uri=true')
+    router = ReplicaRouter(sticky_backend=LocalCacheBackend(), sticky_seconds=5, check_interval=60)
+    router.engines = {'replica_0': engine}
+    event.listen(engine, 'handle_error', router._connection_error)
+    router.check()
+    monkeypatch.setattr(replicas, 'replica_router', router)
+    yield router, refresh
+    engine.dispose()
+
+def create(client, headers, title):
+    return client.post('/api/journal/', json={'title': title, 'content': 'Text.'}, headers=headers).get_json()['journal']
+
+def test_read_only_handlers_read_from_the_replica(client, headers, replica):
+    router, refresh = replica
+    create(client, headers, 'Replicated')
+    refresh()
+    router.sticky.clear()
+
+    before = router.stats()['replica_reads']
+    body = client.get('/api/journal/', headers=headers).get_json()
+    assert [journal['title'] for journal in body['journals']] == ['Replicated']
+    assert router.stats()['replica_reads'] > before
+
+def test_writers_read_their_writes_from_the_primary(client, headers, replica):
+    router, _ = replica
+    entry = create(client, headers, 'Not replicated yet')
+    assert client.get(f"/api/journal/{entry['id']}", headers=headers).status_code == 200
+    assert router.stats()['sticky_reads'] > 0
+
+    # Without the stickiness window the lagging replica answers
+    router.sticky.clear()
+    router.sticky_seconds = 0
+    entry = create(client, headers, 'Also not replicated')
+    assert client.get(f"/api/journal/{entry['id']}", headers=headers).status_code == 404
+
+def test_sync_reads_from_the_primary(client, headers, replica):
+    router, _ = replica
+    router.sticky_seconds = 0
+    create(client, headers, 'Fresh')
+    body = client.get('/api/journal/?since=', headers=headers).get_json()
+    assert [journal['title'] for journal in body['journals']] == ['Fresh']
+
+def test_unhealthy_replicas_are_skipped(client, headers, replica, tmp_path):
+    router, _ = replica
+    router.engines['replica_1'] = create_engine(f"sqlite:///file:{tmp_path / 'missing.db'}?mode=ro&uri=true")
+    router.check()
+    assert router.healthy == ['replica_0']
+
+    router.engines = {'replica_1': router.engines['replica_1']}
+    router.check()
+    router.sticky_seconds = 0
+    entry = create(client, headers, 'Primary only')
+    before = router.stats()['primary_reads']
+    assert client.get(f"/api/journal/{entry['id']}", headers=headers).status_code == 200
+    assert router.stats()['primary_reads'] > before
+
+def test_the_monitor_thread_stops(app, replica):
+    router, _ = replica
+    router.start(app)
+    thread = router._monitor_thread
+    router.stop(timeout=5)
+    assert not thread.is_alive() and router._monitor_thread is None
+
+def test_semantic_search_never_drops_vectors_on_a_replica_read(app, client, user, replica, drain):
+    from utils.embeddings import embedding_manager
+
+    router, refresh = replica
+    user_id, headers = user
+    refresh()
+    create(client, headers, 'Lagging')
+    drain()
+    assert embedding_manager.indexes.count(user_id) == 1
+
+    # The replica has not seen the entry yet; its vector must survive the search
+    router.sticky.clear()
+    assert client.get('/api/journal/semantic-search?q=Lagging', headers=headers).get_json()['results'] == []
+    drain()
+    assert embedding_manager.indexes.count(user_id) == 1
+
+    refresh()
+    router.sticky.clear()
+    results = client.get('/api/journal/semantic-search?q=Lagging', headers=headers).get_json()['results']
+    assert [result['title'] for result in results] == ['Lagging']
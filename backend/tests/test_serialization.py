@@ -0,0 +1,9 @@
+from datetime import datetime
+from flask import jsonify
+from utils.serialization import TimedJSONProvider
+
+def test_json_matches_the_standard_encoder(app):
+    assert isinstance(app.json, TimedJSONProvider)
+    with app.test_request_context():
+        body = jsonify({'b': 1, 'a': datetime(2021, 1, 1), 'text': 'café'}).get_data()
+    assert body == '{"a":"Fri, 01 Jan 2021 00:00:00 GMT","b":1,"text":"café"}\n'.encode()
@@ -0,0 +1,25 @@
+import pytest
+import serve
+
+def test_replicas_on_several_workers_need_shared_stickiness(monkeypatch):
+    monkeypatch.setenv('DATABASE_REPLICA_URIS', 'sqlite:///replica.db')
+    monkeypatch.setenv('WEB_WORKERS', '4')
+    with pytest.raises(SystemExit):
+        serve.server_options()
+
+    monkeypatch.setenv('DB_STICKY_BACKEND', 'redis')
+    assert serve.server_options()['workers'] == 4
+
+    monkeypatch.delenv('DB_STICKY_BACKEND')
+    monkeypatch.setenv('WEB_WORKERS', '1')
+    assert serve.server_options()['workers'] == 1
+
+@pytest.mark.parametrize('mode, starts', [('wsgi', 1), ('asgi', 0)])
+def test_workers_start_background_threads_in_one_place(monkeypatch, mode, starts):
+    import app
+
+    calls = []
+    monkeypatch.setenv('SERVER_MODE', mode)
+    monkeypatch.setattr(app, 'start_background_workers', lambda: calls.append(mode))
+    serve.post_fork(None, None)
+    assert len(calls) == starts
@@ -0,0 +1,92 @@
+import json
+import time
+from datetime import datetime, timedelta
+from utils.pagination import encode_cursor
+
+def sync(client, headers, url, cursor=''):
+    body = client.get(f'{url}?since={cursor}', headers=headers).get_json()
+    return body, body['cursor']
+
+def import_ndjson(client, headers, items):
+    return client.post('/api/journal/import', data='\n'.join(json.dumps(item) for item in items),
+                       headers={**headers, 'Content-Type': 'application/x-ndjson'})
+
+def test_imported_entries_reach_synced_clients(client, headers):
+    _, cursor = sync(client, headers, '/api/journal/')
+    time.sleep(0.01)
+
+    response = import_ndjson(client, headers, [
+        {'title': 'Old entry', 'content': 'Written long ago.', 'created_at': '2021-05-01T10:00:00', 'updated_at': '2021-05-01T10:00:00'}
+    ])
+    assert response.status_code == 200
+
+    body, _ = sync(client, headers, '/api/journal/', cursor)
+    assert [journal['title'] for journal in body['journals']] == ['Old entry']
+    assert body['journals'][0]['created_at'] == '2021-05-01T10:00:00'
+
+def test_etag_changes_on_add_update_and_delete(client, headers):
+    first = client.post('/api/journal/', json={'title': 'One', 'content': 'A walk.'}, headers=headers).get_json()['journal']
+    response = client.get('/api/journal/', headers=headers)
+    etag = response.headers['ETag']
+    assert client.get('/api/journal/', headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+    second = client.post('/api/journal/', json={'title': 'Two', 'content': 'A run.'}, headers=headers).get_json()['journal']
+    added = client.get('/api/journal/', headers={**headers, 'If-None-Match': etag})
+    assert added.status_code == 200
+
+    time.sleep(0.01)
+    client.put(f"/api/journal/{first['id']}", json={'title': 'One again'}, headers=headers)
+    updated = client.get('/api/journal/', headers={**headers, 'If-None-Match': added.headers['ETag']})
+    assert updated.status_code == 200
+
+    client.delete(f"/api/journal/{second['id']}", headers=headers)
+    deleted = client.get('/api/journal/', headers={**headers, 'If-None-Match': updated.headers['ETag']})
+    assert deleted.status_code == 200
+    assert [journal['title'] for journal in deleted.get_json()['journals']] == ['One again']
+
+def test_sync_pages_are_not_tagged(client, headers):
+    assert 'ETag' not in client.get('/api/journal/?since=', headers=headers).headers
+    assert 'ETag' in client.get('/api/chat/history', headers=headers).headers
+
+def test_import_converts_offsets_to_utc(client, headers):
+    response = import_ndjson(client, headers, [
+        {'title': 'Evening', 'content': 'Late walk.', 'created_at': '2021-05-01T22:30:00+02:00'},
+        {'title': 'Zulu', 'content': 'Early walk.', 'created_at': '2021-05-02T06:00:00Z'}
+    ])
+    assert response.status_code == 200
+
+    body, _ = sync(client, headers, '/api/journal/')
+    assert {journal['title']: journal['created_at'] for journal in body['journals']} == {
+        'Evening': '2021-05-01T20:30:00', 'Zulu': '2021-05-02T06:00:00'
+    }
+
+def test_sync_sends_changes_and_deletions_since_the_cursor(client, headers):
+    kept = client.post('/api/journal/', json={'title': 'Kept', 'content': 'Stays.'}, headers=headers).get_json()['journal']
+    gone = client.post('/api/journal/', json={'title': 'Gone', 'content': 'Goes.'}, headers=headers).get_json()['journal']
+    body, cursor = sync(client, headers, '/api/journal/')
+    assert {journal['title'] for journal in body['journals']} == {'Kept', 'Gone'}
+    assert body['deleted'] == [] and not body['cleared']
+
+    time.sleep(0.01)
+    client.put(f"/api/journal/{kept['id']}", json={'title': 'Kept and edited'}, headers=headers)
+    client.delete(f"/api/journal/{gone['id']}", headers=headers)
+    body, cursor = sync(client, headers, '/api/journal/', cursor)
+    assert [journal['title'] for journal in body['journals']] == ['Kept and edited']
+    assert body['deleted'] == [gone['id']]
+
+    body, _ = sync(client, headers, '/api/journal/', cursor)
+    assert body['journals'] == [] and body['deleted'] == []
+
+def test_sync_reports_a_cleared_chat_history(client, headers):
+    client.post('/api/chat/send', json={'message': 'hello'}, headers=headers)
+    _, cursor = sync(client, headers, '/api/chat/history')
+    time.sleep(0.01)
+    client.delete('/api/chat/clear', headers=headers)
+
+    body, _ = sync(client, headers, '/api/chat/history', cursor)
+    assert body['cleared'] and body['chats'] == []
+
+def test_bad_and_expired_cursors(client, headers):
+    assert client.get('/api/journal/?since=garbage', headers=headers).status_code == 400
+    expired = encode_cursor(datetime.utcnow() - timedelta(days=365), 0)
+    assert client.get(f'/api/journal/?since={expired}', headers=headers).status_code == 410
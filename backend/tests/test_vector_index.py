@@ -0,0 +1,66 @@
+import os
+import numpy as np
+from utils.vector_index import UserVectorIndexStore
+
+def unit_vectors(count, dimension=8, seed=0):
+    vectors = np.random.default_rng(seed).random((count, dimension), dtype='float32')
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+def test_changes_are_written_straight_away(tmp_path):
+    store = UserVectorIndexStore(8, index_dir=str(tmp_path))
+    vectors = unit_vectors(3)
+    store.upsert(1, [2, 4, 6], vectors)
+    assert store.search(1, vectors[1], k=1)[0][0] == 4
+
+    other = UserVectorIndexStore(8, index_dir=str(tmp_path))
+    assert other.count(1) == 3
+    assert store.remove(1, [4]) == 1
+    assert other.count(1) == 2
+
+def test_batched_changes_are_written_once_on_exit(tmp_path, monkeypatch):
+    store = UserVectorIndexStore(8, index_dir=str(tmp_path))
+    saves = []
+    save = store._save
+    monkeypatch.setattr(store, '_save', lambda user_id, index: saves.append(user_id) or save(user_id, index))
+
+    vectors = unit_vectors(4)
+    with store.batched():
+        store.upsert(1, [2, 4], vectors[:2])
+        store.upsert(1, [6], vectors[2:3])
+        store.remove(1, [2])
+        store.upsert(2, [8], vectors[3:])
+        assert store.count(1) == 2
+        assert not os.path.exists(tmp_path / '1.faiss')
+
+    assert sorted(saves) == [1, 2]
+    fresh = UserVectorIndexStore(8, index_dir=str(tmp_path))
+    assert sorted(vector_id for vector_id, _ in fresh.search(1, vectors[2], k=5)) == [4, 6]
+
+def test_writes_from_another_process_are_not_overwritten(tmp_path):
+    store = UserVectorIndexStore(8, index_dir=str(tmp_path))
+    other = UserVectorIndexStore(8, index_dir=str(tmp_path))
+    vectors = unit_vectors(4)
+    store.upsert(1, [2], vectors[:1])
+    assert other.count(1) == 1
+
+    # An immediate write reloads the file the other store changed since it last read it
+    store.upsert(1, [4], vectors[1:2])
+    other.upsert(1, [6], vectors[2:3])
+    assert sorted(store.vectors(1)[0]) == [2, 4, 6]
+
+    # A batch started on an older file replays its changes on the newer one
+    with store.batched():
+        store.upsert(1, [8], vectors[3:])
+        store.remove(1, [2])
+        other.remove(1, [4])
+    assert sorted(other.vectors(1)[0]) == [6, 8]
+    assert sorted(UserVectorIndexStore(8, index_dir=str(tmp_path)).vectors(1)[0]) == [6, 8]
+
+def test_batched_changes_to_a_deleted_index_are_dropped(tmp_path):
+    store = UserVectorIndexStore(8, index_dir=str(tmp_path))
+    store.upsert(1, [2], unit_vectors(1))
+    with store.batched():
+        store.upsert(1, [4], unit_vectors(1, seed=1))
+        UserVectorIndexStore(8, index_dir=str(tmp_path)).delete_user(1)
+    assert not os.path.exists(tmp_path / '1.faiss')
+    assert store.count(1) == 0
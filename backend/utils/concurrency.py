@@ -0,0 +1,222 @@
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+
+class LLMGateSaturated(Exception):
+    """
+    Raised when no upstream LLM slot can be handed out; carries the HTTP status to return
+    """
+    def __init__(self, message, status_code, retry_after=1):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+class FairQueue:
+    """
+    Waiters grouped per user and served round-robin: each pop takes the oldest waiter of
+    the user at the front, then moves that user to the back. A user with many queued
+    requests therefore gets one slot per round, like everybody else.
+    Not thread-safe; callers hold their own lock.
+    """
+    def __init__(self):
+        self._queues = OrderedDict()  # user_id -> deque of waiters
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def waiting(self, user_id):
+        queue = self._queues.get(user_id)
+        return len(queue) if queue else 0
+
+    def push(self, user_id, waiter):
+        self._queues.setdefault(user_id, deque()).append(waiter)
+        self._length += 1
+
+    def pop(self):
+        user_id, queue = next(iter(self._queues.items()))
+        waiter = queue.popleft()
+        if queue:
+            self._queues.move_to_end(user_id)
+        else:
+            del self._queues[user_id]
+        self._length -= 1
+        return waiter
+
+    def remove(self, user_id, waiter):
+        queue = self._queues.get(user_id)
+        if queue is None or waiter not in queue:
+            return False
+        queue.remove(waiter)
+        if not queue:
+            del self._queues[user_id]
+        self._length -= 1
+        return True
+
+class FairScheduler:
+    """
+    Caps in-flight upstream LLM calls for the threaded (WSGI) app and shares the slots
+    fairly between users. A freed slot is handed straight to the next waiter in
+    FairQueue order. A user may have at most max_pending_per_user calls running or
+    queued; further ones are rejected (429) so one client cannot tie up every worker
+    thread. Callers beyond max_waiting in total are rejected as well, and a waiter that
+    gets no slot within acquire_timeout gives up (503).
+    """
+    def __init__(self, max_inflight=16, max_waiting=32, max_pending_per_user=2, acquire_timeout=5.0):
+        self.max_inflight = max_inflight
+        self.max_waiting = max_waiting
+        self.max_pending_per_user = max_pending_per_user
+        self.acquire_timeout = acquire_timeout
+        self.inflight = 0
+        self._pending = {}  # user_id -> calls running or queued
+        self._queue = FairQueue()
+        self._lock = threading.Lock()
+        self._stats = {'granted': 0, 'queued': 0, 'rejected': 0, 'timed_out': 0}
+
+    @property
+    def waiting(self):
+        return len(self._queue)
+
+    def _add_pending(self, user_id, delta):
+        count = self._pending.get(user_id, 0) + delta
+        if count > 0:
+            self._pending[user_id] = count
+        else:
+            self._pending.pop(user_id, None)
+
+    def acquire(self, user_id):
+        """
+        Wait for a slot and return a function that releases it (safe to call twice)
+        """
+        with self._lock:
+            if self._pending.get(user_id, 0) >= self.max_pending_per_user:
+                self._stats['rejected'] += 1
+                raise LLMGateSaturated('Too many requests, please wait for your previous message.', 429)
+
+            if self.inflight < self.max_inflight and not self._queue:
+                self.inflight += 1
+                waiter = None
+            elif len(self._queue) >= self.max_waiting:
+                self._stats['rejected'] += 1
+                raise LLMGateSaturated('Too many requests, please try again shortly.', 429)
+            else:
+                waiter = threading.Event()
+                self._queue.push(user_id, waiter)
+                self._stats['queued'] += 1
+            self._add_pending(user_id, 1)
+
+        if waiter is not None and not waiter.wait(self.acquire_timeout):
+            with self._lock:
+                # The slot may have been handed over just as the wait timed out
+                if self._queue.remove(user_id, waiter):
+                    self._add_pending(user_id, -1)
+                    self._stats['timed_out'] += 1
+                    raise LLMGateSaturated('The AI friend is busy right now, please try again.', 503)
+
+        with self._lock:
+            self._stats['granted'] += 1
+
+        released = []
+
+        def release():
+            with self._lock:
+                if released:
+                    return
+                released.append(True)
+                self._add_pending(user_id, -1)
+                if self._queue:
+                    self._queue.pop().set()
+                else:
+                    self.inflight -= 1
+
+        return release
+
+    @contextmanager
+    def slot(self, user_id):
+        release = self.acquire(user_id)
+        try:
+            yield
+        finally:
+            release()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['inflight'] = self.inflight
+            stats['waiting'] = len(self._queue)
+        return stats
+
+class AsyncLLMGate:
+    """
+    Caps the number of in-flight upstream LLM calls.
+    Callers beyond max_inflight wait in a short queue, served fairly across users
+    (FairQueue); once max_waiting callers are queued, new ones are rejected immediately
+    (429), and anyone who waits longer than acquire_timeout gives up (503) instead of
+    piling up behind a slow upstream. A user may have at most max_pending_per_user calls
+    running or queued.
+    """
+    def __init__(self, max_inflight=16, max_waiting=32, acquire_timeout=5.0, max_pending_per_user=None):
+        self.max_inflight = max_inflight
+        self.max_waiting = max_waiting
+        self.acquire_timeout = acquire_timeout
+        self.max_pending_per_user = max_pending_per_user
+        self.inflight = 0
+        self._pending = {}
+        self._queue = FairQueue()
+
+    @property
+    def waiting(self):
+        return len(self._queue)
+
+    def _add_pending(self, user_id, delta):
+        count = self._pending.get(user_id, 0) + delta
+        if count > 0:
+            self._pending[user_id] = count
+        else:
+            self._pending.pop(user_id, None)
+
+    def _release(self):
+        # Hand the slot to the next waiter that is still waiting
+        while self._queue:
+            future = self._queue.pop()
+            if not future.done():
+                future.set_result(True)
+                return
+        self.inflight -= 1
+
+    @asynccontextmanager
+    async def slot(self, user_id=None):
+        if self.max_pending_per_user and self._pending.get(user_id, 0) >= self.max_pending_per_user:
+            raise LLMGateSaturated('Too many requests, please wait for your previous message.', 429)
+
+        if self.inflight < self.max_inflight and not self._queue:
+            self.inflight += 1
+        else:
+            if len(self._queue) >= self.max_waiting:
+                raise LLMGateSaturated('Too many requests, please try again shortly.', 429)
+
+            future = asyncio.get_running_loop().create_future()
+            self._queue.push(user_id, future)
+            self._add_pending(user_id, 1)
+            try:
+                await asyncio.wait_for(asyncio.shield(future), timeout=self.acquire_timeout)
+            except BaseException as e:
+                if future.done() and not future.cancelled():
+                    # Granted just as the wait ended; pass the slot on
+                    self._release()
+                else:
+                    future.cancel()
+                    self._queue.remove(user_id, future)
+                if isinstance(e, asyncio.TimeoutError):
+                    raise LLMGateSaturated('The AI friend is busy right now, please try again.', 503)
+                raise
+            finally:
+                self._add_pending(user_id, -1)
+
+        self._add_pending(user_id, 1)
+        try:
+            yield
+        finally:
+            self._add_pending(user_id, -1)
+            self._release()
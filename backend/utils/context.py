@@ -0,0 +1,240 @@
+"""
+Token-budgeted conversation context for the chat prompt.
+
+The prompt carries a stored rolling summary of older turns plus as many of the newest
+turns as fit in CONTEXT_TOKEN_BUDGET. When turns start falling out of the budget they
+are folded into the summary by a background compaction, which extends the existing
+summary with just those turns instead of re-reading the whole conversation.
+Its LLM calls are charged to the user's rate-limit token budget and, when the caller
+passes one, take a slot from the same scheduler as chat replies.
+"""
+import logging
+import os
+import threading
+from collections import namedtuple
+from contextlib import nullcontext
+from models.user import db
+from models.chat import Chat
+from models.conversation_summary import ConversationSummary
+from utils.llm import get_llm
+from utils.concurrency import LLMGateSaturated
+from utils.rate_limit import rate_limiter
+
+logger = logging.getLogger(__name__)
+
+# Tokens available for summary + recent turns in each prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '800'))
+# Upper bound on the stored summary
+SUMMARY_TOKEN_BUDGET = int(os.getenv('CONTEXT_SUMMARY_TOKENS', '200'))
+# Any single message is cut to this many tokens in the prompt
+TURN_TOKEN_LIMIT = int(os.getenv('CONTEXT_TURN_TOKENS', '300'))
+# Never look further back than this many unsummarized turns
+MAX_RECENT_TURNS = int(os.getenv('CONTEXT_MAX_TURNS', '20'))
+# Largest slice of old turns folded into the summary in one compaction
+COMPACTION_INPUT_TOKENS = int(os.getenv('CONTEXT_COMPACTION_TOKENS', '1500'))
+
+SUMMARY_TEMPLATE = """
+Update the running summary of a conversation between a human and their AI friend.
+Keep what matters for the friendship: how the human feels, what is going on in their life,
+people and plans they mentioned, and advice already given. Write at most {max_words} words.
+
+Summary so far:
+{summary}
+
+New lines of conversation:
+{turns}
+Updated summary:"""
+
+ConversationContext = namedtuple('ConversationContext', ['history', 'tokens', 'turns', 'needs_compaction'])
+
+_encoding = None
+_encoding_loaded = False
+
+def _get_encoding():
+    # tiktoken is optional; without it token counts are estimated from length
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding('p50k_base')
+        except Exception:
+            _encoding = None
+        _encoding_loaded = True
+    return _encoding
+
+def count_tokens(text):
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + 3) // 4
+
+def truncate_tokens(text, limit):
+    """
+    Cut text down to roughly limit tokens, marking the cut with an ellipsis
+    """
+    if count_tokens(text) <= limit:
+        return text
+    encoding = _get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:limit]).rstrip() + '...'
+    return text[:limit * 4].rstrip() + '...'
+
+def format_turn(chat):
+    turn = f"Human: {truncate_tokens(chat.message, TURN_TOKEN_LIMIT)}\n"
+    if chat.response:
+        turn += f"AI Friend: {truncate_tokens(chat.response, TURN_TOKEN_LIMIT)}\n"
+    return turn
+
+def format_summary(summary):
+    return f"(Earlier in this conversation: {summary})\n" if summary else ""
+
+def _unsummarized_turns(user_id, after_id, limit):
+    # Newest first, through the (user_id, timestamp, id) index
+    return Chat.query.filter(Chat.user_id == user_id, Chat.id > after_id).order_by(
+        Chat.timestamp.desc(), Chat.id.desc()
+    ).limit(limit).all()
+
+def _fit_turns(turns, budget):
+    """
+    Take formatted turns newest first while they fit in budget; returns (lines, tokens)
+    """
+    lines = []
+    used = 0
+    for chat in turns:
+        line = format_turn(chat)
+        tokens = count_tokens(line)
+        if used + tokens > budget:
+            break
+        lines.append(line)
+        used += tokens
+    return lines, used
+
+def build_context(user_id, budget=None):
+    """
+    Build the prompt history for a user: the rolling summary followed by the newest
+    turns that fit in the token budget, oldest first. The message being answered is
+    not stored yet, so it only ever reaches the prompt as the input.
+    """
+    budget = budget or CONTEXT_TOKEN_BUDGET
+    summary = ConversationSummary.query.filter_by(user_id=user_id).first()
+
+    summary_text = format_summary(truncate_tokens(summary.summary, SUMMARY_TOKEN_BUDGET)) if summary else ""
+    summary_tokens = count_tokens(summary_text)
+
+    recent = _unsummarized_turns(user_id, summary.last_chat_id if summary else 0, MAX_RECENT_TURNS)
+    lines, turn_tokens = _fit_turns(recent, budget - summary_tokens)
+    lines.reverse()
+
+    # Turns that were left out (or lie beyond the look-back window) belong in the summary
+    needs_compaction = len(lines) < len(recent) or len(recent) == MAX_RECENT_TURNS
+
+    return ConversationContext(
+        history=summary_text + ''.join(lines),
+        tokens=summary_tokens + turn_tokens,
+        turns=len(lines),
+        needs_compaction=needs_compaction
+    )
+
+def compact_history(user_id, llm=None, slot=None):
+    """
+    Fold the turns that no longer fit in the prompt into the user's stored summary.
+    The newest turns filling half of the turn budget stay verbatim, so compaction runs
+    every few turns rather than on every one. Older turns are read oldest first in
+    batches of at most MAX_RECENT_TURNS rows, each extending the summary with a prompt
+    of at most COMPACTION_INPUT_TOKENS of turns and committed before the next is read.
+    Each summary call runs inside slot(user_id) when given, and its prompt and reply
+    tokens are charged to the user's token budget after the fact (it may go into debt).
+    Returns the prompt tokens spent, 0 if there was nothing to do.
+    """
+    summary = ConversationSummary.query.filter_by(user_id=user_id).first()
+    summary_text = summary.summary if summary else ''
+    last_id = summary.last_chat_id if summary else 0
+
+    # The newest turns stay verbatim; everything up to the newest turn past them is folded
+    recent = _unsummarized_turns(user_id, last_id, MAX_RECENT_TURNS // 2 + 1)
+    kept, _ = _fit_turns(recent, (CONTEXT_TOKEN_BUDGET - SUMMARY_TOKEN_BUDGET) // 2)
+    kept_count = min(len(kept), MAX_RECENT_TURNS // 2)
+    if len(recent) <= kept_count:
+        return 0
+    fold_through = recent[kept_count].id
+
+    llm = llm or get_llm()
+    spent = 0
+    while last_id < fold_through:
+        batch = Chat.query.filter(Chat.user_id == user_id, Chat.id > last_id, Chat.id <= fold_through).order_by(
+            Chat.id
+        ).limit(MAX_RECENT_TURNS).all()
+        if not batch:
+            break
+
+        # Oldest first while they fit, and always at least one turn so the loop moves on
+        fold, _ = _fit_turns(batch, COMPACTION_INPUT_TOKENS)
+        fold = fold or [format_turn(batch[0])]
+
+        prompt = SUMMARY_TEMPLATE.format(
+            max_words=SUMMARY_TOKEN_BUDGET * 3 // 4,
+            summary=summary_text or '(nothing yet)',
+            turns=''.join(fold)
+        )
+        with slot(user_id) if slot else nullcontext():
+            reply = llm.predict(prompt)
+        rate_limiter.settle(user_id, 0, count_tokens(prompt) + count_tokens(reply))
+        new_summary = truncate_tokens(reply.strip(), SUMMARY_TOKEN_BUDGET)
+        new_last_id = batch[len(fold) - 1].id
+        spent += count_tokens(prompt)
+
+        if summary is None:
+            summary = ConversationSummary(user_id=user_id, summary=new_summary, last_chat_id=new_last_id)
+            db.session.add(summary)
+            moved = 1
+        else:
+            # Only move forward from the state we summarized, in case another process got there first
+            moved = ConversationSummary.query.filter_by(user_id=user_id, last_chat_id=last_id).update(
+                {'summary': new_summary, 'last_chat_id': new_last_id}, synchronize_session=False
+            )
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        if not moved:
+            break
+
+        summary_text, last_id = new_summary, new_last_id
+
+    return spent
+
+def clear_summary(user_id):
+    """
+    Forget the rolling summary (used when the chat history is cleared)
+    """
+    ConversationSummary.query.filter_by(user_id=user_id).delete()
+
+_compacting = set()
+_compacting_lock = threading.Lock()
+
+def schedule_compaction(app, user_id, slot=None):
+    """
+    Run compact_history for a user on a background thread, at most once at a time per user
+    """
+    with _compacting_lock:
+        if user_id in _compacting:
+            return
+        _compacting.add(user_id)
+
+    def run():
+        try:
+            with app.app_context():
+                compact_history(user_id, slot=slot)
+        except LLMGateSaturated:
+            # No slot for it now; the next turn that needs compaction schedules it again
+            logger.info('Conversation compaction for user %s deferred, no LLM slot free', user_id)
+        except Exception:
+            logger.exception('Conversation compaction failed for user %s', user_id)
+        finally:
+            with _compacting_lock:
+                _compacting.discard(user_id)
+
+    threading.Thread(target=run, name=f'compaction-{user_id}', daemon=True).start()
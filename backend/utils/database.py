@@ -0,0 +1,43 @@
+import os
+import sqlite3
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+def engine_options(database_uri):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS for the configured database.
+    PostgreSQL gets a bounded connection pool that checks connections before use and
+    recycles them before server-side idle timeouts; SQLite gets a busy timeout.
+    """
+    if database_uri.startswith('postgresql'):
+        return {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+            'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT', '30')),
+            'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '1800')),
+            'pool_pre_ping': True
+        }
+
+    if database_uri.startswith('sqlite'):
+        # Seconds a connection waits for another writer before "database is locked"
+        return {'connect_args': {'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT', '15'))}}
+
+    return {}
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    """
+    WAL lets readers keep going while one connection writes, and synchronous=NORMAL is
+    safe with WAL; SQLITE_WAL=0 keeps the default rollback journal. Foreign keys are
+    off by default in SQLite, and ON DELETE CASCADE needs them.
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+
+    cursor = dbapi_connection.cursor()
+    if os.getenv('SQLITE_WAL', '1') == '1':
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.execute(f"PRAGMA busy_timeout={int(float(os.getenv('SQLITE_BUSY_TIMEOUT', '15')) * 1000)}")
+    cursor.close()
@@ -0,0 +1,179 @@
+"""
+Chunked deletes for clearing a user's chat history and deleting an account.
+
+Rows are removed DELETE_CHUNK_SIZE (default 1000) at a time, each chunk in its own short
+transaction, so no single statement holds the write lock for long and nothing is loaded
+into the ORM. Progress goes to a DeletionJob row. A job that fits in one chunk runs
+inline; larger ones run on a background thread and the client polls the job.
+
+Account deletion removes chats, journals and queued embedding jobs chunk by chunk, then
+the user row; ON DELETE CASCADE catches anything written in the meantime. Afterwards
+the user's vector index, cached user, conversation summary and response-cache entries
+are purged.
+
+DELETE_CHUNK_PAUSE (seconds, default 0) sleeps between chunks to let other writers in.
+A job that has made no progress for DELETION_STALE_SECONDS (default 60) is assumed
+abandoned (its process died) and is resumed the next time the same delete is requested.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select
+from models.user import User, db
+from models.chat import Chat
+from models.journal import Journal
+from models.embedding_job import EmbeddingJob
+from models.conversation_summary import ConversationSummary
+from models.deletion_job import DeletionJob
+from utils.context import clear_summary
+from utils.response_cache import response_cache
+from utils.user_cache import user_cache
+from utils.insights import chats_cleared
+from utils.sync import record_deletion
+from utils.vector_index import CHAT, chat_vector_id
+
+logger = logging.getLogger(__name__)
+
+DELETE_CHUNK_SIZE = int(os.getenv('DELETE_CHUNK_SIZE', '1000'))
+DELETE_CHUNK_PAUSE = float(os.getenv('DELETE_CHUNK_PAUSE', '0'))
+DELETION_STALE_SECONDS = float(os.getenv('DELETION_STALE_SECONDS', '60'))
+
+CHAT_HISTORY = 'chat_history'
+ACCOUNT = 'account'
+
+def _count(model, user_id):
+    return db.session.scalar(select(func.count()).select_from(model).where(model.user_id == user_id))
+
+def _total_rows(user_id, kind):
+    if kind == CHAT_HISTORY:
+        return _count(Chat, user_id)
+    return _count(Chat, user_id) + _count(Journal, user_id)
+
+def _delete_in_chunks(model, user_id, job=None, on_chunk=None):
+    """
+    Delete model rows owned by user_id, chunk by chunk, committing after each one
+    """
+    while True:
+        ids = db.session.scalars(
+            select(model.id).where(model.user_id == user_id).order_by(model.id).limit(DELETE_CHUNK_SIZE)
+        ).all()
+        if not ids:
+            return
+
+        db.session.execute(delete(model).where(model.id.in_(ids)))
+        if job is not None:
+            job.deleted += len(ids)
+        db.session.commit()
+
+        if on_chunk is not None:
+            on_chunk(ids)
+        if DELETE_CHUNK_PAUSE:
+            time.sleep(DELETE_CHUNK_PAUSE)
+
+def _purge_vectors(user_id, vector_ids=None):
+    """
+    Remove vectors from a user's semantic index, or the whole index when vector_ids is None.
+    The database delete has already happened, so a failure here is only logged.
+    """
+    from utils.embeddings import embedding_manager
+    if not embedding_manager.has_index(user_id):
+        return
+
+    try:
+        if vector_ids is None:
+            embedding_manager.indexes.delete_user(user_id)
+        else:
+            embedding_manager.indexes.remove(user_id, vector_ids)
+    except Exception:
+        logger.exception('Could not purge the vector index of user %s', user_id)
+
+def _clear_chat_history(job):
+    user_id = job.user_id
+    _delete_in_chunks(Chat, user_id, job,
+                      on_chunk=lambda ids: _purge_vectors(user_id, [chat_vector_id(chat_id) for chat_id in ids]))
+    clear_summary(user_id)
+    # One tombstone tells syncing clients the whole history is gone
+    record_deletion(user_id, CHAT)
+    chats_cleared(user_id)
+    db.session.commit()
+    response_cache.forget_user(user_id)
+
+def _delete_account(job):
+    user_id = job.user_id
+    _delete_in_chunks(Chat, user_id, job)
+    _delete_in_chunks(Journal, user_id, job)
+    _delete_in_chunks(EmbeddingJob, user_id)
+
+    db.session.execute(delete(ConversationSummary).where(ConversationSummary.user_id == user_id))
+    db.session.execute(delete(User).where(User.id == user_id))
+    db.session.commit()
+
+    _purge_vectors(user_id)
+    user_cache.invalidate(user_id)
+    response_cache.forget_user(user_id)
+
+def run_deletion(job_id):
+    """
+    Carry out a DeletionJob (inside an app context), recording progress and the outcome
+    """
+    job = db.session.get(DeletionJob, job_id)
+    if job is None or job.status == 'done':
+        return job
+
+    job.status = 'running'
+    db.session.commit()
+
+    try:
+        if job.kind == CHAT_HISTORY:
+            _clear_chat_history(job)
+        else:
+            _delete_account(job)
+    except Exception as e:
+        logger.exception('Deletion job %s failed', job_id)
+        db.session.rollback()
+        job = db.session.get(DeletionJob, job_id)
+        job.status = 'failed'
+        job.error = type(e).__name__
+        db.session.commit()
+        return job
+
+    job.status = 'done'
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+def _active_job(user_id, kind):
+    return DeletionJob.query.filter(
+        DeletionJob.user_id == user_id, DeletionJob.kind == kind, DeletionJob.status.in_(('pending', 'running'))
+    ).order_by(DeletionJob.id.desc()).first()
+
+def start_deletion(app, user_id, kind):
+    """
+    Start (or join) a delete of kind for user_id and return its DeletionJob. A delete
+    that fits in one chunk is finished before this returns.
+    """
+    job = _active_job(user_id, kind)
+    if job is not None and job.updated_at > datetime.utcnow() - timedelta(seconds=DELETION_STALE_SECONDS):
+        return job
+
+    if job is None:
+        job = DeletionJob(user_id=user_id, kind=kind, total=_total_rows(user_id, kind))
+        db.session.add(job)
+        db.session.commit()
+
+    if job.total <= DELETE_CHUNK_SIZE:
+        return run_deletion(job.id)
+
+    job_id = job.id
+
+    def run():
+        try:
+            with app.app_context():
+                run_deletion(job_id)
+        except Exception:
+            logger.exception('Deletion job %s failed', job_id)
+
+    threading.Thread(target=run, name=f'deletion-{job_id}', daemon=True).start()
+    return job
@@ -0,0 +1,290 @@
+"""
+Background embedding pipeline.
+
+Journal and chat writes enqueue EmbeddingJob rows in the same transaction as the write
+itself, so no update is lost if the process dies. A worker claims jobs in batches
+(with a lease, so several processes can share the queue), encodes every new or changed
+text in a single model.encode call and writes the vectors to the per-user index, which
+is saved to disk once per batch (under a per-user file lock, merged with any newer
+version another process wrote meanwhile).
+
+EMBEDDING_WORKER=thread (default) runs the worker on a daemon thread inside each serving
+process (started by app.start_background_workers, never on import); EMBEDDING_WORKER=off
+leaves it to a dedicated process started with:
+    python -m utils.embedding_worker
+
+Rows written before writes were queued (or after an index was lost) are queued with:
+    python -m utils.embedding_worker --backfill [--user N]
+"""
+import logging
+import os
+import socket
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import event, insert, literal, or_, select
+from sqlalchemy.orm import Session
+from models.user import db
+from models.chat import Chat
+from models.journal import Journal
+from models.embedding_job import EmbeddingJob
+from utils.vector_index import JOURNAL, CHAT, journal_vector_id, chat_vector_id, decode_vector_id
+
+logger = logging.getLogger(__name__)
+
+embedding_worker = None
+
+def enqueue_embedding(user_id, kind, item_id, action='upsert'):
+    """
+    Queue an index update in the current transaction; the worker wakes up after commit
+    """
+    db.session.add(EmbeddingJob(user_id=user_id, kind=kind, item_id=item_id, action=action))
+    db.session.info['embedding_jobs_pending'] = True
+
+def enqueue_embeddings(user_id, kind, item_ids, action='upsert'):
+    """
+    Queue index updates for many items with one multi-row insert
+    """
+    if not item_ids:
+        return
+    db.session.execute(EmbeddingJob.__table__.insert(), [
+        {'user_id': user_id, 'kind': kind, 'item_id': item_id, 'action': action,
+         'created_at': datetime.utcnow(), 'attempts': 0}
+        for item_id in item_ids
+    ])
+    db.session.info['embedding_jobs_pending'] = True
+
+def enqueue_backfill(connection, user_id=None):
+    """
+    Queue an upsert for every journal entry and chat turn (or one user's) with one
+    INSERT ... SELECT per table; returns the number of jobs queued
+    """
+    queued = 0
+    now = datetime.utcnow()
+    jobs = EmbeddingJob.__table__
+    for kind, table in ((JOURNAL, Journal.__table__), (CHAT, Chat.__table__)):
+        rows = select(table.c.user_id, literal(kind), table.c.id, literal('upsert'), literal(now), literal(0))
+        if user_id is not None:
+            rows = rows.where(table.c.user_id == user_id)
+        queued += connection.execute(insert(jobs).from_select(
+            ['user_id', 'kind', 'item_id', 'action', 'created_at', 'attempts'], rows
+        )).rowcount
+    return queued
+
+@event.listens_for(Session, 'after_commit')
+def _wake_worker_after_commit(session):
+    if session.info.pop('embedding_jobs_pending', False) and embedding_worker is not None:
+        embedding_worker.notify()
+
+class EmbeddingWorker:
+    def __init__(self, app, batch_size=None, poll_interval=None, lease_seconds=120, max_attempts=5):
+        self.app = app
+        self.batch_size = batch_size or int(os.getenv('EMBEDDING_BATCH_SIZE', '64'))
+        self.poll_interval = poll_interval or float(os.getenv('EMBEDDING_POLL_INTERVAL', '2'))
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{id(self)}'
+
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Instrumentation, exposed through stats()
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'queue_depth': 0,
+            'last_batch_size': 0,
+            'batches': 0,
+            'texts_embedded': 0,
+            'encode_seconds': 0.0,
+            'failed_batches': 0
+        }
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='embedding-worker', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def notify(self):
+        self._wake.set()
+
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['texts_per_second'] = stats['texts_embedded'] / stats['encode_seconds'] if stats['encode_seconds'] else 0.0
+        return stats
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                processed = self.run_once()
+            except Exception:
+                logger.exception('Embedding worker iteration failed')
+                processed = 0
+
+            # Keep draining while batches come back full; otherwise sleep until woken
+            if processed < self.batch_size:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def run_once(self):
+        """
+        Claim and process one batch; returns the number of jobs handled
+        """
+        from utils.embeddings import embedding_manager
+
+        with self.app.app_context():
+            jobs = self._claim()
+            if jobs:
+                try:
+                    # Each changed index is written to disk once, before its jobs are deleted
+                    with embedding_manager.indexes.batched():
+                        self._process(jobs)
+                    for job in jobs:
+                        db.session.delete(job)
+                    db.session.commit()
+                except Exception:
+                    logger.exception('Embedding batch of %d jobs failed', len(jobs))
+                    db.session.rollback()
+                    self._release(jobs)
+                    with self._stats_lock:
+                        self._stats['failed_batches'] += 1
+
+            queue_depth = EmbeddingJob.query.count()
+            db.session.commit()
+
+        with self._stats_lock:
+            self._stats['queue_depth'] = queue_depth
+            if jobs:
+                self._stats['last_batch_size'] = len(jobs)
+                self._stats['batches'] += 1
+        return len(jobs)
+
+    def _claim(self):
+        now = datetime.utcnow()
+        claimable = or_(EmbeddingJob.claimed_at.is_(None), EmbeddingJob.claimed_at < now - timedelta(seconds=self.lease_seconds))
+
+        candidate_ids = [row.id for row in db.session.query(EmbeddingJob.id).filter(
+            claimable, EmbeddingJob.attempts < self.max_attempts
+        ).order_by(EmbeddingJob.id).limit(self.batch_size)]
+        if not candidate_ids:
+            return []
+
+        # Only rows still unclaimed are taken, so concurrent workers never share a job
+        EmbeddingJob.query.filter(EmbeddingJob.id.in_(candidate_ids), claimable).update(
+            {'claimed_at': now, 'claimed_by': self.worker_id}, synchronize_session=False
+        )
+        db.session.commit()
+
+        return EmbeddingJob.query.filter(
+            EmbeddingJob.id.in_(candidate_ids), EmbeddingJob.claimed_by == self.worker_id
+        ).order_by(EmbeddingJob.id).all()
+
+    def _release(self, jobs):
+        EmbeddingJob.query.filter(EmbeddingJob.id.in_([job.id for job in jobs])).update(
+            {'claimed_at': None, 'claimed_by': None, 'attempts': EmbeddingJob.attempts + 1},
+            synchronize_session=False
+        )
+        db.session.commit()
+
+    def _process(self, jobs):
+        from utils.embeddings import embedding_manager, journal_text, chat_text
+        from utils.insights import sentiment_scorer, record_sentiments
+
+        # Later jobs for the same item supersede earlier ones
+        latest = {}
+        for job in jobs:
+            latest[(job.kind, job.item_id)] = job
+
+        upsert_ids = defaultdict(list)
+        for (kind, item_id), job in latest.items():
+            if job.action == 'upsert':
+                upsert_ids[kind].append(item_id)
+
+        rows = []
+        if upsert_ids[JOURNAL]:
+            rows += [(journal.user_id, journal_vector_id(journal.id), journal_text(journal), journal.created_at)
+                     for journal in Journal.query.filter(Journal.id.in_(upsert_ids[JOURNAL]))]
+        if upsert_ids[CHAT]:
+            rows += [(chat.user_id, chat_vector_id(chat.id), chat_text(chat), chat.timestamp)
+                     for chat in Chat.query.filter(Chat.id.in_(upsert_ids[CHAT]))]
+
+        # Deletions, plus upserts whose row has disappeared in the meantime
+        found = {vector_id for _, vector_id, _, _ in rows}
+        removals = defaultdict(list)
+        for (kind, item_id), job in latest.items():
+            vector_id = journal_vector_id(item_id) if kind == JOURNAL else chat_vector_id(item_id)
+            if vector_id not in found:
+                removals[job.user_id].append(vector_id)
+
+        if rows:
+            start = time.perf_counter()
+            vectors = embedding_manager.encode([text for _, _, text, _ in rows], batch_size=self.batch_size)
+            elapsed = time.perf_counter() - start
+
+            by_user = defaultdict(list)
+            for position, (user_id, vector_id, _, _) in enumerate(rows):
+                by_user[user_id].append((vector_id, position))
+            for user_id, items in by_user.items():
+                embedding_manager.indexes.upsert(
+                    user_id, [vector_id for vector_id, _ in items], vectors[[position for _, position in items]]
+                )
+
+            # Score the whole batch for the insights in one pass over the new vectors;
+            # committed with the job deletions
+            scores = sentiment_scorer.score(vectors)
+            record_sentiments([(*decode_vector_id(vector_id), user_id, timestamp, score)
+                               for (user_id, vector_id, _, timestamp), score in zip(rows, scores)])
+
+            with self._stats_lock:
+                self._stats['texts_embedded'] += len(rows)
+                self._stats['encode_seconds'] += elapsed
+            logger.info('Embedded %d texts in %.3fs (%d jobs)', len(rows), elapsed, len(jobs))
+
+        for user_id, vector_ids in removals.items():
+            embedding_manager.indexes.remove(user_id, vector_ids)
+
+def start_embedding_worker(app):
+    """
+    Start the in-process worker unless EMBEDDING_WORKER=off
+    """
+    global embedding_worker
+    if os.getenv('EMBEDDING_WORKER', 'thread') == 'off' or embedding_worker is not None:
+        return embedding_worker
+
+    embedding_worker = EmbeddingWorker(app).start()
+    return embedding_worker
+
+def stop_embedding_worker(timeout=None):
+    """
+    Stop the in-process worker, letting its current batch finish
+    """
+    global embedding_worker
+    if embedding_worker is not None:
+        embedding_worker.stop(timeout)
+        embedding_worker = None
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Run the embedding worker, or queue existing rows for it')
+    parser.add_argument('--backfill', action='store_true', help='queue every journal entry and chat turn, then exit')
+    parser.add_argument('--user', type=int, help='with --backfill, only this user')
+    args = parser.parse_args()
+
+    from app import app
+
+    if args.backfill:
+        with app.app_context(), db.engine.begin() as connection:
+            print(f'{enqueue_backfill(connection, args.user)} embedding jobs queued')
+    else:
+        logging.basicConfig(level=logging.INFO)
+        embedding_worker = EmbeddingWorker(app)
+        embedding_worker.run()
@@ -1,62 +1,90 @@
+import gc
 import os
+import threading
 import numpy as np
-from sentence_transformers import SentenceTransformer
-from langchain.embeddings import HuggingFaceEmbeddings
-from langchain.vectorstores import FAISS
-from langchain.docstore.document import Document
+from utils.vector_index import UserVectorIndexStore, index_path, decode_vector_id
 
-# Initialize embedding model
+# Embedding model shared by every consumer in the process
 model_name = "all-MiniLM-L6-v2"
-embedding_model = HuggingFaceEmbeddings(model_name=model_name)
+
+_model = None
+_model_lock = threading.Lock()
+
+def get_embedding_model():
+    """
+    Return the process-wide SentenceTransformer, loading it on first use.
+    The import is deferred as well, so importing this module stays cheap.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(model_name)
+    return _model
+
+def warm_up():
+    """
+    Load the model before serving. Call it in the master of a preforking server
+    (gunicorn --preload, or EMBEDDING_WARMUP=1) so workers share the weights
+    copy-on-write; gc.freeze() keeps the collector from touching, and so copying,
+    the pages holding everything loaded so far.
+    """
+    get_embedding_model()
+    gc.freeze()
+
+def journal_text(journal):
+    return f"{journal.title}\n{journal.content}"
+
+def chat_text(chat):
+    return f"{chat.message}\n{chat.response or ''}"
 
 class EmbeddingManager:
-    def __init__(self):
-        self.model = SentenceTransformer(model_name)
-        self.vector_store = None
-        
-    def create_embeddings(self, texts):
+    def __init__(self, index_dir=None):
+        self.index_dir = index_dir
+        self._indexes = None
+        self._indexes_lock = threading.Lock()
+
+    @property
+    def model(self):
+        return get_embedding_model()
+
+    @property
+    def indexes(self):
+        if self._indexes is None:
+            with self._indexes_lock:
+                if self._indexes is None:
+                    dimension = self.model.get_sentence_embedding_dimension()
+                    self._indexes = UserVectorIndexStore(dimension, index_dir=self.index_dir)
+        return self._indexes
+
+    def has_index(self, user_id):
         """
-        Create embeddings for a list of texts
+        Whether the user has an index on disk; unlike indexes, never loads the model
         """
-        if not texts:
-            return []
-        
-        # Convert texts to documents for FAISS
-        documents = [Document(page_content=text) for text in texts]
-        
-        # Create vector store
-        self.vector_store = FAISS.from_documents(documents, embedding_model)
-        
-        return self.vector_store
-    
-    def search_similar(self, query, k=5):
+        return os.path.exists(index_path(self.index_dir, user_id))
+
+    def encode(self, texts, batch_size=32):
         """
-        Search for similar texts based on a query
+        Encode texts into L2-normalized float32 vectors
         """
-        if not self.vector_store:
-            return []
-        
-        # Search for similar documents
-        docs = self.vector_store.similarity_search(query, k=k)
-        
-        return [doc.page_content for doc in docs]
-    
-    def update_vector_store(self, new_texts):
+        if not texts:
+            return np.zeros((0, self.indexes.dimension), dtype='float32')
+
+        return self.model.encode(
+            list(texts), batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True
+        ).astype('float32')
+
+    def search_similar(self, user_id, query, k=5):
         """
-        Update the vector store with new texts
+        Search a user's journals and chat turns for the texts closest to query.
+        Returns [(kind, id, score)] with kind 'journal' or 'chat', best first.
         """
-        if not new_texts:
-            return
-        
-        # Convert texts to documents
-        new_documents = [Document(page_content=text) for text in new_texts]
-        
-        if self.vector_store:
-            # Add documents to existing store
-            self.vector_store.add_documents(new_documents)
-        else:
-            # Create new store
-            self.vector_store = FAISS.from_documents(new_documents, embedding_model)
+        if not query:
+            return []
+
+        vector = self.encode([query])[0]
+        return [(*decode_vector_id(vector_id), score) for vector_id, score in self.indexes.search(user_id, vector, k)]
 
 # Create a singleton instance
-embedding_manager = EmbeddingManager()
\ No newline at end of file
+embedding_manager = EmbeddingManager()
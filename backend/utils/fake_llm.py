@@ -0,0 +1,55 @@
+import asyncio
+import os
+import time
+
+# Canned reply used when no explicit response is configured
+DEFAULT_RESPONSE = (
+    "I hear you, and it sounds like a lot to carry right now. "
+    "Do you want to tell me a bit more about what's been going on?"
+)
+
+class FakeLLM:
+    """
+    Local stand-in for the OpenAI LLM that produces tokens without network access.
+    Enable it with LLM_BACKEND=fake; latency is tunable through FAKE_LLM_FIRST_TOKEN_DELAY
+    and FAKE_LLM_TOKEN_DELAY (seconds).
+    """
+    def __init__(self, response=None, first_token_delay=None, token_delay=None):
+        self.response = response or os.getenv('FAKE_LLM_RESPONSE', DEFAULT_RESPONSE)
+        if first_token_delay is None:
+            first_token_delay = float(os.getenv('FAKE_LLM_FIRST_TOKEN_DELAY', '0.2'))
+        if token_delay is None:
+            token_delay = float(os.getenv('FAKE_LLM_TOKEN_DELAY', '0.02'))
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+
+    def _tokens(self):
+        """
+        Split the response into word-sized tokens, keeping the separating spaces
+        """
+        words = self.response.split(' ')
+        return [word if i == 0 else ' ' + word for i, word in enumerate(words)]
+
+    def stream(self, prompt):
+        """
+        Yield the response token by token, sleeping like a real upstream would
+        """
+        time.sleep(self.first_token_delay)
+        for i, token in enumerate(self._tokens()):
+            if i and self.token_delay:
+                time.sleep(self.token_delay)
+            yield token
+
+    def predict(self, prompt):
+        """
+        Return the full response once every token has been produced
+        """
+        return ''.join(self.stream(prompt))
+
+    async def apredict(self, prompt):
+        """
+        Async variant of predict that yields to the event loop while "generating"
+        """
+        tokens = self._tokens()
+        await asyncio.sleep(self.first_token_delay + self.token_delay * (len(tokens) - 1))
+        return ''.join(tokens)
@@ -0,0 +1,326 @@
+"""
+Wellness insights served from per-user daily rollups (models.daily_activity).
+
+The journal and chat write paths add their deltas to the day's rollup row in the same
+transaction as the write: entry and message counts, and word counts (for chats, the
+words the user wrote). Days are UTC; an entry belongs to the day it was created.
+
+Sentiment is scored by the embedding worker from the vectors it has just encoded: one
+matrix-vector product projects the whole batch onto a positive-minus-negative axis
+calibrated from anchor phrases, so each score costs a dot product rather than a model
+call. The score is stored on the row and added to the rollup; a row scored again (after
+an edit) replaces its old score. Chat vectors cover the message and the reply together.
+
+insights() reads at most INSIGHTS_MAX_DAYS rollup rows through the primary key, so its
+cost depends on the window, not on how long the user's history is.
+
+Rebuild the rollups from the source rows (and, with --rescore, re-score every row from
+the vectors already in the users' indexes) with:
+    python -m utils.insights [--rescore] [--user USER_ID]
+"""
+import os
+from collections import defaultdict
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import bindparam, case, delete, func, select, update
+from models.user import db
+from models.chat import Chat
+from models.journal import Journal
+from models.daily_activity import DailyActivity
+from utils.vector_index import JOURNAL, CHAT
+
+INSIGHTS_MAX_DAYS = int(os.getenv('INSIGHTS_MAX_DAYS', '365'))
+
+POSITIVE_ANCHORS = [
+    'I feel happy and grateful today.',
+    'Today was a really good day.',
+    'I feel calm, rested and hopeful.',
+    'I am proud of myself and excited about what is next.',
+    'I had a lovely time with people I care about.',
+]
+NEGATIVE_ANCHORS = [
+    'I feel sad and hopeless today.',
+    'Today was a really bad day.',
+    'I feel anxious, exhausted and overwhelmed.',
+    'I am disappointed in myself and dread what is next.',
+    'I feel lonely and nobody understands me.',
+]
+
+def word_count(text):
+    return len(text.split()) if text else 0
+
+def _day(timestamp):
+    return (timestamp or datetime.utcnow()).date()
+
+class SentimentScorer:
+    """
+    Scores L2-normalized text embeddings in [-1, 1] by their projection on the axis from
+    the mean negative anchor to the mean positive anchor; the anchor means land on -1 and 1
+    """
+    def __init__(self, encode):
+        self.encode = encode
+        self._calibration = None
+
+    def calibrate(self):
+        if self._calibration is None:
+            positive = np.asarray(self.encode(POSITIVE_ANCHORS), dtype='float32').mean(axis=0)
+            negative = np.asarray(self.encode(NEGATIVE_ANCHORS), dtype='float32').mean(axis=0)
+            axis = positive - negative
+            axis /= np.linalg.norm(axis)
+            center = float(positive @ axis + negative @ axis) / 2
+            half_range = float(positive @ axis - negative @ axis) / 2
+            self._calibration = (axis, center, half_range)
+        return self._calibration
+
+    def score(self, vectors):
+        """
+        Scores for a (n, dimension) batch of vectors, as one float32 array
+        """
+        axis, center, half_range = self.calibrate()
+        vectors = np.asarray(vectors, dtype='float32')
+        if not len(vectors):
+            return np.zeros(0, dtype='float32')
+        return np.clip((vectors @ axis - center) / half_range, -1.0, 1.0)
+
+def _encode(texts):
+    from utils.embeddings import embedding_manager
+    return embedding_manager.encode(texts)
+
+# Calibrated on first use with the shared embedding model
+sentiment_scorer = SentimentScorer(_encode)
+
+def _upsert(user_id, day, **deltas):
+    """
+    Add deltas to the user's rollup row for day, creating the row if needed
+    """
+    table = DailyActivity.__table__
+    if db.session.get_bind().dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    statement = insert(table).values(user_id=user_id, day=day, **deltas)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=[table.c.user_id, table.c.day],
+        set_={name: table.c[name] + statement.excluded[name] for name in deltas}
+    ))
+
+def journal_added(journal):
+    _upsert(journal.user_id, _day(journal.created_at), journal_entries=1, journal_words=word_count(journal.content))
+
+def journals_imported(user_id, rows):
+    """
+    Roll up a chunk of imported journal rows (dicts), one upsert per day
+    """
+    by_day = defaultdict(lambda: [0, 0])
+    for row in rows:
+        totals = by_day[_day(row['created_at'])]
+        totals[0] += 1
+        totals[1] += word_count(row['content'])
+    for day, (entries, words) in by_day.items():
+        _upsert(user_id, day, journal_entries=entries, journal_words=words)
+
+def journal_edited(journal, old_content):
+    words = word_count(journal.content) - word_count(old_content)
+    if words:
+        _upsert(journal.user_id, _day(journal.created_at), journal_words=words)
+
+def journal_removed(journal):
+    """
+    Take a journal entry out of its day's rollup. Call before the entry is deleted: its
+    stored sentiment is read in the same statement, so a score written concurrently by
+    the embedding worker is not left behind.
+    """
+    sentiment = select(Journal.sentiment).where(Journal.id == journal.id).scalar_subquery()
+    db.session.execute(update(DailyActivity).where(
+        DailyActivity.user_id == journal.user_id, DailyActivity.day == _day(journal.created_at)
+    ).values(
+        journal_entries=DailyActivity.journal_entries - 1,
+        journal_words=DailyActivity.journal_words - word_count(journal.content),
+        journal_sentiment_sum=DailyActivity.journal_sentiment_sum - func.coalesce(sentiment, 0.0),
+        journal_sentiment_count=DailyActivity.journal_sentiment_count - case((sentiment.is_(None), 0), else_=1)
+    ))
+
+def chat_added(chat):
+    _upsert(chat.user_id, _day(chat.timestamp), chat_messages=1, chat_words=word_count(chat.message))
+
+def chats_cleared(user_id):
+    """
+    Zero the chat side of every rollup row of the user, dropping rows left empty
+    """
+    db.session.execute(update(DailyActivity).where(DailyActivity.user_id == user_id).values(
+        chat_messages=0, chat_words=0, chat_sentiment_sum=0.0, chat_sentiment_count=0
+    ))
+    db.session.execute(delete(DailyActivity).where(
+        DailyActivity.user_id == user_id, DailyActivity.journal_entries == 0
+    ))
+
+def record_sentiments(items):
+    """
+    Store scores for freshly embedded rows and move the rollups by the difference from
+    any previous score. items is [(kind, item_id, user_id, timestamp, score)]. Rows that
+    no longer exist are skipped.
+    """
+    for kind, item_id, user_id, timestamp, score in items:
+        model = Journal if kind == JOURNAL else Chat
+        prefix = 'journal' if kind == JOURNAL else 'chat'
+        sum_column = getattr(DailyActivity, f'{prefix}_sentiment_sum')
+        count_column = getattr(DailyActivity, f'{prefix}_sentiment_count')
+        previous = select(model.sentiment).where(model.id == item_id).scalar_subquery()
+        score = float(score)
+
+        # The rollup is moved first, reading the previous score in the same statement
+        db.session.execute(update(DailyActivity).where(
+            DailyActivity.user_id == user_id, DailyActivity.day == _day(timestamp),
+            select(model.id).where(model.id == item_id).exists()
+        ).values({
+            sum_column: sum_column + score - func.coalesce(previous, 0.0),
+            count_column: count_column + case((previous.is_(None), 1), else_=0)
+        }))
+
+        values = {'sentiment': score}
+        if model is Journal:
+            # A new score is not an edit, so updated_at (and delta sync) is left alone
+            values['updated_at'] = Journal.updated_at
+        db.session.execute(update(model).where(model.id == item_id).values(values))
+
+def _mean(total, count):
+    return round(total / count, 3) if count else None
+
+def _summarize(rows):
+    return {
+        'journal_entries': sum(row.journal_entries for row in rows),
+        'journal_words': sum(row.journal_words for row in rows),
+        'chat_messages': sum(row.chat_messages for row in rows),
+        'chat_words': sum(row.chat_words for row in rows),
+        'journal_sentiment': _mean(sum(row.journal_sentiment_sum for row in rows),
+                                   sum(row.journal_sentiment_count for row in rows)),
+        'chat_sentiment': _mean(sum(row.chat_sentiment_sum for row in rows),
+                                sum(row.chat_sentiment_count for row in rows))
+    }
+
+def _streaks(active_days, start, today):
+    """
+    The current streak (ending today, or yesterday if nothing happened yet today) and
+    the longest one, counting only days from start
+    """
+    longest = run = 0
+    previous = None
+    for day in sorted(active_days):
+        run = run + 1 if previous == day - timedelta(days=1) else 1
+        longest = max(longest, run)
+        previous = day
+
+    current = 0
+    day = today if today in active_days else today - timedelta(days=1)
+    while day in active_days and day >= start:
+        current += 1
+        day -= timedelta(days=1)
+    return current, longest
+
+def insights(user_id, days=30, today=None):
+    """
+    Daily and weekly activity and sentiment for the last days days (up to today, UTC)
+    """
+    days = max(1, min(days, INSIGHTS_MAX_DAYS))
+    today = today or datetime.utcnow().date()
+    start = today - timedelta(days=days - 1)
+
+    rows = [row for row in DailyActivity.query.filter(
+        DailyActivity.user_id == user_id, DailyActivity.day >= start, DailyActivity.day <= today
+    ).order_by(DailyActivity.day) if row.active]
+
+    weeks = defaultdict(list)
+    for row in rows:
+        weeks[row.day - timedelta(days=row.day.weekday())].append(row)
+
+    current_streak, longest_streak = _streaks({row.day for row in rows}, start, today)
+
+    return {
+        'start': start.isoformat(),
+        'end': today.isoformat(),
+        'days': days,
+        'totals': {**_summarize(rows), 'active_days': len(rows)},
+        'streaks': {'current': current_streak, 'longest': longest_streak},
+        'daily': [{'date': row.day.isoformat(), **_summarize([row])} for row in rows],
+        'weekly': [{'week_start': week.isoformat(), **_summarize(week_rows), 'active_days': len(week_rows)}
+                   for week, week_rows in sorted(weeks.items())]
+    }
+
+def rebuild_rollups(connection, user_id=None):
+    """
+    Recompute the rollup rows (of one user, or everyone) from the journal and chat rows
+    and their stored scores, streaming the rows in batches
+    """
+    rollups = defaultdict(lambda: defaultdict(int))
+    sources = [
+        (select(Journal.user_id, Journal.created_at, Journal.content, Journal.sentiment), Journal, 'journal', 'journal_entries'),
+        (select(Chat.user_id, Chat.timestamp, Chat.message, Chat.sentiment), Chat, 'chat', 'chat_messages'),
+    ]
+    for statement, model, prefix, count_name in sources:
+        if user_id is not None:
+            statement = statement.where(model.user_id == user_id)
+        for row_user_id, timestamp, text, sentiment in connection.execution_options(yield_per=1000).execute(statement):
+            totals = rollups[(row_user_id, _day(timestamp))]
+            totals[count_name] += 1
+            totals[f'{prefix}_words'] += word_count(text)
+            if sentiment is not None:
+                totals[f'{prefix}_sentiment_sum'] += sentiment
+                totals[f'{prefix}_sentiment_count'] += 1
+
+    table = DailyActivity.__table__
+    connection.execute(delete(table) if user_id is None else delete(table).where(table.c.user_id == user_id))
+    rows = [{'user_id': row_user_id, 'day': day, **totals}
+            for (row_user_id, day), totals in rollups.items()]
+    for start in range(0, len(rows), 1000):
+        connection.execute(table.insert(), [
+            {column.name: row.get(column.name, 0) for column in table.columns} for row in rows[start:start + 1000]
+        ])
+    return len(rows)
+
+def rescore_user(connection, user_id):
+    """
+    Score every vector in the user's semantic index in one batch and store the scores
+    """
+    from utils.embeddings import embedding_manager
+    from utils.vector_index import decode_vector_id
+
+    if not embedding_manager.has_index(user_id):
+        return 0
+    vector_ids, vectors = embedding_manager.indexes.vectors(user_id)
+    scores = sentiment_scorer.score(vectors)
+
+    updates = defaultdict(list)
+    for vector_id, score in zip(vector_ids, scores):
+        kind, item_id = decode_vector_id(vector_id)
+        updates[kind].append({'item_id': item_id, 'score': float(score)})
+    for kind, model in ((JOURNAL, Journal), (CHAT, Chat)):
+        if updates[kind]:
+            values = {'sentiment': bindparam('score')}
+            if model is Journal:
+                values['updated_at'] = Journal.updated_at
+            connection.execute(update(model.__table__).where(
+                model.__table__.c.id == bindparam('item_id'), model.__table__.c.user_id == user_id
+            ).values(values), updates[kind])
+    return len(scores)
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Rebuild the insights rollups')
+    parser.add_argument('--rescore', action='store_true', help='re-score sentiment from the vector indexes first')
+    parser.add_argument('--user', type=int, help='only this user')
+    args = parser.parse_args()
+
+    os.environ['EMBEDDING_WORKER'] = 'off'
+    from app import app
+    from models.user import User
+
+    with app.app_context():
+        if args.rescore:
+            user_ids = [args.user] if args.user else db.session.scalars(select(User.id)).all()
+            for rescore_id in user_ids:
+                with db.engine.begin() as connection:
+                    print(f'user {rescore_id}: {rescore_user(connection, rescore_id)} rows scored')
+        with db.engine.begin() as connection:
+            print(f'{rebuild_rollups(connection, args.user)} rollup rows written')
@@ -0,0 +1,67 @@
+import os
+import threading
+from utils.fake_llm import FakeLLM
+from utils.llm_client import ResilientLLM
+
+# Initialize OpenAI API
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+LLM_POOL_SIZE = int(os.getenv('LLM_POOL_SIZE', '10'))
+
+_llm = None
+_llm_lock = threading.Lock()
+
+def _configure_http_session():
+    """
+    Share one pooled HTTP session across all threads so upstream connections
+    are kept alive between requests instead of being reopened per thread
+    """
+    import openai
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=LLM_POOL_SIZE, pool_maxsize=LLM_POOL_SIZE, max_retries=2)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    openai.requestssession = session
+
+def _create_llm():
+    if os.getenv('LLM_BACKEND') == 'fake':
+        llm = FakeLLM()
+    else:
+        from langchain.llms import OpenAI
+
+        _configure_http_session()
+        # Retries and deadlines are handled by ResilientLLM; the HTTP timeout only ends
+        # attempts it has already given up on
+        llm = OpenAI(temperature=0.7, openai_api_key=OPENAI_API_KEY, max_retries=1,
+                     request_timeout=float(os.getenv('LLM_ATTEMPT_TIMEOUT', '12')))
+
+    # Deadlines, retries, hedging and the circuit breaker (utils/llm_client.py)
+    if os.getenv('LLM_RESILIENCE', 'on') == 'off':
+        return llm
+    return ResilientLLM(llm)
+
+def get_llm():
+    """
+    Return the process-wide LLM client, creating it on first use
+    """
+    global _llm
+    if _llm is None:
+        with _llm_lock:
+            if _llm is None:
+                _llm = _create_llm()
+    return _llm
+
+def llm_stats():
+    """
+    Counters of the resilient client, once one has been created
+    """
+    return _llm.stats() if isinstance(_llm, ResilientLLM) else {}
+
+def reset_llm():
+    """
+    Drop the cached LLM client so the next call rebuilds it (used after config changes)
+    """
+    global _llm
+    with _llm_lock:
+        _llm = None
@@ -0,0 +1,383 @@
+"""
+Resilient wrapper around the upstream LLM client (see utils.llm.get_llm).
+
+Every call has a deadline (LLM_TIMEOUT, default 30 s) and every attempt its own
+(LLM_ATTEMPT_TIMEOUT, default 12 s). A failed or timed-out attempt is retried up to
+LLM_RETRIES times (default 2) after a full-jitter exponential backoff, while the
+deadline allows and unless the error is one a retry cannot fix (a bad request, bad
+credentials). With LLM_HEDGE=on, a predict attempt still running after the p95
+latency of recent successful attempts gets a second, hedged request and the first
+answer wins; at most LLM_HEDGE_MAX_INFLIGHT hedges run at once.
+
+A circuit breaker opens after LLM_BREAKER_FAILURES (default 5) failed calls in a row
+and rejects calls straight away for LLM_BREAKER_COOLDOWN seconds (default 30). After
+that one probe call is let through, and its outcome closes or re-opens the breaker.
+Calls that are rejected, time out or fail raise LLMUnavailable, which the chat routes
+answer with a degraded reply instead of an error. Only transport errors, timeouts and
+5xx answers count toward the breaker; errors caused by the request itself (a bad or
+oversized prompt, bad credentials) are raised to the caller unchanged, so one user's
+bad requests cannot open the breaker for everyone. Those and other 4xx answers (a rate
+limit) neither open nor close it: a half-open probe that ends with one is handed back
+for the next call.
+
+Attempts run on a dedicated thread pool, so a stalled upstream cannot hold a request
+past its deadline; an abandoned attempt ends at the HTTP client's own timeout.
+"""
+import asyncio
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+logger = logging.getLogger(__name__)
+
+# Errors a second attempt cannot fix (checked by class name, so openai stays optional)
+NON_RETRYABLE_ERRORS = {'AuthenticationError', 'InvalidRequestError', 'PermissionError', 'BadRequestError'}
+
+# Successful attempts needed before hedging, and how many are remembered
+HEDGE_MIN_SAMPLES = 20
+LATENCY_SAMPLES = 200
+
+_END = object()
+
+class LLMUnavailable(Exception):
+    """
+    The upstream LLM gave no answer in time. The message is for logs, not for users.
+    """
+
+class AttemptTimeout(TimeoutError):
+    pass
+
+def _retryable(error):
+    return type(error).__name__ not in NON_RETRYABLE_ERRORS
+
+def _upstream_failure(error):
+    """
+    Whether error says the upstream is unhealthy: no HTTP status (a transport error or
+    a timeout) or a 5xx one, but not a 4xx such as a rate limit
+    """
+    status = getattr(error, 'http_status', None) or getattr(error, 'status_code', None)
+    return not isinstance(status, int) or status >= 500
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, cooldown=30.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.failures = 0
+        self.trips = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Whether a call may go upstream now; while half open, only one probe at a time
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def release(self):
+        """
+        End a call that says nothing about the upstream's health, leaving the state as is
+        """
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self.trips += 1
+
+class ResilientLLM:
+    """
+    Same predict/stream/apredict interface as the wrapped client
+    """
+    def __init__(self, llm, timeout=None, attempt_timeout=None, retries=None, backoff=0.2, max_backoff=2.0,
+                 hedge=None, hedge_max_inflight=None, breaker=None, threads=None):
+        self.llm = llm
+        self.timeout = timeout or float(os.getenv('LLM_TIMEOUT', '30'))
+        self.attempt_timeout = attempt_timeout or float(os.getenv('LLM_ATTEMPT_TIMEOUT', '12'))
+        self.retries = retries if retries is not None else int(os.getenv('LLM_RETRIES', '2'))
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge = hedge if hedge is not None else os.getenv('LLM_HEDGE', 'off') == 'on'
+        self.hedge_max_inflight = hedge_max_inflight or int(os.getenv('LLM_HEDGE_MAX_INFLIGHT', '4'))
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=int(os.getenv('LLM_BREAKER_FAILURES', '5')),
+            cooldown=float(os.getenv('LLM_BREAKER_COOLDOWN', '30'))
+        )
+        self._executor = ThreadPoolExecutor(max_workers=threads or int(os.getenv('LLM_CLIENT_THREADS', '32')),
+                                            thread_name_prefix='llm')
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._hedges_inflight = 0
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'failures': 0, 'client_errors': 0, 'retries': 0, 'timeouts': 0,
+                       'hedges': 0, 'hedge_wins': 0, 'short_circuited': 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['breaker_state'] = self.breaker.state
+        stats['breaker_open'] = int(self.breaker.state != CircuitBreaker.CLOSED)
+        stats['breaker_trips'] = self.breaker.trips
+        stats['hedge_delay_seconds'] = self._hedge_delay() or 0.0
+        return stats
+
+    def _hedge_delay(self):
+        latencies = sorted(self._latencies)
+        if len(latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        return latencies[int(len(latencies) * 0.95) - 1]
+
+    def _take_hedge(self):
+        with self._lock:
+            if self._hedges_inflight >= self.hedge_max_inflight:
+                return False
+            self._hedges_inflight += 1
+            self._stats['hedges'] += 1
+            return True
+
+    def _release_hedge(self, future=None):
+        with self._lock:
+            self._hedges_inflight -= 1
+
+    def _pause(self, attempt, deadline):
+        """
+        Full-jitter backoff before retry number attempt + 1, or None if the deadline is too close
+        """
+        pause = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if time.monotonic() + pause >= deadline:
+            return None
+        self._count('retries')
+        return pause
+
+    def _admit(self):
+        if not self.breaker.allow():
+            self._count('short_circuited')
+            raise LLMUnavailable('circuit breaker open')
+        self._count('calls')
+
+    def _give_up(self, error):
+        """
+        Raise for a call that failed with error (None: it ran out of time)
+        """
+        if error is not None and not _retryable(error):
+            # The upstream answered; the request was at fault, so the caller hears about it
+            self._count('client_errors')
+            self.breaker.release()
+            raise error
+
+        self._count('failures')
+        if error is None or _upstream_failure(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.release()
+        if isinstance(error, (AttemptTimeout, asyncio.TimeoutError)):
+            self._count('timeouts')
+        logger.warning('LLM call failed: %s', type(error).__name__ if error else 'deadline exceeded')
+        raise LLMUnavailable(f'LLM call failed: {type(error).__name__ if error else "deadline exceeded"}') from error
+
+    def _retry(self, attempt_once):
+        """
+        Run attempt_once(timeout) with retries until it succeeds or the call's deadline passes
+        """
+        self._admit()
+        deadline = time.monotonic() + self.timeout
+        error = None
+        for attempt in range(self.retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                result = attempt_once(min(self.attempt_timeout, remaining))
+            except Exception as e:
+                error = e
+                if not _retryable(e) or attempt == self.retries:
+                    break
+                pause = self._pause(attempt, deadline)
+                if pause is None:
+                    break
+                time.sleep(pause)
+                continue
+            self.breaker.record_success()
+            return result
+        self._give_up(error)
+
+    def _timed(self, function):
+        start = time.monotonic()
+        result = function()
+        self._latencies.append(time.monotonic() - start)
+        return result
+
+    def _attempt(self, function, timeout):
+        """
+        One attempt, hedged with a second request if it runs past the recent p95
+        """
+        start = time.monotonic()
+        futures = {self._executor.submit(self._timed, function): False}
+
+        hedge_delay = self._hedge_delay() if self.hedge else None
+        if hedge_delay is not None and hedge_delay < timeout:
+            done, _ = wait(futures, timeout=hedge_delay)
+            if not done and self._take_hedge():
+                hedged = self._executor.submit(self._timed, function)
+                hedged.add_done_callback(self._release_hedge)
+                futures[hedged] = True
+
+        error = None
+        while futures:
+            done, _ = wait(futures, timeout=max(0, timeout - (time.monotonic() - start)), return_when=FIRST_COMPLETED)
+            if not done:
+                raise AttemptTimeout(f'no answer within {timeout:.1f}s')
+            for future in done:
+                is_hedge = futures.pop(future)
+                if future.exception() is None:
+                    if is_hedge:
+                        self._count('hedge_wins')
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def predict(self, prompt):
+        return self._retry(lambda timeout: self._attempt(lambda: self.llm.predict(prompt), timeout))
+
+    def _pump(self, prompt, tokens, cancelled):
+        # Runs on the pool: forward upstream tokens until the stream ends or the caller gives up
+        try:
+            for token in self.llm.stream(prompt):
+                if cancelled.is_set():
+                    return
+                tokens.put(token)
+            tokens.put(_END)
+        except Exception as e:
+            tokens.put(e)
+
+    def _next_token(self, tokens, timeout):
+        try:
+            item = tokens.get(timeout=timeout)
+        except queue.Empty:
+            raise AttemptTimeout(f'no token within {timeout:.1f}s')
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def stream(self, prompt):
+        """
+        Yield the upstream's tokens. Attempts that fail before the first token are retried
+        like predict(); after that, an error or a gap longer than the attempt timeout
+        raises LLMUnavailable.
+        """
+        def first_token(timeout):
+            tokens, cancelled = queue.Queue(), threading.Event()
+            self._executor.submit(self._pump, prompt, tokens, cancelled)
+            try:
+                return self._next_token(tokens, timeout), tokens, cancelled
+            except Exception:
+                cancelled.set()
+                raise
+
+        token, tokens, cancelled = self._retry(first_token)
+        try:
+            while token is not _END:
+                yield token
+                try:
+                    token = self._next_token(tokens, self.attempt_timeout)
+                except Exception as e:
+                    self._give_up(e)
+        finally:
+            cancelled.set()
+
+    async def _atimed(self, prompt):
+        start = time.monotonic()
+        result = await self.llm.apredict(prompt)
+        self._latencies.append(time.monotonic() - start)
+        return result
+
+    async def _aattempt(self, prompt, timeout):
+        start = time.monotonic()
+        tasks = {asyncio.ensure_future(self._atimed(prompt)): False}
+        try:
+            hedge_delay = self._hedge_delay() if self.hedge else None
+            if hedge_delay is not None and hedge_delay < timeout:
+                done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+                if not done and self._take_hedge():
+                    hedged = asyncio.ensure_future(self._atimed(prompt))
+                    hedged.add_done_callback(self._release_hedge)
+                    tasks[hedged] = True
+
+            error = None
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=max(0, timeout - (time.monotonic() - start)),
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise AttemptTimeout(f'no answer within {timeout:.1f}s')
+                for task in done:
+                    is_hedge = tasks.pop(task)
+                    if task.exception() is None:
+                        if is_hedge:
+                            self._count('hedge_wins')
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def apredict(self, prompt):
+        """
+        Async predict with the same deadline, retries, hedging and breaker
+        """
+        self._admit()
+        deadline = time.monotonic() + self.timeout
+        error = None
+        for attempt in range(self.retries + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                result = await self._aattempt(prompt, min(self.attempt_timeout, remaining))
+            except Exception as e:
+                error = e
+                if not _retryable(e) or attempt == self.retries:
+                    break
+                pause = self._pause(attempt, deadline)
+                if pause is None:
+                    break
+                await asyncio.sleep(pause)
+                continue
+            self.breaker.record_success()
+            return result
+        self._give_up(error)
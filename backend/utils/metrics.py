@@ -0,0 +1,207 @@
+"""
+Request latency instrumentation.
+
+Every request records how long it spent in each phase - auth (token decode), user_lookup,
+db (all SQL statements, via SQLAlchemy cursor events), llm and serialization (JSON
+encoding) - into histograms served in Prometheus text format at /metrics. Phases can
+overlap (a user lookup includes its DB query). Metrics are kept per process.
+
+Statements slower than SLOW_QUERY_MS (default 200) are logged.
+
+With PROFILING_ENABLED=1, a request sent with the header "X-Profile: <PROFILE_TOKEN>"
+is profiled (cProfile, or pyinstrument when installed and PROFILER=pyinstrument) and the
+report is written to PROFILE_DIR; its path comes back in the X-Profile-File header.
+PROFILE_TOKEN has no default: profiling writes files to disk, so the app refuses to start
+with PROFILING_ENABLED=1 unless it is set to a secret.
+"""
+import bisect
+import cProfile
+import hmac
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '200'))
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED') == '1'
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'profiles'))
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = [(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in pairs]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, [("le", "+Inf")])} {values[-2]}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {values[-2]}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {values[-1]}')
+        return '\n'.join(lines)
+
+request_seconds = Histogram(
+    'friendbot_request_duration_seconds', 'Request latency', ('method', 'endpoint', 'status')
+)
+phase_seconds = Histogram(
+    'friendbot_request_phase_duration_seconds', 'Time spent per request in each phase', ('endpoint', 'phase')
+)
+query_seconds = Histogram(
+    'friendbot_db_query_duration_seconds', 'SQL statement latency', (), buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+HISTOGRAMS = [request_seconds, phase_seconds, query_seconds]
+
+# name -> (documentation, callable returning {metric suffix: value}); rendered as gauges
+_collectors = {}
+
+def register_collector(name, documentation, collect):
+    _collectors[name] = (documentation, collect)
+
+def add_phase_time(phase, seconds):
+    """
+    Add time to a phase of the current request (no-op outside a request)
+    """
+    if has_request_context() and 'phases' in g:
+        g.phases[phase] += seconds
+
+@contextmanager
+def timed(phase):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_phase_time(phase, time.perf_counter() - start)
+
+def render_metrics():
+    parts = [histogram.render() for histogram in HISTOGRAMS]
+    for name, (documentation, collect) in sorted(_collectors.items()):
+        try:
+            values = collect()
+        except Exception:
+            logger.exception('Metrics collector %s failed', name)
+            continue
+        for key, value in sorted(values.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            metric = f'friendbot_{name}_{key}'
+            parts.append(f'# HELP {metric} {documentation}\n# TYPE {metric} gauge\n{metric} {value}')
+    return '\n'.join(parts) + '\n'
+
+# SQL timing for every engine; attributed to the current request when there is one
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    connection.info.setdefault('query_start', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - connection.info['query_start'].pop()
+    query_seconds.observe(elapsed)
+    add_phase_time('db', elapsed)
+    if has_request_context() and 'phases' in g:
+        g.query_count += 1
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        logger.warning('Slow query (%.1f ms): %s', elapsed * 1000, ' '.join(statement.split())[:500])
+
+def _start_profiler():
+    if os.getenv('PROFILER') == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+        except ImportError:
+            pass
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+def _stop_profiler(profiler, path):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        profiler.dump_stats(path + '.prof')
+        return path + '.prof'
+    profiler.stop()
+    with open(path + '.html', 'w') as report:
+        report.write(profiler.output_html())
+    return path + '.html'
+
+def init_metrics(app):
+    """
+    Install the timing hooks on app
+    """
+    if PROFILING_ENABLED and not PROFILE_TOKEN:
+        raise RuntimeError('PROFILING_ENABLED=1 needs PROFILE_TOKEN set to a secret')
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        g.phases = defaultdict(float)
+        g.query_count = 0
+
+        if PROFILING_ENABLED and hmac.compare_digest(request.headers.get('X-Profile', '').encode(), PROFILE_TOKEN.encode()):
+            g.profiler = _start_profiler()
+
+    @app.after_request
+    def record_request_timing(response):
+        if 'phases' not in g:
+            return response
+
+        # Streaming bodies are produced after this hook, so record once the response is closed
+        start, phases, profiler = g.request_start, g.phases, g.pop('profiler', None)
+        endpoint, method, status = request.endpoint or 'unknown', request.method, response.status_code
+
+        profile_path = None
+        if profiler is not None:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            profile_path = os.path.join(PROFILE_DIR, f'{endpoint}-{int(time.time() * 1000)}')
+            response.headers['X-Profile-File'] = profile_path + ('.prof' if isinstance(profiler, cProfile.Profile) else '.html')
+
+        def finish():
+            request_seconds.observe(time.perf_counter() - start, method=method, endpoint=endpoint, status=status)
+            for phase, seconds in phases.items():
+                phase_seconds.observe(seconds, endpoint=endpoint, phase=phase)
+            if profiler is not None:
+                _stop_profiler(profiler, profile_path)
+
+        response.call_on_close(finish)
+        return response
@@ -0,0 +1,55 @@
+"""
+Newline-delimited JSON helpers for bulk import and export.
+"""
+import io
+import json
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+def read_ndjson(stream, max_line_bytes=1024 * 1024):
+    """
+    Parse a byte stream one line at a time, yielding (line_number, object, error).
+    Blank lines are skipped; a line that is not a JSON object yields an error instead.
+    """
+    # Request streams are unbuffered, and readline() on them reads a byte at a time
+    if not isinstance(stream, io.BufferedIOBase):
+        stream = io.BufferedReader(stream, 64 * 1024)
+
+    line_number = 0
+    while True:
+        line = stream.readline(max_line_bytes + 1)
+        if not line:
+            return
+        line_number += 1
+
+        if len(line) > max_line_bytes:
+            # Skip the rest of an oversized line
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(max_line_bytes)
+            yield line_number, None, 'line too long'
+            continue
+
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError:
+            yield line_number, None, 'invalid JSON'
+            continue
+        if not isinstance(item, dict):
+            yield line_number, None, 'expected a JSON object'
+            continue
+        yield line_number, item, None
+
+def stream_ndjson(session, statement, serialize, batch_size=1000):
+    """
+    Yield one NDJSON line per row of statement, fetching rows from a server-side cursor
+    batch_size at a time so the full result is never held in memory
+    """
+    result = session.execute(statement.execution_options(stream_results=True, yield_per=batch_size))
+    try:
+        for partition in result.partitions():
+            yield ''.join(json.dumps(serialize(row)) + '\n' for row in partition)
+    finally:
+        result.close()
@@ -0,0 +1,83 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime
+from flask import request
+from sqlalchemy import and_, or_
+
+# Upper bound on rows per page so a client cannot ask for every row at once
+MAX_PER_PAGE = 100
+
+Page = namedtuple('Page', ['items', 'meta'])
+
+class InvalidCursor(ValueError):
+    pass
+
+def get_per_page(default):
+    per_page = request.args.get('per_page', default, type=int)
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+def encode_cursor(timestamp, row_id):
+    """
+    Encode a (timestamp, id) position as an opaque URL-safe token
+    """
+    raw = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a token produced by encode_cursor, raising InvalidCursor if it is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+def paginate(query, time_column, id_column, default_per_page):
+    """
+    Paginate query newest first, in one of two modes:
+    - cursor mode (a ?cursor= parameter is present, empty for the first page): keyset
+      pagination on (time_column, id_column) with no OFFSET; the total count is only
+      computed when include_total=true
+    - page mode (?page=N, the default): the original page numbers, with the total count
+      unless include_total=false
+    """
+    per_page = get_per_page(default_per_page)
+    ordered = query.order_by(time_column.desc(), id_column.desc())
+
+    if 'cursor' in request.args:
+        include_total = request.args.get('include_total', 'false').lower() == 'true'
+        cursor = request.args.get('cursor')
+
+        keyset = ordered
+        if cursor:
+            timestamp, row_id = decode_cursor(cursor)
+            keyset = ordered.filter(or_(
+                time_column < timestamp,
+                and_(time_column == timestamp, id_column < row_id)
+            ))
+
+        # Fetch one extra row to learn whether another page exists
+        rows = keyset.limit(per_page + 1).all()
+        items = rows[:per_page]
+        has_more = len(rows) > per_page
+
+        meta = {
+            'next_cursor': encode_cursor(getattr(items[-1], time_column.key), getattr(items[-1], id_column.key)) if has_more else None,
+            'has_more': has_more
+        }
+        if include_total:
+            meta['total'] = query.order_by(None).count()
+        return Page(items, meta)
+
+    include_total = request.args.get('include_total', 'true').lower() != 'false'
+    page = request.args.get('page', 1, type=int)
+    result = ordered.paginate(page=page, per_page=per_page, count=include_total)
+
+    return Page(result.items, {
+        'total': result.total,
+        'pages': result.pages,
+        'current_page': result.page
+    })
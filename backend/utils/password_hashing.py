@@ -0,0 +1,105 @@
+"""
+PBKDF2 password hashing off the request threads.
+
+Hashing and verification run on a small dedicated process pool, so a burst of logins
+cannot take every CPU (and worker thread) away from the chat endpoints. At most
+PASSWORD_HASH_MAX_QUEUE operations may be pending; beyond that, or when one waits longer
+than PASSWORD_HASH_TIMEOUT, PasswordHashingBusy is raised and the request gets a 503.
+
+PASSWORD_HASH_ROUNDS sets the PBKDF2 iteration count for new hashes. Hashes made with
+other parameters still verify, and are replaced on the next successful login.
+PASSWORD_HASH_WORKERS=0 hashes inline in the calling thread.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from passlib.hash import pbkdf2_sha256
+
+class PasswordHashingBusy(Exception):
+    """
+    Raised when the hashing pool cannot take or finish more work in time
+    """
+    def __init__(self, message='Too many sign-in attempts right now, please try again shortly.', retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+# The functions below run in the pool's worker processes
+
+def _hash(password, rounds):
+    return pbkdf2_sha256.using(rounds=rounds).hash(password)
+
+def _verify(password, password_hash, rounds):
+    """
+    Returns (matches, new_hash); new_hash is set when the stored hash should be replaced
+    """
+    if not pbkdf2_sha256.verify(password, password_hash):
+        return False, None
+
+    hasher = pbkdf2_sha256.using(rounds=rounds)
+    if hasher.needs_update(password_hash):
+        return True, hasher.hash(password)
+    return True, None
+
+class PasswordHasher:
+    def __init__(self, rounds=None, workers=None, max_queue=None, timeout=None):
+        self.rounds = rounds or int(os.getenv('PASSWORD_HASH_ROUNDS', str(pbkdf2_sha256.default_rounds)))
+        self.workers = workers if workers is not None else int(
+            os.getenv('PASSWORD_HASH_WORKERS', str(max(1, (os.cpu_count() or 2) // 2)))
+        )
+        self.max_queue = max_queue or int(os.getenv('PASSWORD_HASH_MAX_QUEUE', '32'))
+        self.timeout = timeout or float(os.getenv('PASSWORD_HASH_TIMEOUT', '10'))
+
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _get_pool(self):
+        # Created on first use, so each server worker process (after a preforking
+        # master has forked) owns its pool. Its processes come from a forkserver (or are
+        # spawned), never forked from this multithreaded process, where a lock held by
+        # another thread at fork time would stay locked in the child forever
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                    self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method))
+        return self._pool
+
+    def _run(self, function, *args):
+        if self.workers == 0:
+            return function(*args)
+
+        with self._lock:
+            if self.pending >= self.max_queue:
+                raise PasswordHashingBusy()
+            self.pending += 1
+        try:
+            future = self._get_pool().submit(function, *args)
+            try:
+                return future.result(timeout=self.timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                raise PasswordHashingBusy()
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+    def hash(self, password):
+        return self._run(_hash, password, self.rounds)
+
+    def verify(self, password, password_hash):
+        """
+        Check a password; returns (matches, new_hash) where new_hash, when set, should
+        replace the stored hash because the hashing parameters have changed
+        """
+        return self._run(_verify, password, password_hash, self.rounds)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+# Shared by every request in the process
+password_hasher = PasswordHasher()
@@ -0,0 +1,166 @@
+"""
+Per-user token buckets in front of the chat LLM call.
+
+Every user has two buckets: one for requests and one for LLM tokens (prompt + reply,
+counted with utils.context.count_tokens). A request is admitted only if both buckets can
+cover it. The token bucket is charged an estimate up front, and the difference from the
+real usage is settled once the reply is known, so a long reply can leave the bucket in
+debt and delay the user's next request. Rejected requests get 429 with Retry-After,
+which is the time until the bucket has refilled enough.
+
+    CHAT_REQUESTS_PER_MINUTE  sustained request rate (20)
+    CHAT_REQUEST_BURST        requests allowed back to back (5)
+    CHAT_TOKENS_PER_MINUTE    sustained LLM token rate (20000)
+    CHAT_TOKEN_BURST          tokens allowed back to back (8000)
+    RATE_LIMIT=off            disables the limiter
+
+RATE_LIMIT_BACKEND=local (default) keeps buckets in this process, so with several
+processes each enforces its own share. RATE_LIMIT_BACKEND=redis shares them through
+RATE_LIMIT_REDIS_URL; the redis package is only needed in that case.
+"""
+import math
+import os
+import threading
+import time
+
+class RateLimitExceeded(Exception):
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class LocalBucketStore:
+    """
+    In-process stand-in for a shared bucket store
+    """
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._buckets = {}  # key -> [tokens, updated_at]
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, amount, force=False):
+        """
+        Refill the bucket at rate per second up to capacity, then remove amount if it is
+        available (or regardless, with force). Returns (allowed, seconds until amount would be).
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_entries:
+                    self._evict_full(now)
+                bucket = self._buckets[key] = [capacity, now]
+
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            if force or tokens >= amount:
+                bucket[0] = min(capacity, tokens - amount)
+                return True, 0.0
+            bucket[0] = tokens
+            return False, (amount - tokens) / rate
+
+    def _evict_full(self, now):
+        # A bucket idle for an hour has refilled, which is the same as a missing one
+        for key in [key for key, (tokens, updated_at) in self._buckets.items() if updated_at < now - 3600]:
+            del self._buckets[key]
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+class RedisBucketStore:
+    """
+    Shared store; each bucket is a Redis hash updated atomically by a Lua script
+    """
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local amount = tonumber(ARGV[3])
+    local force = ARGV[4] == '1'
+    local now = tonumber(ARGV[5])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated_at = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+    local allowed = force or tokens >= amount
+    if allowed then
+        tokens = math.min(capacity, tokens - amount)
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil((capacity - math.min(tokens, 0)) / rate) + 60)
+    if allowed then
+        return {1, '0'}
+    end
+    return {0, tostring((amount - tokens) / rate)}
+    """
+
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self._take = self.client.register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate, amount, force=False):
+        allowed, retry_after = self._take(keys=[key], args=[capacity, rate, amount, '1' if force else '0', time.time()])
+        return bool(allowed), float(retry_after)
+
+    def clear(self):
+        for key in self.client.scan_iter('ratelimit:*'):
+            self.client.delete(key)
+
+def create_store():
+    if os.getenv('RATE_LIMIT_BACKEND', 'local') == 'redis':
+        return RedisBucketStore(os.getenv('RATE_LIMIT_REDIS_URL', 'redis://localhost:6379/0'))
+    return LocalBucketStore()
+
+class RateLimiter:
+    def __init__(self, store=None, requests_per_minute=None, request_burst=None,
+                 tokens_per_minute=None, token_burst=None, enabled=None):
+        self.store = store or create_store()
+        self.request_rate = (requests_per_minute or float(os.getenv('CHAT_REQUESTS_PER_MINUTE', '20'))) / 60
+        self.request_burst = request_burst or float(os.getenv('CHAT_REQUEST_BURST', '5'))
+        self.token_rate = (tokens_per_minute or float(os.getenv('CHAT_TOKENS_PER_MINUTE', '20000'))) / 60
+        self.token_burst = token_burst or float(os.getenv('CHAT_TOKEN_BURST', '8000'))
+        self.enabled = enabled if enabled is not None else os.getenv('RATE_LIMIT', 'on') != 'off'
+        self._stats_lock = threading.Lock()
+        self._stats = {'admitted': 0, 'rejected_requests': 0, 'rejected_tokens': 0}
+
+    def _count(self, name):
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def admit(self, user_id, estimated_tokens):
+        """
+        Take one request and estimated_tokens from the user's buckets, raising
+        RateLimitExceeded if either is short. Returns the tokens charged, for settle().
+        """
+        if not self.enabled:
+            return 0
+
+        allowed, retry_after = self.store.take(f'ratelimit:requests:{user_id}', self.request_burst, self.request_rate, 1)
+        if not allowed:
+            self._count('rejected_requests')
+            raise RateLimitExceeded('You are sending messages too quickly, please slow down.', max(1, math.ceil(retry_after)))
+
+        # A single prompt larger than the burst could never fit, so cap the up-front charge
+        charged = min(estimated_tokens, self.token_burst)
+        allowed, retry_after = self.store.take(f'ratelimit:tokens:{user_id}', self.token_burst, self.token_rate, charged)
+        if not allowed:
+            self._count('rejected_tokens')
+            raise RateLimitExceeded('You have used a lot of conversation recently, please take a short break.',
+                                    max(1, math.ceil(retry_after)))
+
+        self._count('admitted')
+        return charged
+
+    def settle(self, user_id, charged, used_tokens):
+        """
+        Correct the token bucket once the real usage is known (a refund if it was lower)
+        """
+        if self.enabled and used_tokens != charged:
+            self.store.take(f'ratelimit:tokens:{user_id}', self.token_burst, self.token_rate, used_tokens - charged, force=True)
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+# Shared by every request in the process
+rate_limiter = RateLimiter()
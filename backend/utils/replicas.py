@@ -0,0 +1,262 @@
+"""
+Read/write session routing for optional read replicas.
+
+DATABASE_REPLICA_URIS takes a comma-separated list of replica URIs next to
+DATABASE_URI. Each becomes a Flask-SQLAlchemy bind (replica_0, replica_1, ...) that no
+model is mapped to, so nothing is written to or created on a replica. Handlers marked
+with @replica_reads (and the user lookup in token_required) run their SELECTs on one
+healthy replica per request, chosen round-robin; everything else, and every query
+outside a request, uses the primary.
+
+Serving processes call replica_router.start(app), which starts a monitor thread that
+checks every replica each DB_REPLICA_CHECK_INTERVAL seconds (default 10) with a trivial
+query and, on PostgreSQL, drops replicas whose replay lag exceeds DB_REPLICA_MAX_LAG
+seconds; a replica whose connection breaks mid-request is dropped straight away. With no healthy replica, reads go to the primary.
+
+Read-your-writes: a user whose writes were committed reads from the primary for the
+next DB_REPLICA_STICKY_SECONDS (default 5), which should exceed the replicas' lag, and
+a request that has flushed writes reads from the primary until it commits. The
+markers are kept in this process unless DB_STICKY_BACKEND=redis shares them through
+DB_STICKY_REDIS_URL; serve.py refuses to run replicas on several workers without it.
+"""
+import itertools
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.sql.elements import TextClause
+from utils.database import engine_options
+from utils.user_cache import LocalCacheBackend, RedisCacheBackend
+
+logger = logging.getLogger(__name__)
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+def replica_binds(uris):
+    """
+    SQLALCHEMY_BINDS entries for a comma-separated list of replica URIs
+    """
+    uris = [uri.strip() for uri in (uris or '').split(',') if uri.strip()]
+    return {f'{REPLICA_BIND_PREFIX}{i}': {'url': uri, **engine_options(uri)} for i, uri in enumerate(uris)}
+
+def _is_read(clause):
+    if isinstance(clause, TextClause):
+        return clause.text.lstrip().upper().startswith(('SELECT', 'WITH'))
+    return getattr(clause, 'is_select', False)
+
+def _create_sticky_backend():
+    if os.getenv('DB_STICKY_BACKEND', 'local') == 'redis':
+        return RedisCacheBackend(os.getenv('DB_STICKY_REDIS_URL', 'redis://localhost:6379/0'))
+    return LocalCacheBackend()
+
+class ReplicaRouter:
+    def __init__(self, sticky_backend=None, sticky_seconds=None, check_interval=None, max_lag=None):
+        self.sticky = sticky_backend or _create_sticky_backend()
+        self.sticky_seconds = sticky_seconds if sticky_seconds is not None else float(os.getenv('DB_REPLICA_STICKY_SECONDS', '5'))
+        self.check_interval = check_interval or float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '10'))
+        self.max_lag = max_lag or float(os.getenv('DB_REPLICA_MAX_LAG', str(self.sticky_seconds or 5)))
+        self.engines = {}
+        self.healthy = []
+        self._round_robin = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {'replica_reads': 0, 'primary_reads': 0, 'sticky_reads': 0, 'replica_failures': 0}
+        self._reads = {}
+        self._monitor_thread = None
+        self._stopping = threading.Event()
+
+    def init_app(self, app, db):
+        """
+        Pick up the replica binds of app without connecting to them; reads go to the
+        primary until start() has checked the replicas
+        """
+        with app.app_context():
+            self.engines = {key: engine for key, engine in db.engines.items()
+                            if key and key.startswith(REPLICA_BIND_PREFIX)}
+            for engine in self.engines.values():
+                event.listen(engine, 'handle_error', self._connection_error)
+
+    def start(self, app):
+        """
+        Check the replicas once and start the monitor thread; serving processes call this
+        after any fork, so the connections and the thread belong to them
+        """
+        if not self.engines or self._monitor_thread is not None:
+            return
+        with app.app_context():
+            self.check()
+        self._stopping = threading.Event()
+        self._monitor_thread = threading.Thread(target=self._monitor, args=(app,), daemon=True, name='replica-monitor')
+        self._monitor_thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the monitor thread; reads keep the replicas that were last healthy
+        """
+        if self._monitor_thread is None:
+            return
+        self._stopping.set()
+        self._monitor_thread.join(timeout)
+        self._monitor_thread = None
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['replicas'] = len(self.engines)
+        stats['healthy_replicas'] = len(self.healthy)
+        for key in self.engines:
+            stats[f'{key}_reads'] = self._reads.get(key, 0)
+        return stats
+
+    def _lag(self, connection):
+        # A replica that has replayed everything it received is current however old that is
+        return connection.execute(text(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )).scalar()
+
+    def _is_healthy(self, key, engine):
+        try:
+            with engine.connect() as connection:
+                connection.execute(text('SELECT 1'))
+                lag = self._lag(connection) if engine.dialect.name == 'postgresql' else 0
+        except Exception as e:
+            logger.warning('Replica %s failed its health check: %s', key, type(e).__name__)
+            return False
+        if lag > self.max_lag:
+            logger.warning('Replica %s is %.1fs behind the primary', key, lag)
+            return False
+        return True
+
+    def check(self):
+        """
+        Health-check every replica and route reads to the ones that passed
+        """
+        healthy = [key for key, engine in self.engines.items() if self._is_healthy(key, engine)]
+        with self._lock:
+            self.healthy = healthy
+
+    def _monitor(self, app):
+        while not self._stopping.wait(self.check_interval):
+            with app.app_context():
+                self.check()
+
+    def _connection_error(self, context):
+        if not context.is_disconnect:
+            return
+        with self._lock:
+            for key, engine in self.engines.items():
+                if engine is context.engine and key in self.healthy:
+                    self.healthy = [other for other in self.healthy if other != key]
+                    self._stats['replica_failures'] += 1
+                    logger.warning('Replica %s lost its connection; reading from the others until the next check', key)
+
+    def _sticky_key(self, user_id):
+        return f'sticky:{int(user_id)}'
+
+    def mark_written(self, user_ids):
+        if self.sticky_seconds > 0:
+            for user_id in user_ids:
+                self.sticky.set(self._sticky_key(user_id), 1, self.sticky_seconds)
+
+    def read_engine(self, session, clause):
+        """
+        The replica engine for clause, or None to use the primary
+        """
+        if not self.engines or not has_request_context() or not g.get('replica_reads') or not _is_read(clause):
+            return None
+
+        if session.info.get('wrote'):
+            self._count('primary_reads')
+            return None
+
+        user_id = g.get('user_id')
+        if user_id is not None and self.sticky.get(self._sticky_key(user_id)):
+            self._count('sticky_reads')
+            return None
+
+        # One replica per request, so its reads see a single snapshot
+        key = g.get('replica_key')
+        with self._lock:
+            if key not in self.healthy:
+                key = self.healthy[next(self._round_robin) % len(self.healthy)] if self.healthy else None
+                g.replica_key = key
+            if key is None:
+                self._stats['primary_reads'] += 1
+                return None
+            self._stats['replica_reads'] += 1
+            self._reads[key] = self._reads.get(key, 0) + 1
+        return self.engines[key]
+
+# Shared by every request in the process
+replica_router = ReplicaRouter()
+
+class RoutingSession(Session):
+    """
+    db.session: SELECTs of read-only handlers go to a replica, everything else to the primary
+    """
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            engine = replica_router.read_engine(self, clause)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _track_flushed_writes(session, flush_context):
+    # The users whose rows changed; a User row is its own user
+    user_ids = session.info.setdefault('written_user_ids', set())
+    for instance in itertools.chain(session.new, session.dirty, session.deleted):
+        user_id = instance.id if type(instance).__tablename__ == 'users' else getattr(instance, 'user_id', None)
+        if user_id is not None:
+            user_ids.add(user_id)
+    session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _track_statement_writes(orm_execute_state):
+    # Bulk UPDATE/DELETE statements bypass the flush; they belong to the request's user
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        session = orm_execute_state.session
+        if has_request_context() and g.get('user_id') is not None:
+            session.info.setdefault('written_user_ids', set()).add(g.user_id)
+        session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _start_read_your_writes(session):
+    replica_router.mark_written(session.info.pop('written_user_ids', ()))
+    session.info.pop('wrote', None)
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _forget_writes(session):
+    session.info.pop('written_user_ids', None)
+    session.info.pop('wrote', None)
+
+@contextmanager
+def reading_from_replica(value=True):
+    """
+    Route this request's SELECTs to a replica (or, with value False, back to the primary)
+    """
+    previous = g.get('replica_reads', False)
+    g.replica_reads = value
+    try:
+        yield
+    finally:
+        g.replica_reads = previous
+
+def replica_reads(f):
+    """
+    Decorator for read-only handlers; use it below token_required
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        with reading_from_replica():
+            return f(*args, **kwargs)
+
+    return decorated
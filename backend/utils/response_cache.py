@@ -0,0 +1,243 @@
+"""
+Optional cache in front of the chat LLM call for repeated or near-duplicate prompts
+("hi", "I feel anxious today").
+
+Only short messages with a short conversation context are cacheable, and the normalized
+context is part of the key, so a cached reply was always produced from the same prompt
+(up to case, punctuation and spacing). Entries are scoped to the user whose prompt
+produced them; only first-turn prompts without any context, from users who opted in
+(User.allow_response_cache, off by default), go to a tier shared by every opted-in user.
+Two tiers within each scope:
+    exact     - scope + persona + normalized context + normalized message
+    semantic  - same scope, persona and context, message embedding within
+                RESPONSE_CACHE_THRESHOLD cosine similarity (reuses the MiniLM model from
+                utils/embeddings.py)
+
+RESPONSE_CACHE=off (default) | exact | semantic
+"""
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+import numpy as np
+from utils.context import count_tokens
+
+logger = logging.getLogger(__name__)
+
+CacheKey = namedtuple('CacheKey', ['exact', 'bucket', 'message', 'vector'], defaults=[None])
+
+class CacheEntry:
+    __slots__ = ('response', 'bucket', 'vector', 'created_at', 'latency', 'tokens', 'user_id')
+
+    def __init__(self, response, bucket, vector, latency, tokens, user_id=None):
+        self.response = response
+        self.bucket = bucket
+        self.vector = vector
+        self.created_at = time.monotonic()
+        self.latency = latency
+        self.tokens = tokens
+        self.user_id = user_id  # Whose prompt produced it, so it can be purged with their data
+
+def normalize(text):
+    text = re.sub(r"[^\w\s']", ' ', (text or '').lower())
+    return ' '.join(text.split())
+
+class ResponseCache:
+    def __init__(self, mode=None, max_entries=None, ttl=None, threshold=None,
+                 max_message_tokens=None, max_context_tokens=None):
+        self.mode = mode or os.getenv('RESPONSE_CACHE', 'off')
+        self.max_entries = max_entries or int(os.getenv('RESPONSE_CACHE_SIZE', '1000'))
+        self.ttl = ttl or float(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+        self.threshold = threshold or float(os.getenv('RESPONSE_CACHE_THRESHOLD', '0.92'))
+        self.max_message_tokens = max_message_tokens or int(os.getenv('RESPONSE_CACHE_MAX_MESSAGE_TOKENS', '32'))
+        self.max_context_tokens = max_context_tokens if max_context_tokens is not None else int(
+            os.getenv('RESPONSE_CACHE_MAX_CONTEXT_TOKENS', '64')
+        )
+
+        self._entries = OrderedDict()  # exact key -> CacheEntry, least recently used first
+        self._buckets = {}  # bucket -> set of exact keys, for the semantic tier
+        self._user_keys = {}  # user_id -> set of exact keys stored from that user's prompts
+        self._lock = threading.Lock()
+        self._stats = {
+            'lookups': 0,
+            'exact_hits': 0,
+            'semantic_hits': 0,
+            'misses': 0,
+            'uncacheable': 0,
+            'evictions': 0,
+            'saved_latency_seconds': 0.0,
+            'saved_tokens': 0
+        }
+
+    @property
+    def enabled(self):
+        return self.mode in ('exact', 'semantic')
+
+    def make_key(self, persona, history, message, user_id=None, shared=False):
+        """
+        Return the cache key for a prompt, or None when the prompt is not cacheable.
+        The key is user_id's own unless shared is set and the prompt has no context.
+        """
+        if count_tokens(message) > self.max_message_tokens or count_tokens(history) > self.max_context_tokens:
+            return None
+
+        normalized_history = normalize(history)
+        if shared and not normalized_history:
+            scope = 'shared'
+        elif user_id is not None:
+            scope = f'user:{user_id}'
+        else:
+            return None
+
+        bucket = hashlib.sha1(f'{scope}\x00{persona}\x00{normalized_history}'.encode()).hexdigest()
+        normalized_message = normalize(message)
+        exact = hashlib.sha1(f'{bucket}\x00{normalized_message}'.encode()).hexdigest()
+        return CacheKey(exact, bucket, normalized_message)
+
+    def _embed(self, text):
+        try:
+            from utils.embeddings import get_embedding_model
+            model = get_embedding_model()
+        except Exception:
+            # Without the embedding model only the exact tier can work
+            logger.exception('Embedding model unavailable, response cache falls back to exact matching')
+            self.mode = 'exact'
+            return None
+        return model.encode([text], normalize_embeddings=True, convert_to_numpy=True)[0].astype('float32')
+
+    def _expired(self, entry):
+        return time.monotonic() - entry.created_at > self.ttl
+
+    def _remove(self, exact):
+        entry = self._entries.pop(exact)
+        keys = self._buckets.get(entry.bucket)
+        if keys is not None:
+            keys.discard(exact)
+            if not keys:
+                del self._buckets[entry.bucket]
+        user_keys = self._user_keys.get(entry.user_id)
+        if user_keys is not None:
+            user_keys.discard(exact)
+            if not user_keys:
+                del self._user_keys[entry.user_id]
+
+    def _hit(self, entry, tier):
+        self._stats[f'{tier}_hits'] += 1
+        self._stats['saved_latency_seconds'] += entry.latency
+        self._stats['saved_tokens'] += entry.tokens
+        return entry.response
+
+    def lookup(self, persona, history, message, user_id=None, shared=False):
+        """
+        Look user_id's prompt up in the cache, in the shared tier when shared is set (the
+        user opted in) and the prompt has no context. Returns (response, key); response is
+        None on a miss and key is None when the prompt must not be cached.
+        """
+        if not self.enabled:
+            return None, None
+
+        key = self.make_key(persona, history, message, user_id, shared)
+        with self._lock:
+            self._stats['lookups'] += 1
+            if key is None:
+                self._stats['uncacheable'] += 1
+                return None, None
+
+            entry = self._entries.get(key.exact)
+            if entry is not None:
+                if not self._expired(entry):
+                    self._entries.move_to_end(key.exact)
+                    return self._hit(entry, 'exact'), key
+                self._remove(key.exact)
+
+            candidates = list(self._buckets.get(key.bucket, ())) if self.mode == 'semantic' else []
+
+        vector = self._embed(key.message) if candidates else None
+        if vector is not None:
+            key = key._replace(vector=vector)
+            with self._lock:
+                live = [(exact, self._entries[exact]) for exact in candidates
+                        if exact in self._entries and self._entries[exact].vector is not None
+                        and not self._expired(self._entries[exact])]
+                if live:
+                    scores = np.stack([entry.vector for _, entry in live]) @ vector
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.threshold:
+                        exact, entry = live[best]
+                        self._entries.move_to_end(exact)
+                        return self._hit(entry, 'semantic'), key
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return None, key
+
+    def store(self, key, response, latency, tokens, user_id=None):
+        """
+        Cache the response produced for key; latency (seconds) and tokens are what a
+        later hit saves, and user_id is whose prompt it came from
+        """
+        if key is None or not response:
+            return
+
+        vector = key.vector
+        if vector is None and self.mode == 'semantic':
+            vector = self._embed(key.message)
+
+        with self._lock:
+            if key.exact in self._entries:
+                self._remove(key.exact)
+            self._entries[key.exact] = CacheEntry(response, key.bucket, vector, latency, tokens, user_id)
+            self._buckets.setdefault(key.bucket, set()).add(key.exact)
+            if user_id is not None:
+                self._user_keys.setdefault(user_id, set()).add(key.exact)
+
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+
+    def forget_user(self, user_id):
+        """
+        Drop every entry stored from user_id's prompts; returns the number removed
+        """
+        with self._lock:
+            keys = [exact for exact in self._user_keys.get(user_id, ()) if exact in self._entries]
+            for exact in keys:
+                self._remove(exact)
+            self._user_keys.pop(user_id, None)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+            self._user_keys.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+        hits = stats['exact_hits'] + stats['semantic_hits']
+        stats['mode'] = self.mode
+        stats['hit_rate'] = hits / stats['lookups'] if stats['lookups'] else 0.0
+        return stats
+
+def cached_predict(cache, chain, history, message, user_id=None, shared=False):
+    """
+    chain.predict behind the cache, keyed by the chain's persona template; returns (response, cache_hit)
+    """
+    response, key = cache.lookup(chain.prompt, history, message, user_id, shared)
+    if response is not None:
+        return response, True
+
+    start = time.perf_counter()
+    response = chain.predict(input=message, history=history)
+    latency = time.perf_counter() - start
+
+    cache.store(key, response, latency, count_tokens(chain.format(message, history)) + count_tokens(response), user_id)
+    return response, False
+
+# Shared by every request in the process
+response_cache = ResponseCache()
@@ -0,0 +1,135 @@
+import re
+from markupsafe import escape
+from sqlalchemy import DateTime, Integer, String, text
+
+# Markers wrapped around matched terms in result snippets
+HIGHLIGHT_START = '<mark>'
+HIGHLIGHT_END = '</mark>'
+
+# The database marks matches with these control characters; they are swapped for the
+# highlight tags once the snippet text has been HTML-escaped
+_MATCH_START = '\x02'
+_MATCH_END = '\x03'
+
+SQLITE_SEARCH_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS journals_fts USING fts5(
+        title, content, user_id, content='journals', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS journals_fts_insert AFTER INSERT ON journals BEGIN
+        INSERT INTO journals_fts(rowid, title, content, user_id) VALUES (new.id, new.title, new.content, new.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS journals_fts_delete AFTER DELETE ON journals BEGIN
+        INSERT INTO journals_fts(journals_fts, rowid, title, content, user_id) VALUES ('delete', old.id, old.title, old.content, old.user_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS journals_fts_update AFTER UPDATE OF title, content, user_id ON journals BEGIN
+        INSERT INTO journals_fts(journals_fts, rowid, title, content, user_id) VALUES ('delete', old.id, old.title, old.content, old.user_id);
+        INSERT INTO journals_fts(rowid, title, content, user_id) VALUES (new.id, new.title, new.content, new.user_id);
+    END
+    """,
+]
+
+POSTGRES_SEARCH_DDL = [
+    """
+    ALTER TABLE journals ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(content, '')), 'B')
+    ) STORED
+    """,
+    'CREATE INDEX IF NOT EXISTS ix_journals_search_vector ON journals USING GIN (search_vector)',
+]
+
+def create_search_index(connection):
+    """
+    Create the full-text index for journals: FTS5 kept in sync by triggers on SQLite,
+    a generated tsvector column with a GIN index on PostgreSQL
+    """
+    if connection.dialect.name == 'sqlite':
+        statements = SQLITE_SEARCH_DDL
+    elif connection.dialect.name == 'postgresql':
+        statements = POSTGRES_SEARCH_DDL
+    else:
+        return
+
+    for statement in statements:
+        connection.execute(text(statement))
+
+def rebuild_search_index(connection):
+    """
+    Re-index every existing journal (the PostgreSQL column fills itself)
+    """
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text("INSERT INTO journals_fts(journals_fts) VALUES ('rebuild')"))
+
+def drop_search_index(connection):
+    if connection.dialect.name == 'sqlite':
+        connection.execute(text('DROP TABLE IF EXISTS journals_fts'))
+
+def search_terms(query):
+    return re.findall(r'\w+', query, flags=re.UNICODE)
+
+def highlight(snippet):
+    """
+    HTML for a snippet: its text escaped, with the matched terms in <mark>
+    """
+    if snippet is None:
+        return None
+    return str(escape(snippet)).replace(_MATCH_START, HIGHLIGHT_START).replace(_MATCH_END, HIGHLIGHT_END)
+
+def search_journals(session, user_id, query, limit, offset=0):
+    """
+    Ranked full-text search over one user's journals.
+    Returns dicts with id, title, snippet (HTML, see highlight()) and updated_at, best
+    match first.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return []
+
+    dialect = session.get_bind().dialect.name
+    params = {'user_id': user_id, 'limit': limit, 'offset': offset, 'match_start': _MATCH_START, 'match_end': _MATCH_END}
+
+    if dialect == 'sqlite':
+        # user_id is indexed in the FTS table so the match only walks this user's entries.
+        # Every term is quoted so user input cannot inject FTS5 syntax, and prefix-matched.
+        params['query'] = 'user_id : "{}" AND {{title content}} : ({})'.format(
+            int(user_id), ' '.join(f'"{term}"*' for term in terms)
+        )
+        sql = """
+            SELECT journals.id, journals.title, journals.updated_at,
+                   snippet(journals_fts, 1, :match_start, :match_end, '...', 24) AS snippet
+            FROM journals_fts JOIN journals ON journals.id = journals_fts.rowid
+            WHERE journals_fts MATCH :query
+            ORDER BY bm25(journals_fts, 10.0, 1.0, 0.0), journals.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+    elif dialect == 'postgresql':
+        params['query'] = ' '.join(terms)
+        sql = """
+            SELECT journals.id, journals.title, journals.updated_at,
+                   ts_headline('english', journals.content, query,
+                               'StartSel=' || :match_start || ', StopSel=' || :match_end || ', MaxWords=24, MinWords=8') AS snippet
+            FROM journals, plainto_tsquery('english', :query) AS query
+            WHERE journals.user_id = :user_id AND journals.search_vector @@ query
+            ORDER BY ts_rank(journals.search_vector, query) DESC, journals.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+    else:
+        # No full-text support: fall back to a bounded substring match
+        params['pattern'] = f'%{query}%'
+        sql = """
+            SELECT id, title, updated_at, substr(content, 1, 200) AS snippet
+            FROM journals
+            WHERE user_id = :user_id AND (title LIKE :pattern OR content LIKE :pattern)
+            ORDER BY updated_at DESC, id DESC
+            LIMIT :limit OFFSET :offset
+        """
+
+    statement = text(sql).columns(id=Integer, title=String, updated_at=DateTime, snippet=String)
+    return [{**row, 'snippet': highlight(row['snippet'])} for row in session.execute(statement, params).mappings()]
@@ -0,0 +1,113 @@
+"""
+Column-projected serialization for read-only list endpoints.
+
+Instead of loading ORM objects and calling to_dict(), a list endpoint selects only the
+columns the client asked for and turns each result row into a dict directly. Clients
+pick the keys with ?fields=id,title,updated_at, or ?view=summary for a preset that
+swaps long text for a preview truncated (in SQL) to PREVIEW_CHARS characters.
+Without either, the response has the same keys as before.
+
+TimedJSONProvider encodes every JSON response, with orjson when it is installed, and
+counts the encoding time as the request's serialization phase.
+"""
+import os
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy import func
+from utils.metrics import timed
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+PREVIEW_CHARS = int(os.getenv('PREVIEW_CHARS', '200'))
+
+class InvalidFields(ValueError):
+    pass
+
+def isoformat(value):
+    return value.isoformat() if value else None
+
+def truncate(text, length=None):
+    """
+    Cut text to length characters, ending with an ellipsis when anything was removed
+    """
+    length = length or PREVIEW_CHARS
+    if text is None or len(text) <= length:
+        return text
+    return text[:length].rstrip() + '…'
+
+def preview(column, length=None):
+    """
+    The first length + 1 characters of column, so truncate() can tell whether more followed
+    """
+    return func.substr(column, 1, (length or PREVIEW_CHARS) + 1)
+
+class RowSerializer:
+    """
+    fields maps each key a client may ask for to (SQL expression, formatter or None).
+    default is the key list returned without ?fields=, views maps ?view= names to key lists.
+    """
+    def __init__(self, fields, default, views=None):
+        self.fields = fields
+        self.default = list(default)
+        self.views = views or {}
+
+    def requested(self):
+        """
+        Keys chosen by the request's ?fields= or ?view=, raising InvalidFields for unknown ones
+        """
+        if request.args.get('fields'):
+            names = [name.strip() for name in request.args['fields'].split(',') if name.strip()]
+            unknown = [name for name in names if name not in self.fields]
+            if unknown or not names:
+                raise InvalidFields(', '.join(unknown))
+            return list(dict.fromkeys(names))
+
+        view = request.args.get('view')
+        if view:
+            if view not in self.views:
+                raise InvalidFields(view)
+            return list(self.views[view])
+        return self.default
+
+    def columns(self, names, required=()):
+        """
+        Labelled SQL expressions for names, followed by any required columns (such as
+        the pagination keys) that were not asked for
+        """
+        columns = [self.fields[name][0].label(name) for name in names]
+        return columns + [column for column in required if column.key not in names]
+
+    def serialize(self, rows, names):
+        formatters = [(position, name, self.fields[name][1]) for position, name in enumerate(names)]
+        return [
+            {name: formatter(row[position]) if formatter else row[position] for position, name, formatter in formatters}
+            for row in rows
+        ]
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """
+    Flask's JSON provider, counting encoding time as the serialization phase.
+    Responses are encoded with orjson when it is installed (JSON_ENCODER=stdlib turns
+    it off). Keys stay sorted, and dates and dataclasses still go through Flask's
+    default(), so the output matches the standard encoder apart from non-ASCII text
+    being sent as UTF-8 rather than escaped. response() is Flask's own; it encodes
+    through dumps(), so only dumps() is timed.
+    """
+    use_orjson = orjson is not None and os.getenv('JSON_ENCODER', 'orjson') != 'stdlib'
+
+    def dumps(self, obj, **kwargs):
+        with timed('serialization'):
+            if self.use_orjson and not kwargs.keys() - {'indent', 'separators'}:
+                return self._orjson_dumps(obj, indent=bool(kwargs.get('indent'))).decode()
+            return super().dumps(obj, **kwargs)
+
+    def _orjson_dumps(self, obj, indent=False):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
@@ -0,0 +1,138 @@
+"""
+Delta sync and conditional GETs for the chat history and journal list endpoints.
+
+Delta sync: called with ?since=<cursor>, a list endpoint returns only the rows created
+or updated after the cursor, oldest first, together with what was deleted in that time
+(`deleted` ids, and `cleared` when the whole collection was wiped) and the cursor for
+the next call. An empty ?since= starts from the beginning. Clients apply the deletions
+before upserting the returned rows. The cursor trails the clock by SYNC_SETTLE_SECONDS
+(default 2) so a row committed a little late is not skipped; rows in that window are
+sent again on the next call, which is harmless for an upsert. Tombstones older than
+SYNC_TOMBSTONE_DAYS (default 30) are pruned, so an older cursor is answered with 410
+and the client starts over.
+
+Conditional GETs: responses carry a weak ETag built from a validator query that only
+reads indexes (the user's latest id and timestamp, and their latest tombstone) plus the
+request URL; sync pages skip it unless the client sent If-None-Match. When
+If-None-Match matches, the endpoint answers 304 without reading or serializing any row.
+"""
+import hashlib
+import os
+from datetime import datetime, timedelta
+from flask import current_app, request
+from sqlalchemy import and_, delete, func, or_, select
+from models.user import db
+from models.tombstone import Tombstone
+from utils.pagination import Page, MAX_PER_PAGE, get_per_page, encode_cursor, decode_cursor
+from utils.replicas import reading_from_replica
+
+SYNC_SETTLE_SECONDS = float(os.getenv('SYNC_SETTLE_SECONDS', '2'))
+SYNC_TOMBSTONE_DAYS = float(os.getenv('SYNC_TOMBSTONE_DAYS', '30'))
+
+class CursorExpired(ValueError):
+    pass
+
+def record_deletion(user_id, kind, item_id=None):
+    """
+    Add a tombstone for a deleted row (or, with item_id None, for every row of kind) to
+    the session, so it is committed with the delete itself. Clearing a whole collection
+    supersedes its earlier tombstones; otherwise only expired ones are pruned.
+    """
+    now = datetime.utcnow()
+    stale = delete(Tombstone).where(Tombstone.user_id == user_id, Tombstone.kind == kind)
+    if item_id is not None:
+        stale = stale.where(Tombstone.deleted_at < now - timedelta(days=SYNC_TOMBSTONE_DAYS))
+    db.session.execute(stale)
+    db.session.add(Tombstone(user_id, kind, item_id, deleted_at=now))
+
+def sync_since(query, time_column, id_column, user_id, kind, default_per_page=MAX_PER_PAGE):
+    """
+    The page of query's rows changed after ?since=, keyset-paginated oldest first on
+    (time_column, id_column), and the deletions of kind in the same window. Raises
+    InvalidCursor for a malformed cursor and CursorExpired for one past tombstone retention.
+    Reads from the primary: a lagging replica could hand out a cursor past rows it has
+    not received yet, and they would never be sent.
+    """
+    with reading_from_replica(False):
+        return _sync_since(query, time_column, id_column, user_id, kind, default_per_page)
+
+def _sync_since(query, time_column, id_column, user_id, kind, default_per_page):
+    per_page = get_per_page(default_per_page)
+    since = request.args.get('since')
+    now = datetime.utcnow()
+
+    position = decode_cursor(since) if since else None
+    if position and position[0] < now - timedelta(days=SYNC_TOMBSTONE_DAYS):
+        raise CursorExpired(since)
+
+    ordered = query.order_by(time_column, id_column)
+    if position:
+        ordered = ordered.filter(or_(
+            time_column > position[0],
+            and_(time_column == position[0], id_column > position[1])
+        ))
+
+    # Fetch one extra row to learn whether another page exists
+    rows = ordered.limit(per_page + 1).all()
+    items = rows[:per_page]
+    has_more = len(rows) > per_page
+
+    if has_more:
+        next_position = (getattr(items[-1], time_column.key), getattr(items[-1], id_column.key))
+    else:
+        settled = (now - timedelta(seconds=SYNC_SETTLE_SECONDS), 0)
+        next_position = max(position, settled) if position else settled
+
+    # A first sync has nothing to delete; later ones get the deletions up to the new cursor
+    item_ids = []
+    if position:
+        tombstones = select(Tombstone.item_id).where(
+            Tombstone.user_id == user_id, Tombstone.kind == kind, Tombstone.deleted_at > position[0]
+        )
+        if has_more:
+            tombstones = tombstones.where(Tombstone.deleted_at <= next_position[0])
+        item_ids = db.session.scalars(tombstones).all()
+
+    return Page(items, {
+        'deleted': sorted({item_id for item_id in item_ids if item_id is not None}),
+        'cleared': None in item_ids,
+        'cursor': encode_cursor(*next_position),
+        'has_more': has_more
+    })
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+
+def collection_etag(model, time_column, user_id, kind):
+    """
+    ETag for the current URL over a user's rows of model; it changes whenever a row is
+    added (the latest id), updated (the latest time) or deleted (the latest tombstone).
+    Each part is its own MAX() over the user's index range, so no row is read. None when
+    the request has no If-None-Match and its response is a sync page, which is never
+    cached because its cursor follows the clock.
+    """
+    if not request.if_none_match and 'since' in request.args:
+        return None
+
+    def latest(column, *where):
+        return select(func.max(column)).where(*where).scalar_subquery()
+
+    version = db.session.execute(select(
+        latest(model.id, model.user_id == user_id),
+        latest(time_column, model.user_id == user_id),
+        latest(Tombstone.id, Tombstone.user_id == user_id, Tombstone.kind == kind)
+    )).one()
+    return make_etag(user_id, request.full_path, *version)
+
+def tagged(response, etag):
+    """
+    Attach etag to response; the client may keep the body but must revalidate it
+    """
+    if etag is None:
+        return response
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified(etag):
+    return tagged(current_app.response_class(status=304), etag)
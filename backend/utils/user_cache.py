@@ -0,0 +1,144 @@
+"""
+Short-lived cache of authenticated user rows, so token_required does not hit the
+database on every request.
+
+Entries are the user's to_dict() and expire after USER_CACHE_TTL seconds (0 disables
+the cache). Writes to the user row must call user_cache.invalidate(user_id).
+
+USER_CACHE_BACKEND=local (default) keeps entries in this process; with several
+processes each has its own copy, so the TTL bounds how stale another process can be.
+USER_CACHE_BACKEND=redis shares entries (and invalidations) between processes through
+USER_CACHE_REDIS_URL; the redis package is only needed in that case.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class LocalCacheBackend:
+    """
+    In-process stand-in for a shared cache: a bounded LRU dict with per-key expiry
+    """
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            if item[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class RedisCacheBackend:
+    """
+    Shared backend; values are stored as JSON with a Redis expiry
+    """
+    def __init__(self, url):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self.client.setex(key, max(1, int(ttl)), json.dumps(value))
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def clear(self):
+        for key in self.client.scan_iter('user:*'):
+            self.client.delete(key)
+
+def create_backend():
+    if os.getenv('USER_CACHE_BACKEND', 'local') == 'redis':
+        return RedisCacheBackend(os.getenv('USER_CACHE_REDIS_URL', 'redis://localhost:6379/0'))
+    return LocalCacheBackend()
+
+class CachedUser:
+    """
+    Read-only stand-in for a User row built from its to_dict() output. It carries every
+    field the routes read; anything that writes to the user must load the real row.
+    """
+    def __init__(self, data):
+        self._data = data
+        for name, value in data.items():
+            setattr(self, name, value)
+
+    def to_dict(self):
+        return dict(self._data)
+
+class AuthenticatedUser:
+    """
+    Just the id from a valid token, for endpoints that never need the user row
+    """
+    def __init__(self, user_id):
+        self.id = user_id
+
+class UserCache:
+    def __init__(self, backend=None, ttl=None):
+        self.backend = backend or create_backend()
+        self.ttl = ttl if ttl is not None else float(os.getenv('USER_CACHE_TTL', '30'))
+        self._stats_lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def _key(self, user_id):
+        return f'user:{int(user_id)}'
+
+    def get(self, user_id, loader):
+        """
+        Return a CachedUser for user_id, calling loader(user_id) for the User row on a
+        miss; None if the user does not exist
+        """
+        if self.ttl > 0:
+            data = self.backend.get(self._key(user_id))
+            if data is not None:
+                with self._stats_lock:
+                    self._stats['hits'] += 1
+                return CachedUser(data)
+
+        user = loader(user_id)
+        with self._stats_lock:
+            self._stats['misses'] += 1
+        if user is None:
+            return None
+
+        data = user.to_dict()
+        if self.ttl > 0:
+            self.backend.set(self._key(user_id), data, self.ttl)
+        return CachedUser(data)
+
+    def invalidate(self, user_id):
+        self.backend.delete(self._key(user_id))
+        with self._stats_lock:
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats)
+
+# Shared by every request in the process
+user_cache = UserCache()
@@ -0,0 +1,281 @@
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Default location for the per-user index files
+DEFAULT_INDEX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'vector_indexes')
+
+# Journals and chat turns share one index per user; the low bit of the vector id says which
+JOURNAL = 'journal'
+CHAT = 'chat'
+
+def _faiss():
+    # Imported on first use to keep app startup light
+    import faiss
+    return faiss
+
+def journal_vector_id(journal_id):
+    return journal_id * 2
+
+def chat_vector_id(chat_id):
+    return chat_id * 2 + 1
+
+def index_path(index_dir, user_id):
+    return os.path.join(index_dir or os.getenv('VECTOR_INDEX_DIR', DEFAULT_INDEX_DIR), f'{int(user_id)}.faiss')
+
+def decode_vector_id(vector_id):
+    vector_id = int(vector_id)
+    return (CHAT, vector_id // 2) if vector_id % 2 else (JOURNAL, vector_id // 2)
+
+def _apply(index, ids, vectors=None):
+    # One upsert (with vectors) or removal (without); returns the number of ids removed
+    removed = index.remove_ids(ids)
+    if vectors is not None:
+        index.add_with_ids(vectors, ids)
+    return removed
+
+class UserVectorIndexStore:
+    """
+    One FAISS index per user, saved to disk as <index_dir>/<user_id>.faiss.
+    Indexes are memory-mapped on load and cached (LRU); a cached index is reloaded
+    when another process has rewritten its file. Vectors are expected L2-normalized,
+    so inner product equals cosine similarity.
+
+    Several processes may change the same index: every write to a file happens under an
+    exclusive lock on <user_id>.faiss.lock (fcntl.flock; on platforms without it, only
+    threads of one process are kept apart). upsert() and remove() load the index under
+    that lock, change it and write it straight away. Inside `with store.batched():` they
+    change the cached index and remember the operation; when the block exits each changed
+    index is written once, and if another process rewrote the file in the meantime its
+    operations are replayed on the newer file instead. An index with unsaved changes is
+    never evicted or reloaded.
+    """
+    def __init__(self, dimension, index_dir=None, max_cached=256):
+        self.dimension = dimension
+        self.index_dir = index_dir or os.getenv('VECTOR_INDEX_DIR', DEFAULT_INDEX_DIR)
+        self.max_cached = max_cached
+        self._cache = OrderedDict()  # user_id -> (file version the index was loaded from, index)
+        self._pending = {}  # user_id -> operations not yet written to disk
+        self._lock = threading.Lock()
+        self._user_locks = {}
+        self._batching = threading.local()
+        os.makedirs(self.index_dir, exist_ok=True)
+
+    def _path(self, user_id):
+        return index_path(self.index_dir, user_id)
+
+    def _version(self, user_id):
+        # Each save replaces the file, so its inode changes even within one mtime tick
+        try:
+            stat = os.stat(self._path(user_id))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _user_lock(self, user_id):
+        with self._lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    @contextmanager
+    def _file_lock(self, user_id):
+        # Taken before the user's thread lock, and never more than one at a time
+        fd = os.open(f'{self._path(user_id)}.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _new_index(self):
+        faiss = _faiss()
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+
+    def _remember(self, user_id, version, index):
+        # Called with self._lock held; indexes with unsaved changes are never evicted
+        self._cache[user_id] = (version, index)
+        self._cache.move_to_end(user_id)
+        for other in [key for key in self._cache if key not in self._pending][:max(0, len(self._cache) - self.max_cached)]:
+            del self._cache[other]
+
+    def _read(self, user_id):
+        version = self._version(user_id)
+        if version is None:
+            return None, self._new_index()
+        faiss = _faiss()
+        return version, faiss.read_index(self._path(user_id), faiss.IO_FLAG_MMAP)
+
+    def _load(self, user_id):
+        # Returns (file version the index was loaded from, index); the version is None
+        # for a user without an index file yet
+        with self._lock:
+            if user_id in self._pending:
+                self._cache.move_to_end(user_id)
+                return self._cache[user_id]
+
+        version = self._version(user_id)
+        if version is None:
+            return None, self._new_index()
+
+        with self._lock:
+            cached = self._cache.get(user_id)
+            if cached and cached[0] == version:
+                self._cache.move_to_end(user_id)
+                return cached
+
+        version, index = self._read(user_id)
+        with self._lock:
+            self._remember(user_id, version, index)
+        return version, index
+
+    def _save(self, user_id, index):
+        # Called with the user's file and thread locks held
+        path = self._path(user_id)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        _faiss().write_index(index, tmp_path)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._pending.pop(user_id, None)
+            self._remember(user_id, self._version(user_id), index)
+
+    @contextmanager
+    def _changing(self, user_id):
+        """
+        Hold the locks for changing one user's index; yields the index and a function
+        that records each operation applied to it. Outside batched() the change is
+        written before the file lock is released.
+        """
+        batched = getattr(self._batching, 'depth', 0)
+        with (nullcontext() if batched else self._file_lock(user_id)), self._user_lock(user_id):
+            version, index = self._load(user_id)
+
+            def record(operation):
+                with self._lock:
+                    self._pending.setdefault(user_id, []).append(operation)
+                    self._remember(user_id, version, index)
+
+            yield index, record
+            if not batched:
+                self._write(user_id)
+
+    def _write(self, user_id):
+        # Called with the user's file and thread locks held; returns whether a file was written
+        with self._lock:
+            operations = self._pending.get(user_id)
+            if not operations:
+                return False
+            version, index = self._cache[user_id]
+
+        current = self._version(user_id)
+        if current != version:
+            if version is not None and current is None:
+                # The index was deleted with its user meanwhile
+                with self._lock:
+                    self._pending.pop(user_id, None)
+                    self._cache.pop(user_id, None)
+                return False
+            # Another process rewrote the file: replay this process's changes on top of it
+            _, index = self._read(user_id)
+            for operation in operations:
+                _apply(index, *operation)
+        self._save(user_id, index)
+        return True
+
+    @contextmanager
+    def batched(self):
+        """
+        Defer writing changed indexes to disk until the block exits
+        """
+        self._batching.depth = getattr(self._batching, 'depth', 0) + 1
+        try:
+            yield self
+        finally:
+            self._batching.depth -= 1
+            if not self._batching.depth:
+                self.flush()
+
+    def flush(self):
+        """
+        Write every index with unsaved changes to disk, replaying its changes on the
+        file when another process has rewritten it; returns how many were written
+        """
+        with self._lock:
+            user_ids = list(self._pending)
+        written = 0
+        for user_id in user_ids:
+            with self._file_lock(user_id), self._user_lock(user_id):
+                written += self._write(user_id)
+        return written
+
+    def upsert(self, user_id, vector_ids, vectors):
+        """
+        Add vectors, replacing any existing vectors with the same ids
+        """
+        if not len(vector_ids):
+            return
+        ids = np.asarray(vector_ids, dtype='int64')
+        vectors = np.ascontiguousarray(vectors, dtype='float32').reshape(len(ids), self.dimension)
+
+        with self._changing(user_id) as (index, record):
+            _apply(index, ids, vectors)
+            record((ids, vectors))
+
+    def remove(self, user_id, vector_ids):
+        """
+        Drop stale vectors by id; returns the number removed
+        """
+        if not len(vector_ids):
+            return 0
+        ids = np.asarray(vector_ids, dtype='int64')
+        with self._changing(user_id) as (index, record):
+            removed = _apply(index, ids)
+            if removed:
+                record((ids, None))
+            return removed
+
+    def search(self, user_id, vector, k=5):
+        """
+        Return [(vector_id, score)] for the k nearest vectors in the user's index
+        """
+        query = np.ascontiguousarray(vector, dtype='float32').reshape(1, self.dimension)
+        with self._user_lock(user_id):
+            _, index = self._load(user_id)
+            if index.ntotal == 0:
+                return []
+            scores, ids = index.search(query, min(k, index.ntotal))
+        return [(int(vector_id), float(score)) for vector_id, score in zip(ids[0], scores[0]) if vector_id != -1]
+
+    def vectors(self, user_id):
+        """
+        Return (vector_ids, vectors) for everything in the user's index
+        """
+        with self._user_lock(user_id):
+            _, index = self._load(user_id)
+            if index.ntotal == 0:
+                return np.zeros(0, dtype='int64'), np.zeros((0, self.dimension), dtype='float32')
+            return _faiss().vector_to_array(index.id_map).astype('int64'), index.index.reconstruct_n(0, index.ntotal)
+
+    def count(self, user_id):
+        with self._user_lock(user_id):
+            return self._load(user_id)[1].ntotal
+
+    def delete_user(self, user_id):
+        """
+        Remove a user's index from disk and from the cache
+        """
+        with self._file_lock(user_id), self._user_lock(user_id):
+            with self._lock:
+                self._cache.pop(user_id, None)
+                self._pending.pop(user_id, None)
+            try:
+                os.remove(self._path(user_id))
+            except FileNotFoundError:
+                pass
@@ -142,12 +142,11 @@ function Chat() {
           headers: { Authorization: `Bearer ${token}` }
         });
         
-        // Format messages for display
-        const formattedMessages = response.data.chats.map(chat => ({
-          id: chat.id,
-          text: chat.is_from_user ? chat.message : chat.response,
-          isUser: chat.is_from_user
-        }));
+        // Each chat is one turn: the user's message and the AI reply (oldest first for display)
+        const formattedMessages = [...response.data.chats].reverse().flatMap(chat => [
+          { id: `${chat.id}-user`, text: chat.message, isUser: true },
+          ...(chat.response ? [{ id: `${chat.id}-ai`, text: chat.response, isUser: false }] : [])
+        ]);
         
         setMessages(formattedMessages);
         
@@ -195,9 +194,9 @@ function Chat() {
         { headers: { Authorization: `Bearer ${token}` }}
       );
       
-      // Add AI response to chat
+      // Add AI response to chat (a degraded reply while the AI is unavailable is not saved, so it has no chat_id)
       setMessages(prev => [...prev, { 
-        id: response.data.chat_id, 
+        id: response.data.chat_id ?? Date.now() + 1, 
         text: response.data.response, 
         isUser: false 
       }]);